@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'corsheaders',
 
     # Custom apps
+    'apps.core',
     'apps.users',
     'apps.jira',
     'apps.trello',
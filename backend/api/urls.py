@@ -7,5 +7,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', include('apps.users.urls')), # -> endpoint for user management, authenticate users to be able to use the app with jira integration
     path('', include('apps.jira.urls')), # -> endpoint for task management, create tasks, assign tasks to users, etc.
+    path('', include('apps.core.urls')), # -> shared infrastructure endpoints (AI cache stats)
     path('trello/', include('apps.trello.urls')), # -> endpoint for trello integration, authenticate users to be able to use the app with trello integration
 ]
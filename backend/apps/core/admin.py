@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import AIAnalysisCache, AIJob
+
+
+@admin.register(AIAnalysisCache)
+class AIAnalysisCacheAdmin(admin.ModelAdmin):
+    list_display = ('key', 'kind', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('kind',)
+
+
+
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'attempts', 'created_at', 'updated_at')
+    list_filter = ('kind', 'status')
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from . import coalesce
+from .models import AIAnalysisCache
+
+# Two-tier cache for LLM analyses: an in-process LRU in front of the AIAnalysisCache table.
+# Keys are content addressed, so a changed issue/card set, order label, model or prompt version
+# simply produces a new key and old entries age out.
+
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", 86400)) # seconds
+AI_CACHE_MEMORY_SIZE = int(os.getenv("AI_CACHE_MEMORY_SIZE", 256)) # entries kept per process
+AI_CACHE_DB_MAX_ENTRIES = int(os.getenv("AI_CACHE_DB_MAX_ENTRIES", 5000))
+AI_CACHE_PRUNE_EVERY = 50 # writes between two DB eviction passes
+
+
+class LRUCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+_memory = LRUCache(AI_CACHE_MEMORY_SIZE, AI_CACHE_TTL)
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "stores": 0}
+_stats_lock = threading.Lock()
+_writes_since_prune = 0
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def make_key(kind, items, order_label, model, prompt_version):
+    payload = {
+        "kind": kind,
+        "items": items,
+        "order_label": order_label,
+        "model": model,
+        "prompt_version": prompt_version,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    value = _memory.get(key)
+    if value is not None:
+        _count("memory_hits")
+        return value
+    entry = AIAnalysisCache.objects.filter(key=key).first()
+    if entry is not None:
+        if timezone.now() - entry.created_at > timedelta(seconds=AI_CACHE_TTL):
+            entry.delete()
+        else:
+            AIAnalysisCache.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=timezone.now())
+            _memory.set(key, entry.response)
+            _count("db_hits")
+            return entry.response
+    _count("misses")
+    return None
+
+
+def store(key, value, kind=""):
+    global _writes_since_prune
+    _memory.set(key, value)
+    AIAnalysisCache.objects.update_or_create(
+        key=key,
+        defaults={"kind": kind, "response": value, "created_at": timezone.now(), "last_used_at": timezone.now()},
+    )
+    _count("stores")
+    with _stats_lock:
+        _writes_since_prune += 1
+        should_prune = _writes_since_prune >= AI_CACHE_PRUNE_EVERY
+        if should_prune:
+            _writes_since_prune = 0
+    if should_prune:
+        prune()
+
+
+def prune(): # drops expired rows, then the least recently used ones above the size cap
+    AIAnalysisCache.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=AI_CACHE_TTL)).delete()
+    stale_ids = AIAnalysisCache.objects.order_by("-last_used_at").values_list("id", flat=True)[AI_CACHE_DB_MAX_ENTRIES:]
+    AIAnalysisCache.objects.filter(id__in=list(stale_ids)).delete()
+
+
+def invalidate(key=None, kind=None): # no arguments clears everything
+    if key is not None:
+        _memory.delete(key)
+        AIAnalysisCache.objects.filter(key=key).delete()
+        return
+    _memory.clear()
+    entries = AIAnalysisCache.objects.all()
+    if kind:
+        entries = entries.filter(kind=kind)
+    entries.delete()
+
+
+def cacheable(value):
+    # error strings and unparsed answers are never cached, neither are answers flagged "partial"
+    # (some issues/cards got no AI answer, a later request should try again)
+    return isinstance(value, (dict, list)) and not (isinstance(value, dict) and value.get("partial"))
+
+
+def get_or_compute(key, compute, kind=""):
+    # concurrent misses on the same key (same prompt) are coalesced into a single compute()
+    value = get(key)
+    if value is not None:
+        return value
+
+    computed = []
+
+    def compute_and_store():
+        computed.append(True)
+        value = compute()
+        if cacheable(value):
+            store(key, value, kind=kind)
+        return value
+
+    value = coalesce.shared_result(key, lambda: _peek(key), compute_and_store)
+    if not computed:
+        _count("coalesced") # served by another caller's in-flight computation
+    return value
+
+
+def _peek(key): # cache lookup that doesn't count as a hit/miss (used while waiting on another caller)
+    value = _memory.get(key)
+    if value is not None:
+        return value
+    entry = AIAnalysisCache.objects.filter(key=key).values_list("response", flat=True).first()
+    return entry
+
+
+def stats():
+    with _stats_lock:
+        current = dict(_stats)
+    lookups = current["memory_hits"] + current["db_hits"] + current["misses"]
+    hits = current["memory_hits"] + current["db_hits"]
+    current["llm_calls_saved"] = hits + current["coalesced"]
+    current["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+    current["memory_entries"] = len(_memory)
+    current["in_flight"] = coalesce.single_flight.in_flight()
+    return current
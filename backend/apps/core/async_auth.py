@@ -0,0 +1,33 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+# Authentication for the plain async (ASGI) views: they are not APIViews, so the DRF authenticators configured in
+# REST_FRAMEWORK (token, session) are run here, and they accept the same credentials as their sync twins.
+
+
+def _authenticate(request):
+    authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        user = drf_request.user
+    except exceptions.AuthenticationFailed as e: # e.g. an unknown or inactive token
+        return None, _unauthorized(authenticators, e.detail)
+    if user is None or not user.is_authenticated:
+        return None, _unauthorized(authenticators, exceptions.NotAuthenticated.default_detail)
+    return user, None
+
+
+def _unauthorized(authenticators, detail):
+    # same status and WWW-Authenticate header as an APIView with IsAuthenticated
+    header = authenticators[0].authenticate_header(None) if authenticators else None
+    response = JsonResponse({"detail": str(detail)}, status=401 if header else 403)
+    if header:
+        response["WWW-Authenticate"] = header
+    return response
+
+
+async def authenticate(request): # (user, None) or (None, error_response)
+    return await sync_to_async(_authenticate)(request)
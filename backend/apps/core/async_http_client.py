@@ -0,0 +1,94 @@
+import asyncio
+import random
+import weakref
+
+import httpx
+
+from . import rate_limit
+from .http_client import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRY_BACKOFF,
+)
+
+# Async twin of http_client for the ASGI views: one pooled httpx.AsyncClient per event loop
+# (a client can't be shared between loops), same timeouts and retry policy.
+
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_clients = weakref.WeakKeyDictionary() # event loop -> httpx.AsyncClient
+_slots = weakref.WeakKeyDictionary() # event loop -> asyncio.Semaphore
+
+
+def get_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE * 4, max_keepalive_connections=HTTP_POOL_SIZE),
+        )
+    return client
+
+
+def _slot():
+    # requests in flight per event loop, capped at the keep-alive pool size: the others wait here, in FIFO order,
+    # instead of in the httpx pool queue (which rescans every queued request on each state change)
+    loop = asyncio.get_running_loop()
+    slot = _slots.get(loop)
+    if slot is None:
+        slot = _slots[loop] = asyncio.Semaphore(HTTP_POOL_SIZE)
+    return slot
+
+
+async def request(method, url, **kwargs):
+    upstream, bucket = rate_limit.bucket_for(url, rate_limit.identity(kwargs))
+    if bucket is None:
+        return await _send(method, url, **kwargs)
+    for attempt in range(rate_limit.RATE_LIMIT_MAX_RETRIES + 1): # same rate limiting as http_client.request
+        wait, epoch = rate_limit.acquire(upstream, bucket)
+        if wait > 0:
+            rate_limit.queued(upstream, 1)
+            try:
+                waited = 0.0
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    waited += wait
+                    wait, epoch = rate_limit.acquire(upstream, bucket, waited, epoch)
+            finally:
+                rate_limit.queued(upstream, -1)
+        resp = await _send(method, url, **kwargs)
+        delay = rate_limit.observe(upstream, bucket, resp)
+        if delay is None or attempt == rate_limit.RATE_LIMIT_MAX_RETRIES or delay > rate_limit.RATE_LIMIT_MAX_WAIT:
+            return resp
+        rate_limit.retried(upstream)
+
+
+async def _send(method, url, **kwargs):
+    client = get_client()
+    method = method.upper()
+    attempts = HTTP_MAX_RETRIES + 1 if method in IDEMPOTENT_METHODS else 1
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        try:
+            async with _slot():
+                resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES or last_attempt:
+                return resp
+        # same jittered exponential backoff as the urllib3 Retry used by http_client
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * 2 ** attempt + random.uniform(0, HTTP_RETRY_BACKOFF))
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
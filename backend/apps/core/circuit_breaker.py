@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Circuit breaker for slow or failing upstreams (the LLM providers). Closed: calls go through and their
+# outcome is recorded over a sliding window. Too many errors or slow calls open it and calls are rejected
+# right away. After a cool-down it goes half-open: a few probe calls are let through, and their outcome
+# closes it again or re-opens it for another cool-down.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=20.0, slow_call_rate=0.8, open_seconds=30.0, half_open_calls=1):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.outcomes = deque(maxlen=window) # (failed, slow)
+        self.rejected = 0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.outcomes.clear()
+        self.trips += 1
+
+    def allow(self): # False while open; moves to half-open once the cool-down is over
+        with self.lock:
+            now = time.monotonic()
+            if self.state != CLOSED and now - self.opened_at >= self.open_seconds:
+                # cool-down over, or a probe never reported back: let new probes through
+                self.state = HALF_OPEN
+                self.opened_at = now
+                self.probes = 0
+            if self.state == HALF_OPEN:
+                if self.probes < self.half_open_calls:
+                    self.probes += 1
+                    return True
+            elif self.state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self): # same as `not allow()` but without taking a probe slot
+        with self.lock:
+            if self.state == CLOSED or time.monotonic() - self.opened_at >= self.open_seconds:
+                return False
+            return self.state == OPEN or self.probes >= self.half_open_calls
+
+    def record(self, success, duration=None):
+        slow = duration is not None and duration >= self.slow_call_seconds
+        with self.lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                if success and not slow:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                else:
+                    self._open(now)
+                return
+            if self.state == OPEN:
+                return # a call that started before the breaker opened
+            self.outcomes.append((not success, slow))
+            if len(self.outcomes) < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self.outcomes if failed)
+            slow_calls = sum(1 for _, was_slow in self.outcomes if was_slow)
+            if failures / len(self.outcomes) >= self.failure_rate or slow_calls / len(self.outcomes) >= self.slow_call_rate:
+                self._open(now)
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen(self.name)
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "window_calls": len(self.outcomes),
+                "window_failures": sum(1 for failed, _ in self.outcomes if failed),
+                "window_slow": sum(1 for _, slow in self.outcomes if slow),
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+def from_env(name, prefix): # CircuitBreaker configured from <PREFIX>_BREAKER_* variables
+    return CircuitBreaker(
+        name,
+        window=int(os.getenv(f"{prefix}_BREAKER_WINDOW", 20)),
+        min_calls=int(os.getenv(f"{prefix}_BREAKER_MIN_CALLS", 5)),
+        failure_rate=float(os.getenv(f"{prefix}_BREAKER_FAILURE_RATE", 0.5)),
+        slow_call_seconds=float(os.getenv(f"{prefix}_BREAKER_SLOW_CALL_SECONDS", 20)),
+        slow_call_rate=float(os.getenv(f"{prefix}_BREAKER_SLOW_CALL_RATE", 0.8)),
+        open_seconds=float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", 30)),
+        half_open_calls=int(os.getenv(f"{prefix}_BREAKER_HALF_OPEN_CALLS", 1)),
+    )
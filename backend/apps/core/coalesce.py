@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Request coalescing: concurrent callers asking for the same thing share one computation.
+# In process through SingleFlight, across worker processes through Postgres advisory locks
+# (other databases only get the in-process part).
+
+AI_COALESCE_WAIT = float(os.getenv("AI_COALESCE_WAIT", 120)) # seconds a follower waits for another process
+AI_COALESCE_POLL = float(os.getenv("AI_COALESCE_POLL", 0.5))
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {} # key -> Future of the leader
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+single_flight = SingleFlight()
+
+
+def _lock_id(name): # advisory locks take a signed bigint
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+def _supports_advisory_locks():
+    return connection.vendor == "postgresql"
+
+
+@contextmanager
+def advisory_lock(name): # blocking, cross-process
+    if not _supports_advisory_locks():
+        yield
+        return
+    lock_id = _lock_id(name)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+def try_advisory_lock(name):
+    if not _supports_advisory_locks():
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [_lock_id(name)])
+        return cursor.fetchone()[0]
+
+
+def advisory_unlock(name):
+    if not _supports_advisory_locks():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", [_lock_id(name)])
+
+
+def shared_result(key, lookup, compute):
+    # lookup() returns the stored result or None, compute() produces and stores it.
+    # the process holding the advisory lock computes, the others poll lookup() until the result
+    # shows up or the leader goes away (then one of them takes over)
+    def leader_election():
+        deadline = time.monotonic() + AI_COALESCE_WAIT
+        name = f"coalesce:{key}"
+        while True:
+            if try_advisory_lock(name):
+                try:
+                    result = lookup() # the previous leader may have finished right before we got the lock
+                    return result if result is not None else compute()
+                finally:
+                    advisory_unlock(name)
+            result = lookup()
+            if result is not None:
+                return result
+            if time.monotonic() >= deadline:
+                return compute()
+            time.sleep(AI_COALESCE_POLL)
+
+    return single_flight.do(key, leader_election)
@@ -0,0 +1,98 @@
+import atexit
+import os
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import rate_limit
+
+# Shared outbound HTTP layer: one keep-alive pool per upstream host (Atlassian, Trello, OpenRouter...)
+# so we stop paying a TCP+TLS handshake on every call.
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20)) # connections kept alive per host
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.3)) # seconds, doubled on every attempt
+
+_sessions = {} # host -> requests.Session
+_sessions_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        backoff_jitter=HTTP_RETRY_BACKOFF, # spreads retries from concurrent workers apart
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}), # only idempotent calls are retried
+        raise_on_status=False,
+        respect_retry_after_header=False, # 429 / Retry-After are handled by rate_limit, not slept on here
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # the session is shared between users, never let upstream cookies leak from one request to another
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session(url):
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _sessions[host] = _build_session()
+    return session
+
+
+def request(method, url, timeout=None, **kwargs):
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    upstream, bucket = rate_limit.bucket_for(url, rate_limit.identity(kwargs))
+    if bucket is None:
+        return get_session(url).request(method, url, timeout=timeout, **kwargs)
+    # Jira / Trello: wait for a rate-limit token, and on a 429 wait for Retry-After and send again
+    for attempt in range(rate_limit.RATE_LIMIT_MAX_RETRIES + 1):
+        wait, epoch = rate_limit.acquire(upstream, bucket)
+        if wait > 0:
+            rate_limit.queued(upstream, 1)
+            try:
+                waited = 0.0
+                while wait > 0:
+                    time.sleep(wait)
+                    waited += wait
+                    wait, epoch = rate_limit.acquire(upstream, bucket, waited, epoch)
+            finally:
+                rate_limit.queued(upstream, -1)
+        resp = get_session(url).request(method, url, timeout=timeout, **kwargs)
+        delay = rate_limit.observe(upstream, bucket, resp)
+        if delay is None or attempt == rate_limit.RATE_LIMIT_MAX_RETRIES or delay > rate_limit.RATE_LIMIT_MAX_WAIT:
+            return resp
+        resp.close()
+        rate_limit.retried(upstream)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def close_all(): # closes the pooled connections; runs at interpreter exit and between benchmark runs
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AIJob
+
+# Handlers are registered by the apps that own the work (apps.jira.jobs, apps.trello.jobs)
+# and executed by `python manage.py run_ai_worker`.
+
+AI_JOB_RETRY_BACKOFF = int(os.getenv("AI_JOB_RETRY_BACKOFF", 10)) # seconds, doubled on every attempt
+AI_JOB_STALE_AFTER = int(os.getenv("AI_JOB_STALE_AFTER", 300)) # running jobs older than this are requeued (dead worker)
+
+_handlers = {}
+
+
+def register(kind):
+    def decorator(handler):
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def make_dedupe_key(user, kind, params):
+    encoded = json.dumps([str(user.pk), kind, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def submit(user, kind, params):
+    # returns (job, created); an identical job that is still pending/running is reused
+    dedupe_key = make_dedupe_key(user, kind, params)
+    active = AIJob.objects.filter(dedupe_key=dedupe_key, status__in=[AIJob.PENDING, AIJob.RUNNING]).first()
+    if active:
+        return active, False
+    try:
+        with transaction.atomic():
+            return AIJob.objects.create(user=user, kind=kind, params=params, dedupe_key=dedupe_key), True
+    except IntegrityError: # lost the race against an identical submission
+        return AIJob.objects.get(dedupe_key=dedupe_key, status__in=[AIJob.PENDING, AIJob.RUNNING]), False
+
+
+def claim_next():
+    # the conditional UPDATE is what makes a claim exclusive, SKIP LOCKED only avoids contention on Postgres
+    now = timezone.now()
+    candidates = AIJob.objects.filter(status=AIJob.PENDING, run_after__lte=now).order_by("run_after")
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        candidate_ids = list(candidates.values_list("id", flat=True)[:5])
+        for job_id in candidate_ids:
+            claimed = AIJob.objects.filter(id=job_id, status=AIJob.PENDING).update(
+                status=AIJob.RUNNING, locked_at=now, updated_at=now, attempts=F("attempts") + 1,
+            )
+            if claimed:
+                return AIJob.objects.get(id=job_id)
+    return None
+
+
+def run(job):
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"no handler registered for job kind '{job.kind}'")
+        result = handler(job)
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+        if job.attempts < job.max_attempts and handler is not None:
+            job.status = AIJob.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=AI_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+        else:
+            job.status = AIJob.FAILED
+        job.error = error
+        job.locked_at = None
+        job.save(update_fields=["status", "run_after", "error", "locked_at", "updated_at"])
+        return job
+    job.status = AIJob.SUCCEEDED
+    job.result = result
+    job.error = ""
+    job.locked_at = None
+    job.save(update_fields=["status", "result", "error", "locked_at", "updated_at"])
+    return job
+
+
+def requeue_stale():
+    cutoff = timezone.now() - timedelta(seconds=AI_JOB_STALE_AFTER)
+    return AIJob.objects.filter(status=AIJob.RUNNING, locked_at__lt=cutoff).update(status=AIJob.PENDING, locked_at=None)
+
+
+def serialize(job):
+    data = {
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+    if job.status == AIJob.SUCCEEDED:
+        data["result"] = job.result
+    elif job.status == AIJob.FAILED:
+        data["error"] = job.error.splitlines()[0] if job.error else ""
+    return data
@@ -0,0 +1,113 @@
+import codecs
+import json
+
+# Incremental parsing of large JSON objects of the shape {"total": 10, ..., "issues": [{...}, {...}]}.
+# The body is read chunk by chunk and the items of one array are decoded and yielded as soon as they are
+# complete, so neither the raw body nor the whole decoded document has to be held in memory.
+
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+_decoder = json.JSONDecoder()
+
+
+class JSONArrayStream:
+    """Iterates over the items of ``array_key`` inside a top-level JSON object.
+
+    Every other top-level member is decoded whole and collected in ``meta``; members that come after the
+    array are only available once the iteration has finished.
+    """
+
+    def __init__(self, chunks, array_key):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.array_key = array_key
+        self.meta = {}
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read(self): # appends one more chunk to the buffer, False once the body is exhausted
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._utf8.decode(b"", final=True)
+        else:
+            text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if self._pos > JSON_STREAM_CHUNK_SIZE: # drop what was already consumed
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        self._buffer += text
+        return True
+
+    def _peek(self): # next non-whitespace character, reading more of the body when needed
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                raise ValueError("unexpected end of JSON body")
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"expected {char!r} at position {self._pos}")
+        self._pos += 1
+
+    def _value(self): # decodes one complete JSON value, growing the buffer until it parses
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            if not self._eof and self._buffer[self._pos] not in "\"{[" and self._token_at_end(end):
+                self._read() # a number may continue in the next chunk ("1." or "1e" decodes as 1)
+                continue
+            self._pos = end
+            return value
+
+    def _token_at_end(self, end): # the number characters after `end` run up to the end of the buffer
+        while end < len(self._buffer) and self._buffer[end] in _NUMBER_CHARS:
+            end += 1
+        return end == len(self._buffer)
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == self.array_key and self._peek() == "[":
+                self._pos += 1
+                if self._peek() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        separator = self._peek()
+                        self._pos += 1
+                        if separator == "]":
+                            break
+                        if separator != ",":
+                            raise ValueError(f"expected ',' or ']' at position {self._pos - 1}")
+            else:
+                self.meta[key] = self._value()
+            separator = self._peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"expected ',' or '}}' at position {self._pos - 1}")
+
+
+def iter_response_items(resp, array_key, chunk_size=JSON_STREAM_CHUNK_SIZE):
+    # (meta, items) for a `requests` response opened with stream=True; meta fills in while items are consumed
+    stream = JSONArrayStream(resp.iter_content(chunk_size=chunk_size), array_key)
+    return stream.meta, iter(stream)
@@ -0,0 +1,275 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import circuit_breaker, http_client
+
+# LLM providers behind one interface. Every provider is an OpenAI style chat completions endpoint + model
+# (OpenRouter by default). complete() fails over through the list, or with LLM_HEDGE on sends a backup
+# request to the next provider when the first one is slower than its usual latency percentile and keeps
+# whichever answers first; the other one is cancelled by shutting down its streamed response's connection.
+
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "deepseek/deepseek-chat:free")
+LLM_FALLBACK_MODELS = [model.strip() for model in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if model.strip()] # extra OpenRouter models
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "") # JSON list of {"name", "url", "model", "api_key_env"}, replaces the OpenRouter defaults
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30)) # read timeout, seconds
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.9)) # hedge once the primary is slower than this share of its calls
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 1)) # seconds
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 8)) # until enough latencies were observed
+LLM_LATENCY_WINDOW = 200 # latencies kept per provider
+LLM_LATENCY_MIN_SAMPLES = 10
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMCancelled(LLMError):
+    pass
+
+
+class LLMUnavailable(LLMError): # the circuit breaker is open, nothing was sent
+    pass
+
+
+class Cancel:
+    """Cancels a streamed completion from another thread.
+
+    ``set`` shuts down the socket of the attached response: a read blocked on a provider that sends nothing
+    fails right away (``Response.close`` from another thread would not wake it), and the connection is dropped
+    instead of going back to the pool.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._resp = None
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def attach(self, resp): # False when the call was already cancelled
+        with self._lock:
+            self._resp = resp
+            return not self._event.is_set()
+
+    def detach(self): # before the response is released, its connection may serve another request next
+        with self._lock:
+            self._resp = None
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            if self._resp is not None:
+                _shutdown(self._resp)
+
+
+def _shutdown(resp):
+    sock = getattr(getattr(resp.raw, "_connection", None), "sock", None) # urllib3 keeps it until the body is read
+    if sock is None: # "Connection: close" answers hand the socket over to the body reader (http.client)
+        body = getattr(getattr(resp.raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(body, "raw", None), "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError: # already closed by the other side
+            pass
+
+
+class Provider:
+    def __init__(self, name, url, model, api_key_env="OPENROUTER_API_KEY"):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key_env = api_key_env
+        self.latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {os.getenv(self.api_key_env)}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://localhost:8000",
+            "X-title": "Jira DeepSeek Integration",
+        }
+
+    def _payload(self, prompt, stream):
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _post(self, prompt, stream):
+        return http_client.post(
+            self.url, headers=self._headers(), json=self._payload(prompt, stream), stream=stream,
+            timeout=(http_client.HTTP_CONNECT_TIMEOUT, LLM_TIMEOUT),
+        )
+
+    def complete(self, prompt, cancel=None):
+        # whole answer as a string. With a Cancel the answer is streamed, so cancelling drops the connection
+        # instead of waiting for a completion nobody will read
+        started = time.monotonic()
+        if cancel is None:
+            resp = self._post(prompt, stream=False)
+            if not resp.ok:
+                raise LLMError(f"Error: {resp.status_code} - {resp.text}")
+            content = resp.json()["choices"][0]["message"]["content"]
+        else:
+            content = "".join(self.stream(prompt, cancel))
+        self.record(time.monotonic() - started)
+        return content
+
+    def stream(self, prompt, cancel=None):
+        # yields the completion text as it is generated (OpenAI style SSE chunks)
+        with self._post(prompt, stream=True) as resp:
+            if cancel is not None and not cancel.attach(resp):
+                raise LLMCancelled(self.name)
+            try:
+                if not resp.ok:
+                    raise LLMError(f"Error: {resp.status_code} - {resp.text}")
+                for line in resp.iter_lines(decode_unicode=True):
+                    if cancel is not None and cancel.is_set():
+                        raise LLMCancelled(self.name)
+                    if not line or not line.startswith("data:"):
+                        continue # keep-alive comments like ": OPENROUTER PROCESSING"
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    chunk = json.loads(data)
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+            except Exception:
+                if cancel is not None and cancel.is_set(): # the read failed because the connection was shut down
+                    raise LLMCancelled(self.name) from None
+                raise
+            finally:
+                if cancel is not None:
+                    cancel.detach()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def latency_percentile(self, percentile):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < LLM_LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(int(len(samples) * percentile), len(samples) - 1)]
+
+    def hedge_delay(self):
+        observed = self.latency_percentile(LLM_HEDGE_PERCENTILE)
+        return LLM_HEDGE_DEFAULT_DELAY if observed is None else max(observed, LLM_HEDGE_MIN_DELAY)
+
+
+def _load_providers():
+    if LLM_PROVIDERS:
+        return [
+            Provider(entry.get("name") or entry["model"], entry["url"], entry["model"], entry.get("api_key_env", "OPENROUTER_API_KEY"))
+            for entry in json.loads(LLM_PROVIDERS)
+        ]
+    models = [OPENROUTER_MODEL] + [model for model in LLM_FALLBACK_MODELS if model != OPENROUTER_MODEL]
+    return [Provider(f"openrouter:{model}", OPENROUTER_API_URL, model) for model in models]
+
+
+providers = _load_providers()
+# trips on the error rate or on slow calls of the whole LLM path (failover and hedging included)
+breaker = circuit_breaker.from_env("llm", "LLM")
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+def model_label(): # part of the AI cache keys, a different provider list must not reuse old answers
+    return ",".join(provider.model for provider in providers)
+
+
+def _complete_failover(prompt, candidates):
+    error = None
+    for provider in candidates:
+        try:
+            return provider.complete(prompt)
+        except Exception as e:
+            error = e
+    raise error
+
+
+def _complete_hedged(prompt, primary, backup):
+    cancels = {primary: Cancel(), backup: Cancel()}
+    futures = {_hedge_executor.submit(primary.complete, prompt, cancels[primary]): primary}
+    done, _ = wait(futures, timeout=primary.hedge_delay())
+    if not done or next(iter(done)).exception() is not None:
+        futures[_hedge_executor.submit(backup.complete, prompt, cancels[backup])] = backup
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                winner = futures[future]
+                for provider, cancel in cancels.items():
+                    if provider is not winner:
+                        cancel.set()
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def complete(prompt):
+    # raises LLMError (or the transport error) when no provider produced an answer,
+    # LLMUnavailable right away while the circuit breaker is open
+    try:
+        return breaker.call(_complete, prompt)
+    except circuit_breaker.CircuitOpen:
+        raise LLMUnavailable("Error: AI temporarily unavailable")
+
+
+def _complete(prompt):
+    if LLM_HEDGE and len(providers) > 1:
+        try:
+            return _complete_hedged(prompt, providers[0], providers[1])
+        except Exception:
+            if len(providers) == 2:
+                raise
+            return _complete_failover(prompt, providers[2:])
+    return _complete_failover(prompt, providers)
+
+
+def available(): # False while the breaker is open, callers can answer with their local fallback instead
+    return not breaker.is_open()
+
+
+def stream(prompt):
+    # streams from the first provider that starts answering; once tokens were sent there is no failover.
+    # only the outcome goes to the breaker, a long stream is not a slow call
+    if not breaker.allow():
+        raise LLMUnavailable("Error: AI temporarily unavailable")
+    error = None
+    for provider in providers:
+        started = False
+        try:
+            for content in provider.stream(prompt):
+                started = True
+                yield content
+            breaker.record(True)
+            return
+        except GeneratorExit:
+            breaker.record(True) # the client went away, the provider was fine
+            raise
+        except Exception as e:
+            if started:
+                breaker.record(False)
+                raise
+            error = e
+    breaker.record(False)
+    raise error
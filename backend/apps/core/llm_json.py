@@ -0,0 +1,250 @@
+import json
+import re
+
+# Tolerant, incremental parser for the JSON answers of the LLM. The prompts ask for a single-quoted pseudo-JSON
+# and models wrap it in prose or code fences, leave trailing commas, put raw quotes and newlines inside strings
+# or get cut off by max_tokens. Text can be fed as it streams (feed), the value built so far is always available
+# (value) and close() finishes it, closing whatever was left open (and sets `truncated`). validate() then checks the result against
+# the small schemas the Jira and Trello services declare for their answers.
+
+LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"', "'": "'"}
+STRING_CLOSERS = ",:}]" # a quote followed by one of these (or by a line break) ends the string
+ARRAY_STARTERS = "{[\"']" # "[" only starts the answer when followed by one of these, prose uses brackets too
+
+_STRING_RUN = {'"': re.compile(r'[^"\\]+'), "'": re.compile(r"[^'\\]+")}
+_BAREWORD_RUN = re.compile(r"[^\s{}\[\],:\"']+")
+_WHITESPACE = re.compile(r"\s+")
+_SURROGATE = re.compile("[\ud800-\udfff]")
+
+
+class TolerantJSONParser:
+    def __init__(self):
+        self.root = None
+        self.stack = [] # open containers: [container, pending key, colon seen]
+        self.mode = "prose" # prose, array_start, value, string, string_end, done
+        self.quote = None
+        self.parts = [] # pieces of the current string or bareword
+        self.escape = None # escape sequence being read, "\" excluded
+        self.pending = "" # whitespace after a quote that may or may not end the string
+        self.truncated = False # set by close() when the answer was cut off and had to be completed
+
+    @property
+    def value(self): # the value decoded so far (live, it keeps growing while text is fed)
+        return self.root
+
+    def feed(self, text):
+        position, end = 0, len(text)
+        while position < end and self.mode != "done":
+            mode = self.mode
+            if mode == "prose":
+                starts = [index for index in (text.find("{", position), text.find("[", position)) if index != -1]
+                if not starts:
+                    break
+                position = min(starts) + 1
+                if text[position - 1] == "{":
+                    self._open({})
+                else:
+                    self.mode = "array_start"
+                continue
+            char = text[position]
+            if mode == "array_start":
+                if char.isspace():
+                    position += 1
+                elif char in ARRAY_STARTERS or char == "]":
+                    self._open([]) # the character is processed again as part of the array
+                else:
+                    self.mode = "prose"
+                continue
+            if mode == "string":
+                if self.escape is not None:
+                    position = self._read_escape(text, position)
+                elif char == "\\":
+                    self.escape = ""
+                    position += 1
+                elif char == self.quote:
+                    self.mode = "string_end"
+                    self.pending = ""
+                    position += 1
+                else:
+                    match = _STRING_RUN[self.quote].match(text, position)
+                    self.parts.append(match.group())
+                    position = match.end()
+                continue
+            if mode == "string_end":
+                if char.isspace():
+                    self.pending += char
+                    position += 1
+                elif char in STRING_CLOSERS or "\n" in self.pending:
+                    self._finish_string()
+                else:
+                    # a quote inside the text ("it's", 'use "Redis"'): keep it and go on with the string
+                    self.parts.append(self.quote + self.pending)
+                    self.mode = "string"
+                continue
+            position = self._read_value(text, position, char)
+        return self
+
+    def _read_value(self, text, position, char):
+        if char.isspace():
+            match = _WHITESPACE.match(text, position)
+            if self.parts: # unquoted words may contain spaces, a line break ends them
+                if "\n" in match.group():
+                    self._finish_bareword()
+                else:
+                    self.parts.append(" ")
+            return match.end()
+        if char in "{}[],:\"'":
+            self._finish_bareword()
+        else:
+            match = _BAREWORD_RUN.match(text, position)
+            self.parts.append(match.group())
+            return match.end()
+        frame = self.stack[-1]
+        if char == "{":
+            self._open({})
+        elif char == "[":
+            self._open([])
+        elif char in "}]": # closes the innermost container whatever its kind
+            self.stack.pop()
+            if not self.stack: # an empty top-level value ("{}" in the prose) is not the answer, keep looking
+                self.mode = "done" if self.root else "prose"
+                if not self.root:
+                    self.root = None
+        elif char == ",": # trailing and doubled commas are ignored
+            frame[1], frame[2] = None, False
+        elif char == ":":
+            frame[2] = frame[1] is not None
+        else:
+            self.mode = "string"
+            self.quote = char
+        return position + 1
+
+    def _read_escape(self, text, position):
+        self.escape += text[position]
+        if self.escape[0] == "u":
+            if len(self.escape) < 5:
+                return position + 1
+            try:
+                self.parts.append(chr(int(self.escape[1:], 16)))
+            except ValueError:
+                self.parts.append(self.escape)
+        else:
+            self.parts.append(ESCAPES.get(self.escape, self.escape))
+        self.escape = None
+        return position + 1
+
+    def _open(self, container):
+        if self.stack:
+            frame = self.stack[-1]
+            parent = frame[0]
+            if isinstance(parent, list):
+                parent.append(container)
+            elif frame[1] is not None: # attached right away so partial values include it; a missing ":" is tolerated
+                parent[frame[1]] = container
+                frame[1], frame[2] = None, False
+        elif self.root is None:
+            self.root = container
+        self.stack.append([container, None, False])
+        self.mode = "value"
+
+    def _add(self, value):
+        frame = self.stack[-1]
+        container = frame[0]
+        if isinstance(container, list):
+            container.append(value)
+        elif frame[2]:
+            container[frame[1]] = value
+            frame[1], frame[2] = None, False
+        else: # a key; a key without a value is dropped
+            frame[1] = value if isinstance(value, str) else json.dumps(value)
+
+    def _finish_string(self):
+        value = "".join(self.parts)
+        if _SURROGATE.search(value): # \u escaped surrogate pairs
+            value = value.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        self.parts = []
+        self.escape = None
+        self.mode = "value"
+        self._add(value)
+
+    def _finish_bareword(self):
+        word = "".join(self.parts).strip()
+        self.parts = []
+        if not word:
+            return
+        if word in LITERALS:
+            self._add(LITERALS[word])
+            return
+        try:
+            self._add(json.loads(word) if word[0] in "-0123456789" else word)
+        except ValueError:
+            self._add(word) # unquoted text
+
+    def close(self): # finishes a truncated answer and returns the decoded value (None when there was none)
+        self.truncated = self.mode != "done" and bool(self.stack)
+        if self.mode in ("string", "string_end"):
+            self._finish_string()
+        elif self.mode == "value":
+            self._finish_bareword()
+        self.stack = []
+        self.mode = "done"
+        return self.root
+
+
+def decode(text):
+    # (value, truncated): the decoded value of an LLM answer, None when it holds no JSON object/array, and
+    # whether the answer was cut off (its value was completed by close()). Valid JSON takes the fast path
+    try:
+        value = json.loads(text)
+        if isinstance(value, (dict, list)):
+            return value, False
+    except ValueError:
+        pass
+    parser = TolerantJSONParser().feed(text)
+    return parser.close(), parser.truncated
+
+
+def parse(text):
+    return decode(text)[0]
+
+
+def validate(value, schema):
+    # (value, error): checks `value` against a schema made of {"type", "required", "values", "items"} dicts
+    # ({} accepts anything, a tuple is a list of alternatives). Items and values that don't match are dropped
+    # (e.g. the half task left by a truncated answer) instead of failing the whole answer
+    if isinstance(schema, tuple):
+        errors = []
+        for alternative in schema:
+            checked, error = validate(value, alternative)
+            if error is None:
+                return checked, None
+            errors.append(error)
+        return None, " / ".join(errors)
+    expected = schema.get("type")
+    if expected is not None and not isinstance(value, expected):
+        return None, f"expected {expected.__name__}, got {type(value).__name__}"
+    if "required" in schema:
+        checked = dict(value)
+        for key, key_schema in schema["required"].items():
+            if key not in value:
+                return None, f"missing '{key}'"
+            checked[key], error = validate(value[key], key_schema)
+            if error:
+                return None, f"'{key}': {error}"
+        value = checked
+    if "values" in schema:
+        checked = {}
+        for key, item in value.items():
+            item, error = validate(item, schema["values"])
+            if error is None:
+                checked[key] = item
+        value = checked
+    if "items" in schema:
+        checked = []
+        for item in value:
+            item, error = validate(item, schema["items"])
+            if error is None:
+                checked.append(item)
+        value = checked
+    return value, None
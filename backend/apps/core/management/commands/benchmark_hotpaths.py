@@ -0,0 +1,310 @@
+import json
+import platform
+import random
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import llm_json, similarity
+from apps.core.json_stream import JSON_STREAM_CHUNK_SIZE, JSONArrayStream
+from apps.jira.adf import adf_to_text
+from apps.jira.dependencies import dependency_summary
+from apps.jira.ordering import local_order, score_issues
+from apps.jira.services import build_ai_prompt, dedupe_issues, extract_description, filter_issues, process_ai_response
+from apps.trello.ordering import score_cards
+from apps.trello.services import build_trello_prompt, group_cards_by_list
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "hotpaths.json"
+DEFAULT_SIZES = [100, 1000, 5000, 10000, 50000]
+LARGE_SIZES = [100000] # default sizes only for LARGE_BENCHMARKS, the other inputs take minutes to build at this size
+MIN_MEMORY_DELTA = 64 * 1024 # smaller peak-memory changes are noise, never a regression
+
+WORDS = (
+    "user login page error api endpoint request response token cache database query index migration "
+    "report export csv dashboard filter sort board card list sprint backlog deploy build pipeline test "
+    "timeout retry payment invoice email notification webhook upload file image search permission role "
+    "admin settings profile session mobile layout button form validation field date timezone locale"
+).split()
+STATUSES = ["To Do", "In Progress", "In Review", "Done", "Blocked"]
+ISSUE_TYPES = ["Bug", "Story", "Task", "Improvement", "Sub-task"]
+PRIORITIES = ["Highest", "High", "Medium", "Low", "Lowest"]
+TRELLO_LISTS = ["Backlog", "To Do", "Doing", "Review", "Done", "Ideas", "Bugs", "Blocked"]
+BLOCKS = {"name": "Blocks", "inward": "is blocked by", "outward": "blocks"}
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def _paragraph(rng):
+    return {"type": "paragraph", "content": [
+        {"type": "text", "text": _sentence(rng)},
+        {"type": "text", "text": _sentence(rng, 6), "marks": [{"type": "strong"}]},
+        {"type": "hardBreak"},
+        {"type": "text", "text": _sentence(rng, 8)},
+    ]}
+
+
+def _adf(rng, blocks):
+    # Atlassian Document Format description with the node types Jira descriptions are made of
+    content = []
+    for index in range(blocks):
+        if index % 5 == 2:
+            content.append({"type": "codeBlock", "attrs": {"language": "python"}, "content": [{"type": "text", "text": "\n".join(_sentence(rng, 5) for _ in range(4))}]})
+        elif index % 5 == 3:
+            content.append({"type": "bulletList", "content": [{"type": "listItem", "content": [_paragraph(rng)]} for _ in range(3)]})
+        elif index % 10 == 4:
+            content.append({"type": "table", "content": [
+                {"type": "tableRow", "content": [{"type": "tableCell", "content": [_paragraph(rng)]} for _ in range(3)]}
+                for _ in range(3)
+            ]})
+        else:
+            content.append(_paragraph(rng))
+    return {"type": "doc", "version": 1, "content": content}
+
+
+class HotpathInputs:
+    # deterministic synthetic inputs for one size, each built on first use (outside of the measurements)
+    def __init__(self, size, seed=1):
+        self.size = size
+        self.seed = seed
+
+    @cached_property
+    def raw_issues(self): # Jira search API issues; every 25th has a large description, every 10th is a near-duplicate
+        rng = random.Random(self.seed)
+        issues = []
+        for index in range(self.size):
+            if index % 10 == 9:
+                original = issues[rng.randrange(index)]["fields"]
+                summary, description = original["summary"], original["description"]
+            else:
+                summary, description = _sentence(rng, 7), _adf(rng, 60 if index % 25 == 0 else rng.randint(1, 6))
+            links = []
+            if index and rng.random() < 0.3:
+                links.append({"type": BLOCKS, "inwardIssue": {"key": f"BENCH-{rng.randrange(1, index + 1)}"}})
+            issues.append({"id": str(10000 + index), "key": f"BENCH-{index + 1}", "fields": {
+                "summary": summary,
+                "description": description,
+                "status": {"name": rng.choice(STATUSES)},
+                "assignee": {"displayName": f"Developer {rng.randrange(20)}"} if rng.random() < 0.8 else None,
+                "issuetype": {"name": rng.choice(ISSUE_TYPES)},
+                "priority": {"name": rng.choice(PRIORITIES)},
+                "updated": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00.000+0000",
+                "issuelinks": links,
+                "subtasks": [],
+            }})
+        return issues
+
+    @cached_property
+    def descriptions(self):
+        return [issue["fields"]["description"] for issue in self.raw_issues]
+
+    @cached_property
+    def large_adf(self): # a single description made of `size` blocks
+        return _adf(random.Random(self.seed), self.size)
+
+    @cached_property
+    def deep_adf(self): # lists nested `size` levels deep, past the recursion limit of a recursive walker
+        rng = random.Random(self.seed)
+        node = _paragraph(rng)
+        for _ in range(self.size):
+            node = {"type": "bulletList", "content": [{"type": "listItem", "content": [_paragraph(rng), node]}]}
+        return {"type": "doc", "version": 1, "content": [node]}
+
+    @cached_property
+    def filtered_issues(self):
+        return filter_issues(self.raw_issues)
+
+    @cached_property
+    def ordering_issues(self): # filter_issues output built directly (no ADF), cheap enough for the large sizes
+        rng = random.Random(self.seed)
+        issues = []
+        for index in range(self.size):
+            links = []
+            if index and rng.random() < 0.3:
+                links.append({"key": f"BENCH-{rng.randrange(1, index + 1)}", "relation": rng.choice(["blocks", "blocked_by", "relates"])})
+            issues.append({
+                "id": str(10000 + index),
+                "key": f"BENCH-{index + 1}",
+                "summary": _sentence(rng, 7),
+                "description": "x" * rng.randint(0, 3000),
+                "status": rng.choice(STATUSES),
+                "assignee": f"Developer {rng.randrange(20)}" if rng.random() < 0.8 else None,
+                "issuetype": rng.choice(ISSUE_TYPES),
+                "priority": rng.choice(PRIORITIES),
+                "updated": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}.000+0000",
+                "links": links,
+                "subtasks": [f"BENCH-{rng.randrange(1, index + 1)}"] if index and rng.random() < 0.05 else [],
+            })
+        return issues
+
+    @cached_property
+    def similarity_texts(self): # what dedupe_issues indexes, every 10th issue is a near-duplicate
+        return [f"{issue['summary'] or ''}\n{(issue['description'] or '')[:similarity.MAX_TEXT_CHARS]}" for issue in self.filtered_issues]
+
+    @cached_property
+    def search_body_chunks(self): # a Jira search response body, split the way iter_content() delivers it
+        body = json.dumps({"startAt": 0, "maxResults": self.size, "total": self.size, "issues": self.raw_issues}).encode()
+        return [body[start:start + JSON_STREAM_CHUNK_SIZE] for start in range(0, len(body), JSON_STREAM_CHUNK_SIZE)]
+
+    @cached_property
+    def ai_tasks(self): # the legacy list answer, one task per issue
+        return [
+            {"ID": issue["id"], "Title": issue["summary"], "Recommended strategy": issue["description"][:200], "Time estimate": "4 hours"}
+            for issue in self.filtered_issues
+        ]
+
+    @cached_property
+    def ai_answer_text(self): # pseudo-JSON answer with prose and a code fence around it, like the models write it
+        answer = json.dumps({"mensagem": "Ordered by priority.", "tasks": self.ai_tasks}, indent=2).replace('"', "'")
+        return "Here is the analysis:\n```json\n" + answer + "\n```"
+
+    @cached_property
+    def trello_board(self): # raw board snapshot: lists and cards
+        rng = random.Random(self.seed)
+        lists = [{"id": f"list{index}", "name": name} for index, name in enumerate(TRELLO_LISTS)]
+        cards = [
+            {"id": f"card{index}", "idList": rng.choice(lists)["id"], "name": _sentence(rng, 6), "desc": _sentence(rng, 30)}
+            for index in range(self.size)
+        ]
+        return {"name": "Benchmark board", "lists": lists, "cards": cards}
+
+    @cached_property
+    def trello_lists(self): # the board grouped by list, as the Trello prompt receives it
+        board = self.trello_board
+        return group_cards_by_list(board["name"], board["lists"], board["cards"])
+
+
+# name -> (HotpathInputs attributes passed as arguments, function measured). The inputs are built before timing
+BENCHMARKS = {
+    "filter_issues": (("raw_issues",), filter_issues),
+    "extract_description": (("descriptions",), lambda descriptions: [extract_description(description) for description in descriptions]),
+    "adf_large": (("large_adf",), adf_to_text),
+    "adf_deep": (("deep_adf",), adf_to_text),
+    "adf_capped": (("large_adf",), lambda document: adf_to_text(document, 2000)), # stops early, only the top-level blocks are scanned in full
+    "json_stream": (("search_body_chunks",), lambda chunks: sum(1 for _ in JSONArrayStream(chunks, "issues"))),
+    "build_ai_prompt": (("filtered_issues",), lambda issues: build_ai_prompt(issues, "prioridade")),
+    "build_trello_prompt": (("trello_lists",), lambda lists: build_trello_prompt(lists, "prioridade")),
+    "process_ai_response": (("ai_tasks", "filtered_issues"), process_ai_response),
+    "parse_ai_answer": (("ai_answer_text",), llm_json.parse),
+    "score_issues": (("filtered_issues",), lambda issues: score_issues(issues, "prioridade")),
+    "dependency_summary": (("filtered_issues",), dependency_summary),
+    "order_issues": (("ordering_issues",), lambda issues: score_issues(issues, "prioridade")),
+    "order_by_dependencies": (("ordering_issues",), lambda issues: score_issues(issues, "dependências")),
+    "order_fallback": (("ordering_issues",), local_order), # the AI fallback, default weights
+    "order_cards": (("trello_lists",), lambda lists: score_cards(lists, "urgencia da tarefa")),
+    "dedupe_issues": (("filtered_issues",), dedupe_issues),
+    # the similarity index step by step: bigram keys, MinHash signatures, then LSH candidates and clustering
+    "similarity_shingles": (("similarity_texts",), similarity.shingle_keys),
+    "similarity_signatures": (("similarity_texts",), similarity.minhash_signatures),
+    "similarity_clusters": (("similarity_texts",), similarity.near_duplicate_labels),
+    "group_cards_by_list": (("trello_board",), lambda board: group_cards_by_list(board["name"], board["lists"], board["cards"])),
+}
+LARGE_BENCHMARKS = {"order_issues", "order_by_dependencies", "order_fallback", "order_cards"}
+
+
+def measure(func, repeat):
+    # (best seconds per call, peak traced bytes of one call). Timing and tracing are separate runs,
+    # tracemalloc slows the code down a lot
+    timer = timeit.Timer(func)
+    number, first = timer.autorange() # the calibration run counts as the first round
+    seconds = min([first] + timer.repeat(repeat=max(repeat - 1, 0), number=number)) / number
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def _format_seconds(seconds):
+    return f"{seconds * 1000:.2f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+
+def _format_bytes(size):
+    return f"{size / 1024:.0f} KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the data-shaping hot paths (Jira/Trello fetch shaping, prompt building, AI answer handling, local "
+        "ordering, near-duplicate indexing) on synthetic inputs, offline, with items per second. Results are compared with a JSON baseline and the command fails when "
+        "time or peak memory regressed past the thresholds; --save writes the baseline (baselines are per machine)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+",
+            help=f"number of issues/cards per input (default {DEFAULT_SIZES}, plus {LARGE_SIZES} for the local ordering benchmarks)",
+        )
+        parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+        parser.add_argument("--repeat", type=int, default=3, help="timing rounds, the best one is kept")
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="JSON baseline file")
+        parser.add_argument("--save", action="store_true", help="write the results to the baseline instead of failing on regressions")
+        parser.add_argument("--time-threshold", type=float, default=0.3, help="allowed slowdown, 0.3 = 30%% slower")
+        parser.add_argument("--memory-threshold", type=float, default=0.2, help="allowed peak memory growth, 0.2 = 20%% more")
+
+    def handle(self, *args, **options):
+        baseline = self._load(options["baseline"])
+        names = options["only"] or list(BENCHMARKS)
+        results, regressions = {}, []
+        for size in options["sizes"] or DEFAULT_SIZES + LARGE_SIZES:
+            inputs = HotpathInputs(size)
+            for name in names:
+                if not options["sizes"] and size in LARGE_SIZES and name not in LARGE_BENCHMARKS:
+                    continue
+                fields, func = BENCHMARKS[name]
+                arguments = [getattr(inputs, field) for field in fields]
+                seconds, peak = measure(lambda: func(*arguments), options["repeat"])
+                key = f"{name}[{size}]"
+                results[key] = {"seconds": seconds, "peak_bytes": peak}
+                line = f"{key:<32} {_format_seconds(seconds):>10} {size / seconds:>12,.0f}/s {_format_bytes(peak):>9}"
+                previous = baseline["results"].get(key)
+                if previous:
+                    time_change = seconds / previous["seconds"] - 1
+                    memory_change = peak / max(previous["peak_bytes"], 1) - 1
+                    line += f"   time {time_change:+.0%}  memory {memory_change:+.0%}"
+                    if time_change > options["time_threshold"]:
+                        regressions.append(f"{key}: {time_change:+.0%} time")
+                    if memory_change > options["memory_threshold"] and peak - previous["peak_bytes"] > MIN_MEMORY_DELTA:
+                        regressions.append(f"{key}: {memory_change:+.0%} peak memory")
+                self.stdout.write(line)
+
+        if options["save"]:
+            baseline["results"].update(results)
+            baseline["environment"] = self._environment()
+            baseline["recorded_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            options["baseline"].parent.mkdir(parents=True, exist_ok=True)
+            options["baseline"].write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+            self.stdout.write(f"baseline saved to {options['baseline']}")
+            return
+        if baseline["environment"] and baseline["environment"] != self._environment():
+            self.stderr.write(f"baseline recorded on a different environment: {baseline['environment']}")
+        if regressions:
+            raise CommandError("performance regressions:\n" + "\n".join(regressions))
+        if not baseline["results"]:
+            self.stdout.write("no baseline yet, run with --save to record one")
+
+    def _load(self, path):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"environment": None, "results": {}}
+        except (OSError, ValueError) as e:
+            raise CommandError(f"could not read the baseline {path}: {e}")
+        return {"environment": data.get("environment"), "results": data.get("results", {})}
+
+    def _environment(self):
+        return {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor() or None,
+        }
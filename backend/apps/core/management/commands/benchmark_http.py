@@ -0,0 +1,133 @@
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import http_client
+
+BODY = b'{"issues": []}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the Atlassian / Trello / OpenRouter endpoints
+    disable_nagle_algorithm = True # headers and body go out in separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _BenchmarkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    context = None
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.context is not None: # the handshake runs in the handler thread, not in the accept loop
+            sock = self.context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        return sock, address
+
+    def finish_request(self, request, client_address):
+        if self.context is not None:
+            try:
+                request.do_handshake()
+            except (ssl.SSLError, OSError):
+                return
+        super().finish_request(request, client_address)
+
+
+def _self_signed_certificate(directory):
+    # (cert, key) for 127.0.0.1, made with the openssl CLI so the benchmark needs no extra Python package
+    cert, key = Path(directory) / "cert.pem", Path(directory) / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", str(key), "-out", str(cert),
+         "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def _percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares a new connection per call (plain requests.get) with the pooled keep-alive sessions of "
+        "apps.core.http_client against a local server, over TLS by default, and prints latency and connection counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="calls per mode")
+        parser.add_argument("--concurrency", type=int, default=8, help="threads sending the calls")
+        parser.add_argument("--no-tls", action="store_true", help="plain HTTP, measures the TCP handshake only")
+
+    def handle(self, *args, **options):
+        tls = not options["no_tls"]
+        if tls and shutil.which("openssl") is None:
+            raise CommandError("openssl not found, install it or run with --no-tls")
+        with tempfile.TemporaryDirectory() as directory:
+            server = _BenchmarkServer(("127.0.0.1", 0), _Handler)
+            server.lock = threading.Lock()
+            server.connections = 0
+            verify = True
+            if tls:
+                cert, key = _self_signed_certificate(directory)
+                server.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                server.context.load_cert_chain(cert, key)
+                verify = str(cert)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            url = f"{'https' if tls else 'http'}://127.0.0.1:{server.server_address[1]}/rest/api/3/search"
+            try:
+                for name, call in (
+                    ("new connection per call", lambda: requests.get(url, verify=verify, timeout=10)),
+                    ("http_client pooled session", lambda: http_client.get(url, verify=verify)),
+                ):
+                    http_client.close_all()
+                    with server.lock:
+                        server.connections = 0
+                    self._run(name, call, options["requests"], options["concurrency"], server)
+            finally:
+                http_client.close_all()
+                server.shutdown()
+                server.server_close()
+
+    def _run(self, name, call, count, concurrency, server):
+        def timed(_):
+            started = time.perf_counter()
+            resp = call()
+            resp.content
+            resp.close()
+            if resp.status_code != 200:
+                raise CommandError(f"{name}: unexpected status {resp.status_code}")
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, range(count)))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{name:<28} {count / elapsed:8.0f} req/s   p50 {_percentile(latencies, 0.5) * 1000:6.2f} ms   "
+            f"p99 {_percentile(latencies, 0.99) * 1000:6.2f} ms   {server.connections} connections"
+        )
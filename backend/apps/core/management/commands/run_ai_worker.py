@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from apps.core import jobs
+
+
+class Command(BaseCommand):
+    help = "Processes queued AI analysis jobs (Jira issues / Trello boards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="jobs processed at the same time by this worker")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="drain the queue and exit instead of polling forever")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.poll_interval = options["poll_interval"]
+        self.once = options["once"]
+        jobs.requeue_stale()
+        threads = [
+            threading.Thread(target=self._loop, name=f"ai-worker-{index}", daemon=True)
+            for index in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"AI worker started with {len(threads)} slot(s)")
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            self.stdout.write("stopping, waiting for running jobs...")
+            for thread in threads:
+                thread.join()
+
+    def _loop(self):
+        while not self.stop.is_set():
+            close_old_connections()
+            try:
+                job = jobs.claim_next()
+            except DatabaseError as e: # e.g. "database is locked" when several slots poll SQLite at once
+                self.stderr.write(f"could not claim a job: {e}")
+                self.stop.wait(self.poll_interval)
+                continue
+            if job is None:
+                if self.once:
+                    return
+                self.stop.wait(self.poll_interval)
+                continue
+            started = time.monotonic()
+            job = jobs.run(job)
+            self.stdout.write(f"{job.kind} {job.id} -> {job.status} in {time.monotonic() - started:.1f}s")
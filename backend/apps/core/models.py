@@ -0,0 +1,64 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+# Persistent tier of the AI analysis cache (see ai_cache.py).
+# The key is a sha256 of the normalized input, so identical issue sets share one entry.
+
+class AIAnalysisCache(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=32) # "jira" or "trello"
+    response = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind}:{self.key[:12]}"
+
+
+# DB-backed queue for AI analyses (see jobs.py and the run_ai_worker command).
+# Only one pending/running job may exist per dedupe_key, resubmitting returns the same job.
+
+class AIJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict)
+    dedupe_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(auto_now_add=True) # pushed forward on retry
+    locked_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=models.Q(status__in=["pending", "running"]),
+                name="unique_active_ai_job",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.id} ({self.status})"
@@ -0,0 +1,144 @@
+import logging
+import os
+from bisect import bisect_right
+from itertools import accumulate
+
+# Shared prompt assembly for the Jira and Trello analyses.
+# Parts are collected in a list and joined once (linear time), token counts are estimated,
+# and when a budget is set descriptions are shortened with one common cap until the prompt fits.
+
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", 12000)) # 0 disables compaction
+AI_PROMPT_DESCRIPTION_MAX_CHARS = int(os.getenv("AI_PROMPT_DESCRIPTION_MAX_CHARS", 1500)) # hard cap, budget or not
+MIN_DESCRIPTION_CHARS = 40 # below this a description is dropped instead of truncated
+ELLIPSIS = "..."
+
+logger = logging.getLogger(__name__)
+
+
+def log_report(name, report):
+    # called with the report of every prompt sent to the LLM: thin answers are often explained by cut descriptions
+    if report["over_budget"]:
+        logger.warning(
+            "%s prompt over budget: ~%d tokens for a budget of %d (%d items)",
+            name, report["estimated_tokens"], report["token_budget"], report["items"],
+        )
+    elif report["descriptions_truncated"]:
+        logger.info(
+            "%s prompt: %d descriptions cut to %d characters to fit %d tokens (%d items)",
+            name, report["descriptions_truncated"], report["description_cap"], report["token_budget"], report["items"],
+        )
+    return report
+
+
+def estimate_tokens(text): # rough but stable estimate, ~4 characters per token
+    return len(text) // 4 + 1
+
+
+def compact_text(text, max_chars=None):
+    # collapses whitespace and cuts on a word boundary, always the same output for the same input
+    text = " ".join((text or "").split())
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    if max_chars < MIN_DESCRIPTION_CHARS:
+        return ""
+    cut = text[:max_chars - len(ELLIPSIS)]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:") + ELLIPSIS
+
+
+class PromptBuilder:
+    """Collects a header and a list of items, then renders them under an optional token budget.
+
+    Items are lists of (label, value) pairs rendered as "label: value" lines; empty values are
+    dropped and the field named by ``description_field`` is the one compacted to fit the budget.
+    """
+
+    def __init__(self, header, token_budget=AI_PROMPT_TOKEN_BUDGET, max_description_chars=AI_PROMPT_DESCRIPTION_MAX_CHARS, description_field="Description"):
+        self.header = header
+        self.token_budget = token_budget
+        self.max_description_chars = max_description_chars
+        self.description_field = description_field
+        self.items = []
+        self.dropped_fields = 0
+
+    def add_item(self, fields):
+        kept = []
+        for label, value in fields:
+            if value is None or value == "":
+                self.dropped_fields += 1
+                continue
+            if label == self.description_field:
+                value = compact_text(str(value), self.max_description_chars)
+                if not value:
+                    self.dropped_fields += 1
+                    continue
+            kept.append((label, str(value)))
+        self.items.append(kept)
+        return self
+
+    def _measure(self):
+        # fixed characters, plus the sorted description lengths with prefix sums so any cap is sized in O(log n)
+        fixed = len(self.header)
+        lengths = []
+        for fields in self.items:
+            fixed += 1 # blank line after each item
+            for label, value in fields:
+                if label == self.description_field:
+                    lengths.append(len(value))
+                else:
+                    fixed += len(label) + 3 + len(value) # "label: value\n"
+        lengths.sort()
+        prefix = list(accumulate(lengths, initial=0))
+        return fixed, lengths, prefix
+
+    def _find_cap(self, budget_chars):
+        fixed, lengths, prefix = self._measure()
+        line_overhead = len(self.description_field) + 3
+
+        def size(cap): # rendered prompt length if every description is cut to `cap` characters
+            if cap < MIN_DESCRIPTION_CHARS:
+                return fixed
+            shorter = bisect_right(lengths, cap)
+            return fixed + len(lengths) * line_overhead + prefix[shorter] + (len(lengths) - shorter) * cap
+
+        longest = lengths[-1] if lengths else 0
+        if size(longest) <= budget_chars:
+            return None
+        low, high = 0, longest # largest cap that fits, size() grows with the cap
+        while low < high:
+            middle = (low + high + 1) // 2
+            if size(middle) <= budget_chars:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def build(self):
+        cap = None
+        if self.token_budget:
+            cap = self._find_cap(self.token_budget * 4)
+        parts = [self.header]
+        truncated = 0
+        for fields in self.items:
+            for label, value in fields:
+                if label == self.description_field and cap is not None and len(value) > cap:
+                    value = compact_text(value, cap)
+                    truncated += 1
+                    if not value:
+                        continue
+                parts.append(f"{label}: {value}\n")
+            parts.append("\n")
+        prompt = "".join(parts)
+        estimated = estimate_tokens(prompt)
+        report = {
+            "estimated_tokens": estimated,
+            "token_budget": self.token_budget or None,
+            "items": len(self.items),
+            "description_cap": cap,
+            "descriptions_truncated": truncated,
+            "dropped_fields": self.dropped_fields,
+            "over_budget": bool(self.token_budget) and estimated > self.token_budget,
+        }
+        return prompt, report
@@ -0,0 +1,210 @@
+import hashlib
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from django.utils.dateparse import parse_datetime
+
+# Outbound rate limiting for the Jira and Trello APIs: one token bucket per (upstream, user token).
+# Calls wait for a token instead of being sent into a 429, and 429 / Retry-After / X-RateLimit-* answers
+# pause the bucket so the following calls are spaced out too. Used by http_client and async_http_client.
+
+JIRA_RATE_LIMIT = float(os.getenv("JIRA_RATE_LIMIT", 10)) # requests per second per user token
+JIRA_RATE_BURST = int(os.getenv("JIRA_RATE_BURST", 20))
+TRELLO_RATE_LIMIT = float(os.getenv("TRELLO_RATE_LIMIT", 9)) # Trello allows 100 requests / 10s per token
+TRELLO_RATE_BURST = int(os.getenv("TRELLO_RATE_BURST", 10))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 30)) # longest a call is held back, it is sent anyway after that
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", 3)) # 429 answers retried after their Retry-After
+RATE_LIMIT_MAX_BUCKETS = 10000
+
+UPSTREAMS = { # host -> (upstream, rate, burst)
+    "api.atlassian.com": ("jira", JIRA_RATE_LIMIT, JIRA_RATE_BURST),
+    "api.trello.com": ("trello", TRELLO_RATE_LIMIT, TRELLO_RATE_BURST),
+}
+
+
+class TokenBucket:
+    """Reservation based token bucket: ``reserve`` never blocks, it returns how long the caller must wait.
+
+    Tokens can go negative, so concurrent callers get consecutive slots instead of all waking up at once.
+    A pause (429, exhausted quota) moves the refill start past the pause and bumps ``epoch``: callers that
+    reserved a slot before it take a new one, so they don't all fire together the moment the pause ends.
+    A 429 also halves the rate and every successful call gives back a little of it (AIMD), so a bucket
+    configured above the upstream's real quota converges to it.
+    """
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() # refill start, in the future while the bucket is paused
+        self.blocked_until = 0.0
+        self.epoch = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self): # (seconds to wait, epoch of the reservation)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(self.updated - now, 0.0) + (-self.tokens / self.rate if self.tokens < 0 else 0.0)
+            return wait, self.epoch
+
+    def pause(self, seconds, throttled=False): # the upstream told us to back off, nothing goes out before that
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if throttled and self.blocked_until <= now: # one cut per pause, a burst of 429s is one signal
+                self.rate = max(self.rate / 2, self.max_rate / 16)
+            until = now + seconds
+            if until > self.blocked_until:
+                self.blocked_until = until
+                self.updated = max(self.updated, until)
+                self.tokens = 0.0 # pending reservations are dropped, their callers reserve again
+                self.epoch += 1
+
+    def succeeded(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def idle(self):
+        with self.lock:
+            now = time.monotonic()
+            return now > self.updated and self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+_buckets = {} # (upstream, key) -> TokenBucket
+_buckets_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _upstream_stats(upstream):
+    return _stats.setdefault(upstream, {
+        "requests": 0, "delayed": 0, "throttled": 0, "retried": 0,
+        "queued": 0, "max_queued": 0, "wait_seconds": 0.0,
+    })
+
+
+def _record(upstream, **increments):
+    with _stats_lock:
+        stats = _upstream_stats(upstream)
+        for name, value in increments.items():
+            stats[name] += value
+        stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+
+
+def upstream_for(url):
+    return UPSTREAMS.get(urlsplit(url).hostname or "")
+
+
+def identity(kwargs):
+    # which token a call is made with, hashed so raw access tokens never end up in the stats
+    key = kwargs.pop("rate_key", None)
+    if key is None:
+        auth = kwargs.get("auth")
+        key = getattr(getattr(auth, "client", None), "resource_owner_key", None) # requests_oauthlib OAuth1
+    if key is None:
+        authorization = (kwargs.get("headers") or {}).get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            key = authorization[len("Bearer "):]
+    return hashlib.sha256(str(key).encode()).hexdigest()[:16] if key is not None else "anonymous"
+
+
+def bucket_for(url, key):
+    upstream = upstream_for(url)
+    if upstream is None:
+        return None, None
+    name, rate, burst = upstream
+    with _buckets_lock:
+        bucket = _buckets.get((name, key))
+        if bucket is None:
+            if len(_buckets) >= RATE_LIMIT_MAX_BUCKETS:
+                for bucket_key in [bucket_key for bucket_key, value in _buckets.items() if value.idle()]:
+                    del _buckets[bucket_key]
+            bucket = _buckets[(name, key)] = TokenBucket(rate, burst)
+    return name, bucket
+
+
+def acquire(upstream, bucket, waited=0.0, epoch=None):
+    # (seconds to wait before sending, reservation epoch); the caller sleeps (time.sleep or asyncio.sleep)
+    # and calls again with the epoch it got until the wait is 0, in case the bucket was paused meanwhile
+    if epoch is not None and epoch == bucket.epoch:
+        return 0.0, epoch
+    wait, epoch = bucket.reserve()
+    wait = min(wait, max(RATE_LIMIT_MAX_WAIT - waited, 0.0))
+    if waited == 0:
+        _record(upstream, requests=1, delayed=1 if wait > 0 else 0)
+    _record(upstream, wait_seconds=wait)
+    return wait, epoch
+
+
+def queued(upstream, delta):
+    _record(upstream, queued=delta)
+
+
+def retried(upstream):
+    _record(upstream, retried=1)
+
+
+def retry_after(headers):
+    # seconds to back off according to the response headers, None when they don't ask for it
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    remaining = headers.get("X-RateLimit-Remaining")
+    reset = headers.get("X-RateLimit-Reset")
+    if remaining is not None and reset and remaining.strip() == "0":
+        try:
+            reset_value = float(reset)
+        except ValueError:
+            reset_at = parse_datetime(reset) # Atlassian sends an ISO timestamp
+            return max(reset_at.timestamp() - time.time(), 0.0) if reset_at else None
+        # epoch seconds or a delay, depending on the API
+        return max(reset_value - time.time(), 0.0) if reset_value > 1e9 else reset_value
+    return None
+
+
+def observe(upstream, bucket, resp):
+    # returns the delay before retrying a throttled call, None when the response can be used as is
+    delay = retry_after(resp.headers)
+    if resp.status_code == 429:
+        delay = 1.0 if delay is None else delay
+        bucket.pause(delay, throttled=True)
+        _record(upstream, throttled=1)
+        return delay
+    if delay:
+        bucket.pause(delay) # quota exhausted but this call went through, hold the next ones
+    else:
+        bucket.succeeded()
+    return None
+
+
+def stats():
+    with _stats_lock:
+        upstreams = {name: dict(values, wait_seconds=round(values["wait_seconds"], 3)) for name, values in _stats.items()}
+    with _buckets_lock:
+        buckets = list(_buckets.items())
+    now = time.monotonic()
+    for (name, _), bucket in buckets:
+        entry = upstreams.setdefault(name, {})
+        entry["buckets"] = entry.get("buckets", 0) + 1
+        if bucket.blocked_until > now:
+            entry["paused_buckets"] = entry.get("paused_buckets", 0) + 1
+    return upstreams
@@ -0,0 +1,67 @@
+import numpy as np
+
+# Vectorized weighted scoring shared by the local Jira and Trello orderings. Items are encoded as a
+# (n_items, n_features) float matrix with every feature scaled to 0..1, each order_by option is a weight
+# vector over those features, and the order is one matrix product plus one stable sort.
+
+
+def normalize(values):
+    # min-max scaling to 0..1; a constant column becomes all zeros instead of dividing by zero
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values
+    low = values.min()
+    span = values.max() - low
+    if span == 0:
+        return np.zeros_like(values)
+    return (values - low) / span
+
+
+def factorize(values):
+    # (codes, labels): codes[i] is the index of values[i] in labels. Dicts are faster than np.unique here,
+    # which would have to sort an object array; labels are in first-seen order
+    labels = list(dict.fromkeys(values))
+    index = {label: position for position, label in enumerate(labels)}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))
+    return codes, labels
+
+
+def lookup(values, table, default):
+    # maps strings through `table` (keys lower-cased) with one dict lookup per distinct value
+    codes, labels = factorize(values)
+    mapped = np.array([table.get((label or "").lower(), default) for label in labels], dtype=np.float64)
+    return mapped[codes] if len(labels) else np.zeros(0)
+
+
+def flags(values, predicate):
+    # boolean array of predicate(value), evaluated once per distinct value
+    codes, labels = factorize(values)
+    mapped = np.array([bool(predicate(label)) for label in labels], dtype=bool)
+    return mapped[codes] if len(labels) else np.zeros(0, dtype=bool)
+
+
+def group_sizes(values):
+    # for every item, how many items share its value (e.g. the assignee's load); None/"" count as 0
+    codes, labels = factorize(values)
+    if not labels:
+        return np.zeros(0)
+    counts = np.bincount(codes, minlength=len(labels)).astype(np.float64)
+    counts[[position for position, label in enumerate(labels) if not label]] = 0
+    return counts[codes]
+
+
+def weight_vector(feature_names, weights): # {"feature": weight} -> array aligned with the matrix columns
+    return np.array([weights.get(name, 0.0) for name in feature_names], dtype=np.float64)
+
+
+def rank(matrix, weights, tiebreak=None, last=None):
+    # (indices from the highest to the lowest score, scores). Ties keep `tiebreak` order (ascending), then
+    # input order; items flagged in `last` (e.g. finished issues) always go after the others
+    scores = np.round(matrix @ weights, 9) if len(matrix) else np.zeros(0) # rounding keeps float noise from breaking ties
+    order_keys = [] # np.lexsort sorts by the last key first
+    if tiebreak is not None:
+        order_keys.append(np.asarray(tiebreak))
+    order_keys.append(-scores)
+    if last is not None:
+        order_keys.append(np.asarray(last, dtype=np.int8))
+    return np.lexsort(order_keys), scores
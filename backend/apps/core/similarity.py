@@ -0,0 +1,149 @@
+import os
+import re
+import zlib
+from array import array
+
+import numpy as np
+
+# Near-duplicate detection for the AI prompts (many tickets of a big backlog are copies of each other).
+# Texts become sets of word bigrams, each set gets a MinHash signature computed with numpy, and
+# locality-sensitive hashing over bands of the signature proposes candidate pairs. Candidates are kept when their
+# estimated Jaccard similarity reaches the threshold, then merged into clusters with a union-find.
+
+AI_DEDUPE_THRESHOLD = float(os.getenv("AI_DEDUPE_THRESHOLD", 0.8)) # estimated Jaccard similarity, 0 disables
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16 # 16 bands of 8 rows: pairs above ~0.7 similarity are almost always proposed
+MIN_SHINGLES = 3 # shorter texts ("Fix bug") say too little to be called duplicates
+MAX_TEXT_CHARS = 2000 # long descriptions are compared on their beginning
+EMPTY = np.uint32(0xFFFFFFFF)
+
+WORD = re.compile(r"\w+")
+
+# fixed seed: the same texts give the same signatures (and clusters) in every process
+_random = np.random.default_rng(20240611)
+_MULTIPLIERS = _random.integers(1, 1 << 63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _random.integers(0, 1 << 63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_BAND_MIX = _random.integers(1, 1 << 62, size=MINHASH_PERMUTATIONS // LSH_BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+class _WordHashes(dict): # word -> crc32, computed on the first lookup of each word
+    def __missing__(self, word):
+        value = self[word] = zlib.crc32(word.encode()) | 1
+        return value
+
+
+def shingle_keys(texts):
+    # (keys, starts): the word bigrams of every text as uint64 keys (crc32 of both words), text i owning
+    # keys[starts[i]:starts[i + 1]]. Words are hashed once each (crc32 is stable across processes, unlike hash())
+    word_hashes = _WordHashes()
+    hashes, lengths = array("I"), [] # 4 bytes per word instead of a Python int
+    for text in texts:
+        words = WORD.findall((text or "")[:MAX_TEXT_CHARS].lower())
+        lengths.append(len(words))
+        hashes.extend(map(word_hashes.__getitem__, words))
+    hashes = np.frombuffer(hashes, dtype=np.uint32)
+    lengths = np.array(lengths, dtype=np.int64)
+    word_ends = np.cumsum(lengths)
+    # a bigram starts at every word except the last one of each text; built in place, this is the memory peak
+    keys = hashes[:-1].astype(np.uint64)
+    keys <<= np.uint64(32)
+    keys |= hashes[1:]
+    bigram_starts = np.ones(len(keys), dtype=bool)
+    bigram_starts[word_ends[(lengths > 0) & (word_ends < len(hashes))] - 1] = False
+    keys = keys[bigram_starts]
+    starts = np.concatenate(([0], np.cumsum(np.maximum(lengths - 1, 0))))
+    return keys, starts
+
+
+def minhash_signatures(texts):
+    # (signatures, valid): one row of MINHASH_PERMUTATIONS uint32 per text; texts with fewer than
+    # MIN_SHINGLES bigrams are not valid and never match anything
+    keys, starts = shingle_keys(texts)
+    counts = np.diff(starts)
+    valid = counts >= MIN_SHINGLES
+    signatures = np.full((len(texts), MINHASH_PERMUTATIONS), EMPTY, dtype=np.uint32)
+    if not valid.any():
+        return signatures, valid
+
+    # every distinct bigram goes through each permutation once (multiply-shift hashing, the high 32 bits of
+    # a * x + b), then the minimum per text is a reduceat over the valid texts. One permutation at a time keeps
+    # memory at O(bigrams) and 1-D reduceat is several times faster than reducing a (bigrams, permutations) matrix
+    vocabulary, ids = np.unique(keys, return_inverse=True)
+    documents = np.flatnonzero(valid)
+    ids = ids[np.repeat(valid, counts)]
+    offsets = np.concatenate(([0], np.cumsum(counts[documents])[:-1]))
+    minimums = np.empty((MINHASH_PERMUTATIONS, len(documents)), dtype=np.uint32)
+    for permutation in range(MINHASH_PERMUTATIONS):
+        hashed = ((vocabulary * _MULTIPLIERS[permutation] + _OFFSETS[permutation]) >> np.uint64(32)).astype(np.uint32)
+        np.minimum.reduceat(hashed[ids], offsets, out=minimums[permutation])
+    signatures[documents] = minimums.T
+    return signatures, valid
+
+
+def _candidate_pairs(signatures, documents, groups):
+    # (left, right) index pairs sharing at least one band; each text is paired with the first text of its bucket
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    lefts, rights = [], []
+    for band in range(LSH_BANDS):
+        block = signatures[documents, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (block * _BAND_MIX).sum(axis=1) # wraps around, that is fine for a bucket key
+        if groups is not None:
+            keys ^= groups
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        same = np.concatenate(([False], sorted_keys[1:] == sorted_keys[:-1]))
+        if not same.any():
+            continue
+        bucket_first = np.maximum.accumulate(np.where(same, 0, np.arange(len(order))))
+        lefts.append(documents[order[bucket_first[same]]])
+        rights.append(documents[order[same]])
+    if not lefts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    pairs = np.unique(np.stack((np.concatenate(lefts), np.concatenate(rights)), axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def near_duplicate_labels(texts, threshold=AI_DEDUPE_THRESHOLD, groups=None):
+    # labels[i] is the index of the first text of i's cluster, i itself when it has no near-duplicate.
+    # Texts only match inside the same `groups` value (e.g. same status or list) when groups are given
+    count = len(texts)
+    labels = np.arange(count)
+    if count < 2 or threshold <= 0:
+        return labels
+    signatures, valid = minhash_signatures(texts)
+    documents = np.flatnonzero(valid)
+    if len(documents) < 2:
+        return labels
+    group_keys = None
+    if groups is not None:
+        codes = {}
+        group_keys = np.fromiter((codes.setdefault(groups[index], len(codes)) for index in documents.tolist()), dtype=np.uint64, count=len(documents))
+        group_keys *= np.uint64(0x9E3779B97F4A7C15)
+    lefts, rights = _candidate_pairs(signatures, documents, group_keys)
+
+    # keep the candidates whose estimated similarity (share of equal signature rows) reaches the threshold
+    keep = np.zeros(len(lefts), dtype=bool)
+    step = 4096
+    for start in range(0, len(lefts), step):
+        agreement = (signatures[lefts[start:start + step]] == signatures[rights[start:start + step]]).mean(axis=1)
+        keep[start:start + step] = agreement >= threshold
+
+    parent = list(range(count)) # plain list, indexing numpy scalars one by one is slow
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    for left, right in zip(lefts[keep].tolist(), rights[keep].tolist()):
+        left_root, right_root = find(left), find(right)
+        if left_root != right_root: # the lowest index represents the cluster
+            parent[max(left_root, right_root)] = min(left_root, right_root)
+    return np.array([find(node) for node in range(count)])
+
+
+def clusters(labels): # {representative index: [other member indexes]} for clusters with more than one member
+    members = {}
+    for index, label in enumerate(labels.tolist()):
+        if index != label:
+            members.setdefault(label, []).append(index)
+    return members
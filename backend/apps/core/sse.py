@@ -0,0 +1,21 @@
+import json
+
+from django.http import StreamingHttpResponse
+
+# Server-Sent Events helpers shared by the streaming AI endpoints.
+
+
+def format_sse(event, data):
+    payload = json.dumps(data, ensure_ascii=False, default=str) # JSON keeps newlines inside a single data: line
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(events):
+    # `events` is an iterable of (event, data) tuples
+    response = StreamingHttpResponse(
+        (format_sse(event, data) for event, data in events),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no" # stop nginx from buffering the stream
+    return response
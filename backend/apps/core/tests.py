@@ -0,0 +1,423 @@
+import json
+import random
+import select
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import circuit_breaker, http_client, llm, llm_json, prompts, rate_limit, similarity
+from .json_stream import JSONArrayStream
+
+
+class PromptBuilderTests(SimpleTestCase):
+    def build(self, token_budget):
+        builder = prompts.PromptBuilder("Header\n", token_budget=token_budget)
+        for index in range(50):
+            builder.add_item([("- ID", index), ("Description", "word " * 200)])
+        return builder.build()
+
+    def test_descriptions_are_cut_to_fit_the_budget(self):
+        prompt, report = self.build(token_budget=2000)
+        self.assertLessEqual(report["estimated_tokens"], 2000)
+        self.assertEqual(report["descriptions_truncated"], 50)
+        with self.assertLogs("apps.core.prompts", "INFO") as logs:
+            prompts.log_report("jira", report)
+        self.assertIn("50 descriptions cut", logs.output[0])
+
+    def test_prompt_over_budget_is_a_warning(self):
+        prompt, report = self.build(token_budget=100) # the ids alone don't fit
+        self.assertTrue(report["over_budget"])
+        with self.assertLogs("apps.core.prompts", "WARNING") as logs:
+            prompts.log_report("jira", report)
+        self.assertIn("over budget", logs.output[0])
+
+    def test_prompt_within_budget_is_not_logged(self):
+        prompt, report = self.build(token_budget=0)
+        with self.assertNoLogs("apps.core.prompts"):
+            prompts.log_report("jira", report)
+
+
+class TolerantJSONParserTests(SimpleTestCase):
+    def test_truncation_is_reported(self):
+        cases = [
+            ('{"tasks": [{"ID": 1}]}', False),
+            ("Here it is: {'tasks': [{'ID': 1},]} Hope it helps", False), # repaired, but complete
+            ("{'tasks': [{'ID': 1}, {'ID': 2, 'Title': 'Cut of", True),
+            ("{'tasks': [{'ID': 1}, {'ID': 2", True),
+            ("{'tasks': [{'ID': 1},", True),
+        ]
+        for text, truncated in cases:
+            with self.subTest(text=text):
+                value, was_truncated = llm_json.decode(text)
+                self.assertEqual(value["tasks"][0], {"ID": 1})
+                self.assertEqual(was_truncated, truncated)
+        self.assertEqual(llm_json.decode("No JSON in this answer"), (None, False))
+
+    def test_streamed_parser_reports_truncation(self):
+        parser = llm_json.TolerantJSONParser()
+        for chunk in ("{'mensagem': 'ok', ", "'tasks': [{'ID': 1, 'Ti"):
+            parser.feed(chunk)
+        self.assertEqual(parser.close(), {"mensagem": "ok", "tasks": [{"ID": 1}]}) # the cut key is dropped
+        self.assertTrue(parser.truncated)
+
+
+class JSONArrayStreamTests(SimpleTestCase):
+    document = {
+        "startAt": 0, "total": 1.5e3, "ratio": -0.25, "small": 3e-2, "exact": True, "next": None, "name": "caf\u00e9 \u2713",
+        "issues": [
+            {"id": "10001", "points": 12, "estimate": 1.25e2, "summary": "Login \u00e9 lento", "labels": ["a", "b"]},
+            {"id": "10002", "points": -7, "estimate": 0.5, "summary": "Export \"csv\"", "fields": {"nested": [1, [2.5, {"x": 1e10}]]}},
+            {"id": "10003", "points": 0, "estimate": None, "summary": "\U0001f41b in the board", "done": False},
+        ],
+        "maxResults": 100,
+    }
+
+    def stream(self, body, sizes):
+        chunks, start = [], 0
+        for size in sizes:
+            chunks.append(body[start:start + size])
+            start += size
+        chunks.append(body[start:])
+        stream = JSONArrayStream(chunks, "issues")
+        return list(stream), stream.meta
+
+    def test_numbers_split_at_chunk_boundaries(self):
+        body = b'{"total": 1.5e3, "issues": []}'
+        for size in range(1, len(body) + 1):
+            items, meta = self.stream(body, [size] * (len(body) // size))
+            self.assertEqual((items, meta), ([], {"total": 1500.0}), size)
+
+    def test_random_chunking_gives_the_same_result(self):
+        expected_meta = {key: value for key, value in self.document.items() if key != "issues"}
+        for separators in (", ", ","):
+            body = json.dumps(self.document, separators=(separators, ": "), ensure_ascii=False).encode()
+            rng = random.Random(len(separators))
+            for _ in range(300):
+                items, meta = self.stream(body, [rng.randint(1, 16) for _ in range(len(body))])
+                self.assertEqual(items, self.document["issues"])
+                self.assertEqual(meta, expected_meta)
+
+    def test_truncated_body_is_an_error(self):
+        body = json.dumps(self.document).encode()
+        with self.assertRaises(ValueError):
+            self.stream(body[:-20], [7] * len(body))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0 # also the wall clock, epoch-like values are told apart from delays
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(rate_limit, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_spaced_slots_then_refill(self):
+        bucket = rate_limit.TokenBucket(rate=10, burst=2)
+        waits = [bucket.reserve()[0] for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1)
+        self.assertAlmostEqual(waits[3], 0.2)
+        self.clock.now += 1.0 # 10 tokens refilled, capped at the burst
+        self.assertEqual([bucket.reserve()[0] for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve()[0], 0.1)
+
+    def test_throttled_pause_holds_callers_and_halves_the_rate(self):
+        bucket = rate_limit.TokenBucket(rate=10, burst=5)
+        _, epoch = bucket.reserve()
+        bucket.pause(2.0, throttled=True)
+        bucket.pause(1.0, throttled=True) # same pause, not a second cut
+        self.assertEqual(bucket.rate, 5)
+        self.assertNotEqual(bucket.epoch, epoch) # earlier reservations have to reserve again
+        wait, _ = bucket.reserve()
+        self.assertAlmostEqual(wait, 2.0 + 1 / 5)
+        self.clock.now += 10
+        for _ in range(10):
+            bucket.succeeded()
+        self.assertAlmostEqual(bucket.rate, 7)
+
+    def test_acquire_caps_the_wait(self):
+        bucket = rate_limit.TokenBucket(rate=1, burst=1)
+        bucket.pause(120.0)
+        wait, _ = rate_limit.acquire("test-cap", bucket)
+        self.assertEqual(wait, rate_limit.RATE_LIMIT_MAX_WAIT)
+
+    def test_retry_after_headers(self):
+        self.assertEqual(rate_limit.retry_after({"Retry-After": "3"}), 3.0)
+        self.assertEqual(rate_limit.retry_after({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "5"}), 5.0)
+        self.assertEqual(rate_limit.retry_after({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(self.clock.now + 7)}), 7.0)
+        self.assertIsNone(rate_limit.retry_after({"X-RateLimit-Remaining": "4", "X-RateLimit-Reset": "5"}))
+        self.assertIsNone(rate_limit.retry_after({}))
+
+
+class ThrottlingUpstream(BaseHTTPRequestHandler):
+    # answers 429 with Retry-After to the first `throttled` calls, then 200
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.calls.append(time.monotonic())
+            throttled = len(server.calls) <= server.throttled
+        self.send_response(429 if throttled else 200)
+        if throttled:
+            self.send_header("Retry-After", str(server.retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RateLimitedClientTests(SimpleTestCase):
+    def serve(self, throttled, retry_after, rate=50, burst=10):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingUpstream)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.calls = []
+        server.throttled = throttled
+        server.retry_after = retry_after
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        upstream = f"stub-{self._testMethodName}"
+        patcher = mock.patch.dict(rate_limit.UPSTREAMS, {"127.0.0.1": (upstream, rate, burst)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return server, f"http://127.0.0.1:{server.server_port}/rest/api", upstream
+
+    def test_429_is_sent_again_after_retry_after(self):
+        server, url, upstream = self.serve(throttled=1, retry_after=0.3)
+        resp = http_client.get(url, rate_key="user-a")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(server.calls), 2)
+        self.assertGreaterEqual(server.calls[1] - server.calls[0], 0.3)
+        stats = rate_limit.stats()[upstream]
+        self.assertEqual((stats["throttled"], stats["retried"]), (1, 1))
+
+    def test_pause_spaces_out_concurrent_callers(self):
+        server, url, upstream = self.serve(throttled=1, retry_after=0.3, rate=5, burst=1)
+        statuses = []
+        def call():
+            statuses.append(http_client.get(url, rate_key="user-b").status_code)
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(len(server.calls), 5) # one 429, then every call once
+        # nothing went out during the pause, then the halved rate (2.5/s) spaced the calls
+        self.assertGreaterEqual(server.calls[1] - server.calls[0], 0.3)
+        gaps = [later - earlier for earlier, later in zip(server.calls[1:], server.calls[2:])]
+        self.assertGreaterEqual(min(gaps), 0.3)
+
+    def test_retries_stop_after_the_limit(self):
+        server, url, upstream = self.serve(throttled=10, retry_after=0.05)
+        with mock.patch.object(rate_limit, "RATE_LIMIT_MAX_RETRIES", 2):
+            resp = http_client.get(url, rate_key="user-c")
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(len(server.calls), 3)
+
+    def test_other_users_are_not_paused(self):
+        server, url, upstream = self.serve(throttled=1, retry_after=5)
+        with mock.patch.object(rate_limit, "RATE_LIMIT_MAX_RETRIES", 0):
+            self.assertEqual(http_client.get(url, rate_key="user-d").status_code, 429)
+        started = time.monotonic()
+        self.assertEqual(http_client.get(url, rate_key="user-e").status_code, 200)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class StubLLM(BaseHTTPRequestHandler):
+    # OpenAI style chat completions. Waits `server.delay` seconds without sending anything (like a provider
+    # queueing the request), then answers `server.answer`; status `server.status` when it isn't 200. Streams
+    # are chunked on a keep-alive connection like OpenRouter's, or end with the connection (`server.close`)
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.calls += 1
+        if server.status != 200:
+            self.send_response(server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if not body.get("stream"):
+            time.sleep(server.delay)
+            payload = json.dumps({"choices": [{"message": {"content": server.answer}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection" if server.close else "Transfer-Encoding", "close" if server.close else "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        # silent until the delay is over; a client that goes away makes the socket readable (EOF)
+        if select.select([self.connection], [], [], server.delay)[0]:
+            with server.lock:
+                server.disconnected.append(time.monotonic())
+            return
+        event = {"choices": [{"delta": {"content": server.answer}}]}
+        data = f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode()
+        try:
+            self.wfile.write(data if server.close else b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LLMProviderTests(SimpleTestCase):
+    def provider(self, name, delay=0.0, status=200, close=False):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubLLM)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.calls = 0
+        server.disconnected = []
+        server.delay, server.status, server.close, server.answer = delay, status, close, f"answer from {name}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return llm.Provider(name, f"http://127.0.0.1:{server.server_port}/v1/chat/completions", f"model-{name}"), server
+
+    def use(self, providers, hedge=False, **breaker_options):
+        for target, value in (
+            ("providers", providers), ("LLM_HEDGE", hedge), ("LLM_HEDGE_DEFAULT_DELAY", 0.2),
+            ("breaker", circuit_breaker.CircuitBreaker("llm-test", **breaker_options)),
+        ):
+            patcher = mock.patch.object(llm, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_failover_to_the_next_provider(self):
+        primary, primary_server = self.provider("primary", status=503)
+        backup, _ = self.provider("backup")
+        self.use([primary, backup])
+        self.assertEqual(llm.complete("prompt"), "answer from backup")
+        self.assertEqual(primary_server.calls, 1)
+
+    def test_hedged_request_wins_and_the_slow_one_is_disconnected(self):
+        for close in (False, True):
+            with self.subTest(close=close):
+                primary, primary_server = self.provider("primary", delay=10, close=close)
+                backup, _ = self.provider("backup", delay=0.1, close=close)
+                self.use([primary, backup], hedge=True)
+                started = time.monotonic()
+                self.assertEqual(llm.complete("prompt"), "answer from backup")
+                answered = time.monotonic()
+                self.assertLess(answered - started, 2)
+                # the primary sent nothing at all, yet its connection is dropped right away, not after the 10 s
+                deadline = time.monotonic() + 2
+                while not primary_server.disconnected and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(primary_server.disconnected)
+                self.assertLess(primary_server.disconnected[0] - answered, 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        primary, _ = self.provider("primary", delay=0.01)
+        backup, backup_server = self.provider("backup")
+        self.use([primary, backup], hedge=True)
+        self.assertEqual(llm.complete("prompt"), "answer from primary")
+        self.assertEqual(backup_server.calls, 0)
+
+    def test_breaker_opens_on_errors_and_closes_after_a_probe(self):
+        provider, server = self.provider("only", status=500)
+        self.use([provider], window=4, min_calls=2, open_seconds=0.3)
+        for _ in range(2):
+            with self.assertRaises(llm.LLMError):
+                llm.complete("prompt")
+        self.assertFalse(llm.available())
+        with self.assertRaises(llm.LLMUnavailable):
+            llm.complete("prompt")
+        self.assertEqual(server.calls, 2) # rejected without a request
+        time.sleep(0.35)
+        server.status = 200
+        self.assertEqual(llm.complete("prompt"), "answer from only") # the half-open probe
+        self.assertEqual(llm.breaker.stats()["state"], circuit_breaker.CLOSED)
+
+    def test_breaker_opens_on_slow_calls(self):
+        provider, server = self.provider("slow", delay=0.15)
+        self.use([provider], window=4, min_calls=2, slow_call_seconds=0.1, slow_call_rate=0.5, open_seconds=30)
+        for _ in range(2):
+            self.assertEqual(llm.complete("prompt"), "answer from slow")
+        with self.assertRaises(llm.LLMUnavailable):
+            llm.complete("prompt")
+        self.assertEqual(server.calls, 2)
+
+
+# near-duplicate fixture set: (text, cluster name or None). Tickets of one cluster are copies with small edits
+# (typos, a changed sentence, a trailing note); the others share the vocabulary of the backlog but not the content
+SIMILARITY_FIXTURES = [
+    ("Login page returns a 500 error when the password contains special characters. Steps: open the login page, "
+     "type a password with an ampersand, submit the form. Expected: the user is logged in. Actual: server error.", "login"),
+    ("Login page returns a 500 error when the password contains special characters. Steps: open the login page, "
+     "type a password with an ampersand, submit the form. Expected: the user is logged in. Actual: server error 500.", "login"),
+    ("login page returns a 500 error when the password contains special characters. steps: open the login page, "
+     "type a password with an ampersand, submit the form. expected: the user is logged in. actual: server error. (dup?)", "login"),
+    ("Export the monthly invoice report as CSV from the billing dashboard, with one row per invoice and the "
+     "customer name, amount, currency and due date columns. Finance needs it before the quarterly close.", "export"),
+    ("Export the monthly invoice report as CSV from the billing dashboard, with one row per invoice and the "
+     "customer name, amount, currency and due date columns. Finance needs it before the quarterly close!", "export"),
+    ("Login page is slow on mobile: the form takes four seconds to render because the dashboard bundle is loaded "
+     "before the login script. Split the bundle and load the dashboard after the user is logged in.", None),
+    ("Add a CSV import for customers in the billing settings, validating the currency and due date columns and "
+     "reporting every invalid row back to the user before anything is saved.", None),
+    ("Webhook retries flood the notification service when the upstream returns 503; add exponential backoff with "
+     "jitter and stop after five attempts, logging the dropped events.", None),
+    ("Fix bug", None), # too short to be called a duplicate, even of itself
+    ("Fix bug", None),
+    ("", None),
+]
+
+
+class SimilarityTests(SimpleTestCase):
+    def expected_labels(self, fixtures):
+        first = {}
+        return [first.setdefault(name, index) if name else index for index, (_, name) in enumerate(fixtures)]
+
+    def test_fixture_clusters(self):
+        texts = [text for text, _ in SIMILARITY_FIXTURES]
+        self.assertEqual(similarity.near_duplicate_labels(texts).tolist(), self.expected_labels(SIMILARITY_FIXTURES))
+
+    def test_clusters_do_not_depend_on_the_order(self):
+        fixtures = list(reversed(SIMILARITY_FIXTURES))
+        labels = similarity.near_duplicate_labels([text for text, _ in fixtures])
+        self.assertEqual(labels.tolist(), self.expected_labels(fixtures))
+
+    def test_groups_keep_clusters_apart(self):
+        texts = [text for text, _ in SIMILARITY_FIXTURES]
+        groups = ["To Do"] * len(texts)
+        groups[1] = "Done" # the second copy of the login bug is finished, it stays on its own
+        labels = similarity.near_duplicate_labels(texts, groups=groups).tolist()
+        self.assertEqual((labels[1], labels[2]), (1, 0))
+
+    def test_threshold_zero_disables(self):
+        texts = [text for text, _ in SIMILARITY_FIXTURES]
+        self.assertEqual(similarity.near_duplicate_labels(texts, threshold=0).tolist(), list(range(len(texts))))
+
+    def test_long_texts_are_compared_on_their_beginning(self):
+        start = SIMILARITY_FIXTURES[0][0] * 20 # past MAX_TEXT_CHARS
+        labels = similarity.near_duplicate_labels([start + " first ending " * 200, start + " another tail " * 200])
+        self.assertEqual(labels.tolist(), [0, 0])
+
+    def test_clusters(self):
+        labels = similarity.near_duplicate_labels([text for text, _ in SIMILARITY_FIXTURES])
+        self.assertEqual(similarity.clusters(labels), {0: [1, 2], 3: [4]})
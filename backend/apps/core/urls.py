@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import AICacheView, AIJobStatusView, RateLimitView
+
+urlpatterns = [
+    path('ai/cache', AICacheView.as_view(), name='ai_cache'), # AI cache hit/miss stats and invalidation
+    path('jobs/<uuid:job_id>', AIJobStatusView.as_view(), name='ai_job_status'), # status/result of a queued AI analysis
+    path('http/rate-limits', RateLimitView.as_view(), name='rate_limits'), # outbound Jira/Trello rate limiter queue depth and throttle counts
+]
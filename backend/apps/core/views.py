@@ -0,0 +1,41 @@
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+
+from . import ai_cache, jobs, llm, rate_limit
+from .models import AIJob
+
+
+class AICacheView(APIView): #     GET /ai/cache -> hit/miss counters and LLM circuit breaker state, DELETE /ai/cache?kind=jira -> invalidate
+
+    def get_permissions(self):
+        if self.request.method == "DELETE":
+            return [IsAdminUser()]
+        return [IsAuthenticated()]
+
+    def get(self, request):
+        return Response({**ai_cache.stats(), "llm_breaker": llm.breaker.stats()})
+
+    def delete(self, request):
+        ai_cache.invalidate(key=request.GET.get("key"), kind=request.GET.get("kind"))
+        return Response(status=204)
+
+
+
+class AIJobStatusView(APIView): #     GET /jobs/<id> -> status, plus the result once the job succeeded
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = AIJob.objects.get(id=job_id, user=request.user)
+        except AIJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=404)
+        return Response(jobs.serialize(job))
+
+
+
+class RateLimitView(APIView): #     GET /http/rate-limits -> queue depth and throttle counters per upstream (jira, trello)
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(rate_limit.stats())
@@ -0,0 +1,120 @@
+# Atlassian Document Format (ADF) -> plain text, used for Jira descriptions before they go into prompts.
+# The walk is iterative (explicit stack, no recursion limit on deeply nested documents), writes into a
+# single list buffer and can stop as soon as `max_chars` characters have been produced.
+
+BREAK = object() # pending line break, collapsed so blocks never produce blank runs of newlines
+
+BLOCK_NODES = {
+    "doc", "paragraph", "heading", "blockquote", "codeBlock", "panel", "expand", "nestedExpand",
+    "mediaSingle", "mediaGroup", "layoutSection", "layoutColumn", "bodiedExtension", "table",
+}
+LIST_NODES = {"bulletList", "orderedList", "taskList", "decisionList"}
+LIST_ITEM_NODES = {"listItem", "taskItem", "decisionItem"}
+CELL_NODES = {"tableCell", "tableHeader"}
+MAX_INDENT = 8 # list levels past this aren't indented further, the text would grow with depth squared
+
+
+def _inline_text(node): # leaf nodes that carry their text in attrs
+    node_type = node.get("type")
+    attrs = node.get("attrs") or {}
+    if node_type == "text":
+        return node.get("text") or ""
+    if node_type == "hardBreak":
+        return BREAK
+    if node_type == "mention":
+        return attrs.get("text") or ""
+    if node_type == "emoji":
+        return attrs.get("text") or attrs.get("shortName") or ""
+    if node_type in ("inlineCard", "blockCard", "embedCard"):
+        return attrs.get("url") or ""
+    if node_type == "status":
+        return f"[{attrs.get('text')}]" if attrs.get("text") else ""
+    if node_type == "date":
+        return attrs.get("timestamp") or ""
+    if node_type == "media":
+        return attrs.get("alt") or ""
+    if node_type == "rule":
+        return BREAK
+    return None # not a leaf, walk its content
+
+
+def adf_to_text(document, max_chars=None):
+    if not isinstance(document, dict):
+        return ""
+    buffer = []
+    length = 0
+    pending_break = False
+    stack = [(document, 0)] # (node | separator string | BREAK, list depth)
+
+    while stack:
+        node, depth = stack.pop()
+
+        if node is BREAK:
+            pending_break = length > 0
+            continue
+        if isinstance(node, str):
+            text = node
+        else:
+            text = _inline_text(node)
+            if text is BREAK:
+                pending_break = length > 0
+                continue
+
+        if text is not None:
+            if not text:
+                continue
+            if pending_break:
+                buffer.append("\n")
+                length += 1
+                pending_break = False
+            buffer.append(text)
+            length += len(text)
+            if max_chars is not None and length >= max_chars:
+                break
+            continue
+
+        node_type = node.get("type")
+        children = node.get("content")
+        # strings on the stack are our own separators, malformed (non-dict) content is skipped instead of dumped
+        children = [child for child in children if isinstance(child, dict)] if isinstance(children, list) else []
+
+        # children are pushed in reverse so they pop in document order
+        if node_type in LIST_NODES:
+            start = (node.get("attrs") or {}).get("order", 1) if node_type == "orderedList" else None
+            indent = "  " * min(depth, MAX_INDENT)
+            for index in range(len(children) - 1, -1, -1):
+                stack.append((BREAK, depth))
+                stack.append((children[index], depth + 1))
+                marker = f"{start + index}. " if start is not None else "- "
+                stack.append((indent + marker, depth))
+                stack.append((BREAK, depth))
+        elif node_type == "tableRow":
+            stack.append((BREAK, depth))
+            for index in range(len(children) - 1, -1, -1):
+                stack.append((children[index], depth))
+                if index:
+                    stack.append((" | ", depth))
+            stack.append((BREAK, depth))
+        elif node_type in CELL_NODES or node_type in LIST_ITEM_NODES:
+            # paragraphs inside a cell or an item stay on the marker's line, joined by a space
+            for index in range(len(children) - 1, -1, -1):
+                child = children[index]
+                if child.get("type") == "paragraph" and isinstance(child.get("content"), list):
+                    stack.extend((grandchild, depth) for grandchild in reversed(child["content"]) if isinstance(grandchild, dict))
+                    if index:
+                        stack.append((" ", depth))
+                else:
+                    stack.append((child, depth))
+        else:
+            block = node_type in BLOCK_NODES
+            if block:
+                stack.append((BREAK, depth))
+            for child in reversed(children):
+                stack.append((child, depth))
+            if block:
+                stack.append((BREAK, depth))
+
+    text = "".join(buffer)
+    if max_chars is not None:
+        text = text[:max_chars]
+    return text
@@ -1,8 +1,19 @@
 from django.contrib import admin
-from .models import JiraToken
+from .models import JiraToken, JiraIssue, JiraProjectSync
 # Register your models here.
 
 
 @admin.register(JiraToken)
 class JiraTokenAdmin(admin.ModelAdmin):
-    list_display = ('user', 'created_at')
\ No newline at end of file
+    list_display = ('user', 'created_at')
+
+
+@admin.register(JiraIssue)
+class JiraIssueAdmin(admin.ModelAdmin):
+    list_display = ('key', 'project_key', 'status', 'updated', 'synced_at')
+    list_filter = ('project_key',)
+
+
+@admin.register(JiraProjectSync)
+class JiraProjectSyncAdmin(admin.ModelAdmin):
+    list_display = ('user', 'project_key', 'last_synced_at', 'last_full_sync_at', 'last_finished_at')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.jira'
+
+    def ready(self):
+        from . import jobs  # noqa: F401 registers the AI job handlers
@@ -0,0 +1,182 @@
+import heapq
+from collections import deque
+
+import numpy as np
+
+# Issue dependency graph built from the "links" / "subtasks" kept by filter_issues.
+# An edge u -> v means u has to be done before v (u blocks v, or u is a subtask of v). The graph is stored
+# as CSR adjacency arrays (indptr/indices), the topological sort is Kahn's algorithm (cycles are broken
+# deterministically instead of dropping issues) and the critical path is the longest chain of the DAG.
+
+BLOCKED_BY_PHRASES = ("blocked by", "depends on", "bloqueada por", "bloqueado por", "depende de")
+BLOCKS_PHRASES = ("blocks", "is depended on by", "is a dependency of", "bloqueia")
+
+
+def link_relation(link_type, direction):
+    # "blocks" / "blocked_by" / "relates" for one Jira issuelink seen from the issue that holds it
+    phrase = ((link_type or {}).get(direction) or "").lower()
+    if any(words in phrase for words in BLOCKED_BY_PHRASES):
+        return "blocked_by"
+    if any(words in phrase for words in BLOCKS_PHRASES):
+        return "blocks"
+    return "relates"
+
+
+def compact_links(issuelinks): # raw Jira issuelinks -> [{"key", "relation"}]
+    links = []
+    for link in issuelinks or ():
+        for direction, issue_field in (("outward", "outwardIssue"), ("inward", "inwardIssue")):
+            other = link.get(issue_field)
+            if other and other.get("key"):
+                links.append({"key": other["key"], "relation": link_relation(link.get("type"), direction)})
+    return links
+
+
+class DependencyGraph:
+    def __init__(self, keys, sources, targets):
+        self.keys = keys
+        self.size = len(keys)
+        order = np.lexsort((targets, sources))
+        sources, targets = sources[order], targets[order]
+        if len(sources): # duplicated edges (the same link seen from both issues) are kept once
+            unique = np.ones(len(sources), dtype=bool)
+            unique[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+            sources, targets = sources[unique], targets[unique]
+        self.indices = targets.astype(np.int32)
+        self.indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=self.size), out=self.indptr[1:])
+        self.in_degree = np.bincount(targets, minlength=self.size).astype(np.int64)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    def successors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+
+def build_graph(filtered_issues, done=None):
+    # only edges between issues of the list; links to issues outside it (other projects) are ignored, and so are
+    # the links of issues flagged in `done`, a finished blocker no longer blocks anything
+    keys = [issue.get("key") for issue in filtered_issues]
+    position = {key: index for index, key in enumerate(keys)}
+    if done is not None:
+        done = np.asarray(done, dtype=bool).tolist()
+        position = {key: index for key, index in position.items() if not done[index]}
+    sources, targets = [], []
+    for index, issue in enumerate(filtered_issues):
+        if done is not None and done[index]:
+            continue
+        for link in issue.get("links") or ():
+            other = position.get(link.get("key"))
+            if other is None or other == index:
+                continue
+            if link.get("relation") == "blocks":
+                sources.append(index)
+                targets.append(other)
+            elif link.get("relation") == "blocked_by":
+                sources.append(other)
+                targets.append(index)
+        for subtask_key in issue.get("subtasks") or ():
+            other = position.get(subtask_key)
+            if other is not None and other != index:
+                sources.append(other) # the subtasks come before their parent
+                targets.append(index)
+    return DependencyGraph(keys, np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64))
+
+
+class _RankedReady:
+    # ready nodes, lowest rank first. Most nodes are ready from the start: they come from a sorted deque and only
+    # the nodes released later go through the heap. Both hold rank * size + node ints, which order like
+    # (rank, node) tuples without allocating one per node
+    def __init__(self, nodes, rank, size):
+        self.rank = rank
+        self.size = size
+        self.initial = deque(sorted(rank[node] * size + node for node in nodes))
+        self.released = []
+
+    def __bool__(self):
+        return bool(self.initial or self.released)
+
+    def pop(self):
+        if self.released and (not self.initial or self.released[0] < self.initial[0]):
+            return heapq.heappop(self.released) % self.size
+        return self.initial.popleft() % self.size
+
+    def push(self, node):
+        heapq.heappush(self.released, self.rank[node] * self.size + node)
+
+
+def topological_order(graph, rank=None):
+    # (order, cyclic): every node exactly once, predecessors first.
+    # Without `rank` ready nodes are taken in input order (O(V + E)); with it (lower first) a heap picks the
+    # best ready node (O((V + E) log V)). Nodes on a cycle are listed in `cyclic` and released one by one,
+    # best rank first, so the order still covers the whole backlog
+    # plain lists in the loops, item access on numpy arrays costs more than the work itself
+    in_degree = graph.in_degree.tolist()
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+    ready_nodes = [node for node, degree in enumerate(in_degree) if degree == 0]
+    if rank is None:
+        ready = deque(ready_nodes)
+        pop, push = ready.popleft, ready.append
+    else:
+        ready = _RankedReady(ready_nodes, rank, graph.size)
+        pop, push = ready.pop, ready.push
+    emitted = [False] * graph.size
+    order, cyclic = [], []
+    remaining = None
+    while len(order) < graph.size:
+        if not ready:
+            # only cycles left: release the best remaining node
+            if remaining is None:
+                remaining = sorted((node for node in range(graph.size) if not emitted[node]), key=(lambda node: (rank[node], node)) if rank is not None else None)
+            node = next(node for node in remaining if not emitted[node])
+            cyclic.append(node)
+            push(node)
+            in_degree[node] = 0
+        node = pop()
+        if emitted[node]:
+            continue
+        emitted[node] = True
+        order.append(node)
+        for successor in indices[indptr[node]:indptr[node + 1]]:
+            in_degree[successor] -= 1
+            if in_degree[successor] == 0 and not emitted[successor]:
+                push(successor)
+    return order, cyclic
+
+
+def critical_path(graph, order):
+    # longest chain (in issues) following the topological order; edges pointing backwards (cycles) are skipped
+    if not graph.size:
+        return []
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+    position = [0] * graph.size
+    for index, node in enumerate(order):
+        position[node] = index
+    length = [1] * graph.size
+    previous = [-1] * graph.size
+    for node in order:
+        for successor in indices[indptr[node]:indptr[node + 1]]:
+            if position[successor] > position[node] and length[node] + 1 > length[successor]:
+                length[successor] = length[node] + 1
+                previous[successor] = node
+    node = length.index(max(length))
+    path = []
+    while node != -1:
+        path.append(node)
+        node = previous[node]
+    return path[::-1]
+
+
+def dependency_summary(filtered_issues, rank=None, done=None):
+    graph = build_graph(filtered_issues, done)
+    order, cyclic = topological_order(graph, rank)
+    path = critical_path(graph, order) if graph.edge_count else []
+    return {
+        "edges": graph.edge_count,
+        "order": [graph.keys[node] for node in order if done is None or not done[node]],
+        "cyclic": [graph.keys[node] for node in cyclic],
+        "critical_path": [graph.keys[node] for node in path],
+        "critical_path_length": len(path),
+    }
@@ -0,0 +1,21 @@
+from apps.core import jobs
+
+from .mirror import get_mirrored_issues
+from .services import analyze_issues, get_jira_token_and_cloud_id, process_ai_response
+
+
+@jobs.register("jira_issues_ai")
+def run_jira_issues_ai(job): # same work as JiraProjectIssuesAI, run by the AI worker
+    params = job.params
+    jira_token, cloud_id, error = get_jira_token_and_cloud_id(job.user)
+    if error:
+        raise RuntimeError(error)
+    filtered_issues = get_mirrored_issues(jira_token, cloud_id, params["project_key"], force_sync=params.get("fresh", False))
+    ia_response = analyze_issues(filtered_issues, params.get("order_label"), fallback=False) # retried later instead
+    if not isinstance(ia_response, (dict, list)):
+        raise RuntimeError(str(ia_response)) # error string from call_ai, let the queue retry it
+    enriched_ia_summary, ordering_summary = process_ai_response(ia_response, filtered_issues)
+    return {
+        "ai_summary": enriched_ia_summary,
+        "ordering_summary": ordering_summary
+    }
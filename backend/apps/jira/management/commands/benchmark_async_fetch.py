@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from django.core.management.base import BaseCommand
+
+from apps.core import http_client
+from apps.jira import search_stub, services
+from apps.jira.models import JiraToken
+
+
+def _percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the live project issue fetch behind the sync views (a WSGI worker with --workers threads) and the "
+        "ASGI views (one event loop) under --clients concurrent clients, against a local Jira stub (apps.jira.search_stub, "
+        "own process) with a fixed latency. Prints requests per second and p50/p99 latency, queueing included."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="project fetches per mode")
+        parser.add_argument("--clients", type=int, default=50, help="concurrent clients, each sends its next request when the previous one answered")
+        parser.add_argument("--workers", type=int, default=8, help="threads of the sync worker (gunicorn --threads)")
+        parser.add_argument("--issues", type=int, default=250, help="issues per project, Jira pages them by 100")
+        parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub takes per search call")
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        stub = context.Process(target=search_stub.serve, args=(ready, options["issues"], options["latency"]), daemon=True)
+        stub.start()
+        port = ready.get(timeout=30)
+        site_api_url = services.JIRA_SITE_API_URL
+        services.JIRA_SITE_API_URL = f"http://127.0.0.1:{port}"
+        jira_token = JiraToken(access_token="benchmark", expires_in=3600) # never saved, the stub ignores it
+        try:
+            self._report("sync view (threads)", self._run_sync(jira_token, options), options["requests"])
+            self._report("async view (event loop)", asyncio.run(self._run_async(jira_token, options)), options["requests"])
+        finally:
+            services.JIRA_SITE_API_URL = site_api_url
+            http_client.close_all()
+            stub.terminate()
+            stub.join()
+
+    def _run_sync(self, jira_token, options):
+        jql = 'project="BENCH" ORDER BY key ASC'
+
+        def fetch():
+            return [issue for page in services.iter_issue_pages(jira_token, "cloud", jql) for issue in page]
+
+        remaining, latencies = count(options["requests"], -1), []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as worker:
+            def client():
+                while next(remaining) > 0:
+                    sent = time.perf_counter()
+                    worker.submit(fetch).result() # waits in the worker queue like a request waits for a free thread
+                    latencies.append(time.perf_counter() - sent)
+
+            clients = [threading.Thread(target=client) for _ in range(options["clients"])]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+        return latencies, time.perf_counter() - started
+
+    async def _run_async(self, jira_token, options):
+        remaining, latencies = count(options["requests"], -1), []
+
+        async def client():
+            while next(remaining) > 0:
+                sent = time.perf_counter()
+                await services.aget_filtered_project_issues(jira_token, "cloud", "BENCH")
+                latencies.append(time.perf_counter() - sent)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options["clients"])))
+        return latencies, time.perf_counter() - started
+
+    def _report(self, name, result, requests):
+        latencies, elapsed = result
+        self.stdout.write(
+            f"{name:<24} {requests / elapsed:8.1f} req/s   p50 {_percentile(latencies, 0.5) * 1000:7.1f} ms   "
+            f"p99 {_percentile(latencies, 0.99) * 1000:7.1f} ms"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jira', '0005_alter_jiratoken_access_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiratoken',
+            name='cloud_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
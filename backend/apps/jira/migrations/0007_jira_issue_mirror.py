@@ -0,0 +1,52 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jira', '0006_jiratoken_cloud_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JiraIssue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cloud_id', models.CharField(max_length=64)),
+                ('project_key', models.CharField(max_length=64)),
+                ('issue_id', models.CharField(max_length=32)),
+                ('key', models.CharField(max_length=64)),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('description', models.TextField(blank=True, default='')),
+                ('status', models.CharField(blank=True, max_length=255, null=True)),
+                ('assignee', models.CharField(blank=True, max_length=255, null=True)),
+                ('issuetype', models.CharField(blank=True, max_length=255, null=True)),
+                ('priority', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cloud_id', 'project_key'], name='jira_jirais_cloud_i_e5f01f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cloud_id', 'issue_id'), name='unique_jira_issue_per_site')],
+            },
+        ),
+        migrations.CreateModel(
+            name='JiraProjectSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cloud_id', models.CharField(max_length=64)),
+                ('project_key', models.CharField(max_length=64)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'cloud_id', 'project_key'), name='unique_jira_project_sync')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jira', '0007_jira_issue_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiratoken',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
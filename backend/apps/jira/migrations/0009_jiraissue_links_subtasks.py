@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+def force_full_sync(apps, schema_editor):
+    # mirrored rows have no links yet, the next sync of every project refetches all of its issues
+    apps.get_model('jira', 'JiraProjectSync').objects.update(last_synced_at=None, last_full_sync_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jira', '0008_jiratoken_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraissue',
+            name='links',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='jiraissue',
+            name='subtasks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(force_full_sync, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def force_full_sync(apps, schema_editor):
+    # nobody can read the mirrored rows until a sync records who sees them, so every project refetches all of its issues
+    apps.get_model('jira', 'JiraProjectSync').objects.update(last_synced_at=None, last_full_sync_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jira', '0009_jiraissue_links_subtasks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraissue',
+            name='visible_to',
+            field=models.ManyToManyField(blank=True, related_name='visible_jira_issues', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(force_full_sync, migrations.RunPython.noop),
+    ]
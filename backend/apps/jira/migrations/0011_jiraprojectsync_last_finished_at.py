@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jira', '0010_jiraissue_visible_to'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraprojectsync',
+            name='last_finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
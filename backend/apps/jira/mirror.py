@@ -0,0 +1,183 @@
+import math
+import os
+import time
+from datetime import timedelta
+
+from django.db import OperationalError
+from django.db.models import BigIntegerField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core import coalesce
+from .models import JiraIssue, JiraProjectSync
+from .services import iter_issue_pages
+
+JIRA_MIRROR_MAX_AGE = int(os.getenv("JIRA_MIRROR_MAX_AGE", 900)) # seconds before a read triggers an incremental sync
+JIRA_MIRROR_FULL_SYNC_INTERVAL = int(os.getenv("JIRA_MIRROR_FULL_SYNC_INTERVAL", 86400)) # full resync catches deleted and newly hidden issues
+JIRA_MIRROR_SYNC_OVERLAP = 5 # minutes, JQL relative dates only have minute precision
+JIRA_MIRROR_BATCH_SIZE = 500
+JIRA_MIRROR_LOCK_RETRIES = 100 # SQLite answers "table is locked" instead of waiting, see _retry_locked
+JIRA_MIRROR_LOCK_DELAY = 0.02 # seconds between two attempts
+
+Visibility = JiraIssue.visible_to.through
+
+MIRROR_FIELDS = ["key", "summary", "description", "status", "assignee", "issuetype", "priority", "updated", "links", "subtasks"]
+
+
+def _mirror_rows(cloud_id, project_key, page):
+    for issue in page:
+        yield JiraIssue(
+            cloud_id=cloud_id,
+            project_key=project_key,
+            issue_id=issue["id"],
+            key=issue["key"],
+            summary=issue["summary"],
+            description=issue["description"] or "",
+            status=issue["status"],
+            assignee=issue["assignee"],
+            issuetype=issue["issuetype"],
+            priority=issue["priority"],
+            updated=parse_datetime(issue["updated"] or ""),
+            links=issue["links"],
+            subtasks=issue["subtasks"],
+        )
+
+
+def _retry_locked(fn, *args, **kwargs):
+    # concurrent requests read the mirror while a sync writes it. Postgres and file SQLite wait for the lock,
+    # SQLite's shared cache (the in-memory test database) fails right away, so the statement is run again
+    for attempt in range(JIRA_MIRROR_LOCK_RETRIES):
+        try:
+            return fn(*args, **kwargs)
+        except OperationalError as e:
+            if "locked" not in str(e) or attempt == JIRA_MIRROR_LOCK_RETRIES - 1:
+                raise
+        time.sleep(JIRA_MIRROR_LOCK_DELAY)
+
+
+def _store_page(jira_token, cloud_id, project_key, page): # upserts one page of issues, returns their ids
+    rows = list(_mirror_rows(cloud_id, project_key, page))
+    JiraIssue.objects.bulk_create(
+        rows,
+        batch_size=JIRA_MIRROR_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["cloud_id", "issue_id"],
+        update_fields=["project_key"] + MIRROR_FIELDS,
+    )
+    # the user saw these issues, whatever other users of the site can or can't see
+    page_ids = [row.issue_id for row in rows]
+    Visibility.objects.bulk_create(
+        [
+            Visibility(jiraissue_id=pk, user_id=jira_token.user_id)
+            for pk in JiraIssue.objects.filter(cloud_id=cloud_id, issue_id__in=page_ids).values_list("pk", flat=True)
+        ],
+        batch_size=JIRA_MIRROR_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return page_ids
+
+
+def _drop_unseen(jira_token, cloud_id, project_key, seen_ids):
+    # issues the user no longer sees (deleted, moved or hidden by a security level), then rows nobody sees
+    Visibility.objects.filter(
+        user_id=jira_token.user_id, jiraissue__cloud_id=cloud_id, jiraissue__project_key=project_key,
+    ).exclude(jiraissue__issue_id__in=seen_ids).delete()
+    JiraIssue.objects.filter(cloud_id=cloud_id, project_key=project_key, visible_to=None).delete()
+
+
+def sync_project_issues(jira_token, cloud_id, project_key, full=False):
+    sync, _ = _retry_locked(
+        JiraProjectSync.objects.get_or_create, user_id=jira_token.user_id, cloud_id=cloud_id, project_key=project_key,
+    )
+    now = timezone.now()
+    if not full and sync.last_full_sync_at:
+        full = (now - sync.last_full_sync_at).total_seconds() > JIRA_MIRROR_FULL_SYNC_INTERVAL
+    if full or not sync.last_synced_at:
+        jql = f'project="{project_key}" ORDER BY key ASC'
+        full = True
+    else:
+        # relative dates are evaluated by Jira itself, so the user's Jira timezone doesn't matter
+        minutes = math.ceil((now - sync.last_synced_at).total_seconds() / 60) + JIRA_MIRROR_SYNC_OVERLAP
+        jql = f'project="{project_key}" AND updated >= -{minutes}m ORDER BY key ASC'
+
+    seen_ids = set()
+    for page in iter_issue_pages(jira_token, cloud_id, jql):
+        page_ids = _retry_locked(_store_page, jira_token, cloud_id, project_key, page)
+        if full:
+            seen_ids.update(page_ids)
+
+    if full:
+        _retry_locked(_drop_unseen, jira_token, cloud_id, project_key, seen_ids)
+        sync.last_full_sync_at = now
+    sync.last_synced_at = now # the next incremental sync starts from here, changes made during this one included
+    sync.last_finished_at = timezone.now()
+    _retry_locked(sync.save, update_fields=["last_synced_at", "last_full_sync_at", "last_finished_at"])
+    return sync
+
+
+def _synced_since(jira_token, cloud_id, project_key, requested_at):
+    finished_at = _retry_locked(
+        JiraProjectSync.objects.filter(
+            user_id=jira_token.user_id, cloud_id=cloud_id, project_key=project_key,
+        ).values_list("last_finished_at", flat=True).first
+    )
+    return finished_at is not None and finished_at >= requested_at
+
+
+def _coalesced_sync(jira_token, cloud_id, project_key):
+    # concurrent requests for the same project share one upstream sync, in process and across processes, and
+    # syncs of a project never overlap. Whoever gets the lock after a sync of their own visibility (see
+    # JiraIssue.visible_to) finished after their request just reads the mirror
+    requested_at = timezone.now()
+    key = f"jira-sync:{cloud_id}:{project_key}"
+
+    def run():
+        with coalesce.advisory_lock(key):
+            if not _synced_since(jira_token, cloud_id, project_key, requested_at):
+                sync_project_issues(jira_token, cloud_id, project_key)
+
+    coalesce.single_flight.do(key, run)
+    while not _synced_since(jira_token, cloud_id, project_key, requested_at):
+        coalesce.single_flight.do(key, run) # we followed another user's sync
+
+
+def get_mirrored_issues(jira_token, cloud_id, project_key, force_sync=False):
+    # same shape as filter_issues, served from the mirror and limited to the issues the user's own syncs returned;
+    # Jira is only hit when the mirror is missing, stale or the caller asked for fresh data
+    sync = _retry_locked(
+        JiraProjectSync.objects.filter(user_id=jira_token.user_id, cloud_id=cloud_id, project_key=project_key).first
+    )
+    stale = (
+        sync is None
+        or sync.last_synced_at is None
+        or timezone.now() - sync.last_synced_at > timedelta(seconds=JIRA_MIRROR_MAX_AGE)
+    )
+    if force_sync or stale:
+        _coalesced_sync(jira_token, cloud_id, project_key)
+    return _retry_locked(_read_mirror, jira_token, cloud_id, project_key)
+
+
+def _read_mirror(jira_token, cloud_id, project_key):
+    rows = (
+        JiraIssue.objects.filter(cloud_id=cloud_id, project_key=project_key, visible_to=jira_token.user_id)
+        .annotate(issue_number=Cast("issue_id", BigIntegerField()))
+        .order_by("issue_number")
+        .values("issue_id", "key", "summary", "description", "status", "assignee", "issuetype", "priority", "updated", "links", "subtasks")
+    )
+    return [
+        {
+            "id": row["issue_id"],
+            "key": row["key"],
+            "summary": row["summary"],
+            "description": row["description"],
+            "status": row["status"],
+            "assignee": row["assignee"],
+            "issuetype": row["issuetype"],
+            "priority": row["priority"],
+            "updated": row["updated"].isoformat() if row["updated"] else None,
+            "links": row["links"],
+            "subtasks": row["subtasks"],
+        }
+        for row in rows.iterator(chunk_size=2000)
+    ]
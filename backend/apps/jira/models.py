@@ -10,4 +10,53 @@ class JiraToken(models.Model):
     access_token = models.TextField()
     refresh_token = models.TextField(blank=True, null=True)
     expires_in = models.IntegerField()
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    expires_at = models.DateTimeField(blank=True, null=True) # set on every (re)issue, see tokens.py
+    cloud_ids = models.JSONField(default=list, blank=True) # Jira site ids from accessible-resources, resolved once at OAuth time
+    created_at = models.DateTimeField(auto_now_add=True)
+
+# Local mirror of Jira issues, filled by the incremental sync in mirror.py.
+# Issue content is shared per Jira site, but a user only reads the issues their own Jira searches returned
+# (visible_to), Jira issue-level security can hide issues from some members of a project.
+# JiraProjectSync tracks which user synced what and when.
+
+class JiraIssue(models.Model):
+    cloud_id = models.CharField(max_length=64)
+    project_key = models.CharField(max_length=64)
+    issue_id = models.CharField(max_length=32)
+    key = models.CharField(max_length=64)
+    summary = models.TextField(blank=True, null=True)
+    description = models.TextField(blank=True, default="")
+    status = models.CharField(max_length=255, blank=True, null=True)
+    assignee = models.CharField(max_length=255, blank=True, null=True)
+    issuetype = models.CharField(max_length=255, blank=True, null=True)
+    priority = models.CharField(max_length=255, blank=True, null=True)
+    updated = models.DateTimeField(blank=True, null=True) # Jira's own "updated" field
+    links = models.JSONField(default=list, blank=True) # [{"key", "relation"}], see dependencies.compact_links
+    subtasks = models.JSONField(default=list, blank=True) # subtask keys
+    visible_to = models.ManyToManyField(User, related_name="visible_jira_issues", blank=True)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cloud_id", "issue_id"], name="unique_jira_issue_per_site"),
+        ]
+        indexes = [
+            models.Index(fields=["cloud_id", "project_key"]),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class JiraProjectSync(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    cloud_id = models.CharField(max_length=64)
+    project_key = models.CharField(max_length=64)
+    last_synced_at = models.DateTimeField(blank=True, null=True)
+    last_full_sync_at = models.DateTimeField(blank=True, null=True)
+    last_finished_at = models.DateTimeField(blank=True, null=True) # last_synced_at is when that sync started
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "cloud_id", "project_key"], name="unique_jira_project_sync"),
+        ]
@@ -0,0 +1,182 @@
+from datetime import datetime
+
+import numpy as np
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core import scoring
+from .dependencies import build_graph, dependency_summary, topological_order
+
+# Local, deterministic ordering of filtered issues for every order_by option, computed with apps.core.scoring.
+# Served directly by the /issues/order endpoint and used as the AI fallback while the circuit breaker is open
+# (same response shape as the AI analysis, {"mensagem", "tasks"}, flagged with "degraded": True).
+
+PRIORITY_RANK = {"highest": 0, "blocker": 0, "critical": 0, "high": 1, "major": 1, "medium": 2, "low": 3, "minor": 3, "lowest": 4, "trivial": 4}
+TYPE_RANK = {"bug": 0, "incident": 0, "story": 1, "task": 2, "improvement": 2, "sub-task": 3, "subtask": 3, "epic": 4}
+STATUS_IN_PROGRESS = ("progress", "andamento", "review", "revisão")
+STATUS_DONE = ("done", "closed", "resolved", "concluído", "concluido", "fechado")
+
+FEATURES = ["priority", "type", "in_progress", "age", "assignee_load", "description_length", "links"]
+
+# order label (see JiraProjectIssuesAI._get_order_label) -> feature weights, higher score comes first
+ORDER_WEIGHTS = {
+    None: {"in_progress": 0.4, "priority": 0.4, "type": 0.2, "age": 0.1, "assignee_load": -0.1},
+    "prioridade": {"priority": 1.0, "type": 0.3, "in_progress": 0.2, "age": 0.1},
+    "prazo": {"in_progress": 0.5, "priority": 0.4, "age": 0.3},
+    "dificuldade": {"description_length": -0.7, "links": -0.3, "priority": 0.1}, # easiest first
+    "impacto no projeto": {"links": 0.5, "priority": 0.4, "type": 0.3},
+    "dependências": {"links": 1.0, "priority": 0.2},
+}
+DEPENDENCY_ORDER_LABELS = ("dependências",) # ordered by the issue-link graph, the weights only break ties
+
+FALLBACK_MESSAGE = (
+    "AI analysis is temporarily unavailable, so this ordering was computed locally from priority, status, "
+    "issue type, age, assignee load, description size and issue links ({criterion}); finished issues go last."
+)
+
+
+def _is_done(status):
+    status = (status or "").lower()
+    return any(word in status for word in STATUS_DONE)
+
+
+def _is_in_progress(status):
+    status = (status or "").lower()
+    return any(word in status for word in STATUS_IN_PROGRESS)
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp() # Jira's "2024-05-02T10:00:00.000+0000" included
+    except ValueError:
+        parsed = parse_datetime(value)
+        return parsed.timestamp() if parsed else None
+
+
+def _timestamps(values):
+    try: # all in Jira's format, the common case: no per-value fallback
+        return [datetime.fromisoformat(value).timestamp() if value else None for value in values]
+    except ValueError:
+        return list(map(_timestamp, values))
+
+
+def _ages(values, now):
+    # seconds since the last update, missing dates count as no age
+    stamps = np.array([now if stamp is None else stamp for stamp in _timestamps(values)], dtype=np.float64)
+    return now - stamps
+
+
+def _key_number(key):
+    number = (key or "").rsplit("-", 1)[-1]
+    return int(number) if number.isdigit() else 0
+
+
+def _key_numbers(keys):
+    try: # "PROJ-123" everywhere, the common case
+        numbers = [int(key.rpartition("-")[2]) for key in keys]
+    except (AttributeError, ValueError):
+        numbers = list(map(_key_number, keys))
+    return np.array(numbers, dtype=np.int64)
+
+
+def _columns(filtered_issues):
+    # every field the features need, in one pass: on large lists each issue dict read is a cache miss,
+    # so one pass per field costs several times more
+    keys, statuses, priorities, types, updated, assignees, description_lengths, link_counts = ([] for _ in range(8))
+    for issue in filtered_issues:
+        keys.append(issue.get("key"))
+        statuses.append(issue.get("status"))
+        priorities.append(issue.get("priority"))
+        types.append(issue.get("issuetype"))
+        updated.append(issue.get("updated"))
+        assignees.append(issue.get("assignee"))
+        description_lengths.append(len(issue.get("description") or ""))
+        link_counts.append(len(issue.get("links") or ()))
+    return keys, statuses, priorities, types, updated, assignees, description_lengths, link_counts
+
+
+def issue_features(filtered_issues):
+    # (matrix with FEATURES columns scaled to 0..1, done mask, key numbers used as the final tie-break)
+    keys, statuses, priorities, types, updated, assignees, description_lengths, link_counts = _columns(filtered_issues)
+    done = scoring.flags(statuses, _is_done)
+    now = timezone.now().timestamp()
+    matrix = np.empty((len(filtered_issues), len(FEATURES)), dtype=np.float64)
+    matrix[:, 0] = 1 - scoring.lookup(priorities, PRIORITY_RANK, 5) / 5
+    matrix[:, 1] = 1 - scoring.lookup(types, TYPE_RANK, 5) / 5
+    matrix[:, 2] = scoring.flags(statuses, _is_in_progress)
+    matrix[:, 3] = scoring.normalize(_ages(updated, now))
+    matrix[:, 4] = scoring.normalize(scoring.group_sizes(assignees))
+    matrix[:, 5] = scoring.normalize(np.log1p(description_lengths))
+    matrix[:, 6] = scoring.normalize(link_counts)
+    return matrix, done, _key_numbers(keys)
+
+
+def _ranking(filtered_issues, order_label):
+    # (issue indices from first to last, scores) as plain lists, indexing numpy arrays item by item is slow
+    matrix, done, key_numbers = issue_features(filtered_issues)
+    weights = scoring.weight_vector(FEATURES, ORDER_WEIGHTS.get(order_label, ORDER_WEIGHTS[None]))
+    order, scores = scoring.rank(matrix, weights, tiebreak=key_numbers, last=done)
+    if order_label in DEPENDENCY_ORDER_LABELS:
+        return _dependency_order(filtered_issues, order, done), scores.tolist()
+    return order.tolist(), scores.tolist()
+
+
+def score_issues(filtered_issues, order_label=None):
+    # [(issue, score)] from first to last for the given order label, unknown labels use the default weights
+    if not filtered_issues:
+        return []
+    order, scores = _ranking(filtered_issues, order_label)
+    return [(filtered_issues[index], scores[index]) for index in order]
+
+
+def _dependency_order(filtered_issues, order, done):
+    # topological order of the open issues (blockers and subtasks first), ready issues taken by score; done last
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    graph = build_graph(filtered_issues, done)
+    topological, _ = topological_order(graph, rank.tolist())
+    done = done.tolist()
+    return [index for index in topological if not done[index]] + [index for index in order.tolist() if done[index]]
+
+
+def dependency_report(filtered_issues):
+    # dependencies.dependency_summary over the open issues, in the local "dependências" order
+    if not filtered_issues:
+        return dependency_summary([])
+    matrix, done, key_numbers = issue_features(filtered_issues)
+    weights = scoring.weight_vector(FEATURES, ORDER_WEIGHTS["dependências"])
+    order, _ = scoring.rank(matrix, weights, tiebreak=key_numbers, last=done)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return dependency_summary(filtered_issues, rank.tolist(), done)
+
+
+def local_order(filtered_issues, order_label=None):
+    if not filtered_issues:
+        return []
+    order, _ = _ranking(filtered_issues, order_label)
+    return [filtered_issues[index] for index in order]
+
+
+def fallback_tasks(filtered_issues, order_label=None): # task dicts without any AI content, in local order
+    return [
+        {
+            "ID": issue["id"],
+            "Key": issue.get("key"),
+            "Title": issue.get("summary"),
+            "Status": issue.get("status"),
+            "Priority": issue.get("priority"),
+            "Type": issue.get("issuetype"),
+        }
+        for issue in local_order(filtered_issues, order_label)
+    ]
+
+
+def fallback_analysis(filtered_issues, order_label=None):
+    return {
+        "mensagem": FALLBACK_MESSAGE.format(criterion=order_label or "default criterion"),
+        "tasks": fallback_tasks(filtered_issues, order_label),
+        "degraded": True,
+    }
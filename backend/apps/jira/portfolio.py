@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import close_old_connections
+
+from .mirror import get_mirrored_issues
+from .services import get_user_jira_projects
+
+# Cross-project issue listing: one server-side fan-out instead of one /issues/ call per project from the browser.
+
+JIRA_PORTFOLIO_MAX_CONCURRENCY = int(os.getenv("JIRA_PORTFOLIO_MAX_CONCURRENCY", 4)) # per user, across all of their requests
+JIRA_PORTFOLIO_DEADLINE = float(os.getenv("JIRA_PORTFOLIO_DEADLINE", 20)) # seconds for the whole request
+JIRA_PORTFOLIO_MAX_PROJECTS = int(os.getenv("JIRA_PORTFOLIO_MAX_PROJECTS", 50))
+
+# user_id -> BoundedSemaphore, so two tabs of the same user can't double the upstream load
+_user_slots = {}
+_user_slots_lock = threading.Lock()
+
+
+def _slots_for(user_id):
+    with _user_slots_lock:
+        slots = _user_slots.get(user_id)
+        if slots is None:
+            slots = _user_slots[user_id] = threading.BoundedSemaphore(JIRA_PORTFOLIO_MAX_CONCURRENCY)
+        return slots
+
+
+def _fetch_project(jira_token, cloud_id, project_key, fresh, deadline):
+    slots = _slots_for(jira_token.user_id)
+    if not slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        raise TimeoutError("deadline reached before a fetch slot was free")
+    try:
+        return get_mirrored_issues(jira_token, cloud_id, project_key, force_sync=fresh)
+    finally:
+        slots.release()
+        close_old_connections() # worker threads don't go through the request cycle that closes them
+
+
+def get_portfolio_issues(user, jira_token, cloud_id, project_keys=None, fresh=False, deadline=JIRA_PORTFOLIO_DEADLINE):
+    # returns ({"issues": [...], "projects": {...}, "partial": bool}, error).
+    # every project reports its own status, a failure or timeout in one project never fails the others
+    if not project_keys:
+        projects, error = get_user_jira_projects(user)
+        if error:
+            return None, error
+        project_keys = [project["key"] for project in projects if project.get("key")]
+    project_keys = list(dict.fromkeys(project_keys))[:JIRA_PORTFOLIO_MAX_PROJECTS]
+
+    expires = time.monotonic() + deadline
+    report = {key: {"status": "timeout"} for key in project_keys}
+    results = {}
+    if project_keys:
+        executor = ThreadPoolExecutor(max_workers=min(JIRA_PORTFOLIO_MAX_CONCURRENCY, len(project_keys)))
+        try:
+            futures = {
+                executor.submit(_fetch_project, jira_token, cloud_id, key, fresh, expires): key
+                for key in project_keys
+            }
+            pending = set(futures)
+            while pending:
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures[future]
+                    try:
+                        results[key] = future.result()
+                    except TimeoutError:
+                        pass # stays "timeout"
+                    except Exception as e:
+                        report[key] = {"status": "error", "error": str(e)}
+                    else:
+                        report[key] = {"status": "ok", "count": len(results[key])}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True) # late projects keep running in the background only
+
+    issues = [
+        {**issue, "project_key": key}
+        for key in project_keys
+        for issue in results.get(key, [])
+    ]
+    return {
+        "issues": issues,
+        "projects": report,
+        "partial": any(entry["status"] != "ok" for entry in report.values()),
+    }, None
@@ -0,0 +1,45 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the Jira search API, used by the benchmark commands. Standard library only, so it can run in
+# a spawned process (the benchmark's own code then doesn't share a GIL with it).
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    # every call waits `latency` seconds, like the real API does, then answers one page of the synthetic project
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # headers and body go out in separate writes
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        start_at, max_results = int(query["startAt"][0]), min(int(query["maxResults"][0]), 100)
+        body = self.server.pages.get((start_at, max_results))
+        if body is None:
+            issues = self.server.issues[start_at:start_at + max_results]
+            body = json.dumps({"startAt": start_at, "maxResults": max_results, "total": len(self.server.issues), "issues": issues}).encode()
+            self.server.pages[(start_at, max_results)] = body
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(ready, issue_count, latency): # process target: reports the port through `ready`, then serves forever
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SearchHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.latency = latency
+    server.pages = {}
+    server.issues = [
+        {"id": str(10000 + index), "key": f"BENCH-{index + 1}", "fields": {"summary": f"Issue {index}", "status": {"name": "To Do"}}}
+        for index in range(issue_count)
+    ]
+    ready.put(server.server_address[1])
+    server.serve_forever()
@@ -1,28 +1,99 @@
-import requests
 import os
-import re
-import json
+import threading
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+
+from apps.core import ai_cache, http_client, llm, llm_json, similarity
+from apps.core.json_stream import iter_response_items
+from apps.core.prompts import AI_PROMPT_TOKEN_BUDGET, PromptBuilder, estimate_tokens, log_report
+from .adf import adf_to_text
+from .dependencies import compact_links
 from .models import JiraToken
+from .ordering import dependency_report, fallback_analysis, fallback_tasks
+from .tokens import ajira_get, get_jira_token, jira_get
 
-def get_cloud_id(access_token): #Function to get the cloud_id (will be reused throughout the code)
-    url = "https://api.atlassian.com/oauth/token/accessible-resources"
+JIRA_SEARCH_PAGE_SIZE = int(os.getenv("JIRA_SEARCH_PAGE_SIZE", 100)) # Jira caps maxResults at 100
+JIRA_SEARCH_MAX_WORKERS = int(os.getenv("JIRA_SEARCH_MAX_WORKERS", 4))
+JIRA_SEARCH_STREAM_JSON = os.getenv("JIRA_SEARCH_STREAM_JSON", "false").lower() in ("1", "true", "yes") # parse search pages incrementally
+# only what filter_issues and the mirror read, Jira returns every field (custom fields included) otherwise
+JIRA_ISSUE_FIELDS = "summary,description,status,assignee,issuetype,priority,updated,issuelinks,subtasks"
+AI_PROMPT_VERSION = 4 # bump whenever build_ai_prompt changes, it is part of the AI cache key
+AI_BATCH_TOKEN_BUDGET = int(os.getenv("AI_BATCH_TOKEN_BUDGET", 8000)) # per-prompt budget, 0 disables batching
+AI_BATCH_MAX_WORKERS = int(os.getenv("AI_BATCH_MAX_WORKERS", 8))
+AI_BATCH_RETRIES = int(os.getenv("AI_BATCH_RETRIES", 1)) # a failed map batch is sent again this many times
+JIRA_DESCRIPTION_MAX_CHARS = int(os.getenv("JIRA_DESCRIPTION_MAX_CHARS", 0)) # 0 keeps the whole description
+JIRA_CLOUD_ID_CACHE_TTL = int(os.getenv("JIRA_CLOUD_ID_CACHE_TTL", 3600)) # seconds
+
+# user_id -> (cloud_ids, expires_at), sits in front of JiraToken.cloud_ids
+_cloud_id_cache = {}
+_cloud_id_cache_lock = threading.Lock()
+
+ACCESSIBLE_RESOURCES_URL = "https://api.atlassian.com/oauth/token/accessible-resources"
+JIRA_SITE_API_URL = os.getenv("JIRA_SITE_API_URL", "https://api.atlassian.com") # site REST calls, a stub in benchmarks
+
+def get_cloud_ids(access_token): #Function to get all the Jira site ids the token can access
+    url = ACCESSIBLE_RESOURCES_URL
     headers = {"Authorization": f"Bearer {access_token}"}
-    resp = requests.get(url, headers=headers)
+    resp = http_client.get(url, headers=headers)
     resp.raise_for_status()
-    resources = resp.json()
-    return resources[0]["id"] if resources else None
+    return [resource["id"] for resource in resp.json()]
+
+def get_cloud_id(access_token): #Function to get the cloud_id (will be reused throughout the code)
+    cloud_ids = get_cloud_ids(access_token)
+    return cloud_ids[0] if cloud_ids else None
+
+def _cached_cloud_ids(user_id): # from the in-process TTL cache, None when missing or expired
+    with _cloud_id_cache_lock:
+        cached = _cloud_id_cache.get(user_id)
+    return cached[0] if cached and cached[1] > time.monotonic() else None
+
+def _remember_cloud_ids(user_id, cloud_ids):
+    with _cloud_id_cache_lock:
+        _cloud_id_cache[user_id] = (cloud_ids, time.monotonic() + JIRA_CLOUD_ID_CACHE_TTL)
+
+def _save_cloud_ids(jira_token, resp): # persists the site ids of an accessible-resources response on the token
+    resp.raise_for_status()
+    cloud_ids = [resource["id"] for resource in resp.json()]
+    jira_token.cloud_ids = cloud_ids
+    jira_token.save(update_fields=["cloud_ids"])
+    _remember_cloud_ids(jira_token.user_id, cloud_ids)
+    return cloud_ids
+
+def store_cloud_ids(jira_token): # resolves the site ids upstream and persists them on the token
+    return _save_cloud_ids(jira_token, jira_get(jira_token, ACCESSIBLE_RESOURCES_URL))
+
+def resolve_cloud_id(jira_token): # in-process TTL cache -> DB -> accessible-resources
+    cloud_ids = _cached_cloud_ids(jira_token.user_id)
+    if cloud_ids is None:
+        cloud_ids = jira_token.cloud_ids or store_cloud_ids(jira_token)
+        _remember_cloud_ids(jira_token.user_id, cloud_ids)
+    return cloud_ids[0] if cloud_ids else None
+
+def invalidate_cloud_id(jira_token): # called on token refresh or when the site stops answering
+    with _cloud_id_cache_lock:
+        _cloud_id_cache.pop(jira_token.user_id, None)
+    if jira_token.cloud_ids:
+        jira_token.cloud_ids = []
+        jira_token.save(update_fields=["cloud_ids"])
+
+def _check_site_response(jira_token, resp):
+    # a 401/404 from the site usually means the cached cloud_id is stale (site removed or access revoked)
+    if resp.status_code in (401, 404):
+        invalidate_cloud_id(jira_token)
 
 def get_user_jira_projects(user):
-    try:
-        jira_token = JiraToken.objects.get(user=user)
-    except JiraToken.DoesNotExist:
+    jira_token = get_jira_token(user)
+    if jira_token is None:
         return None, "Token not found"
-    cloud_id = get_cloud_id(jira_token.access_token)
+    cloud_id = resolve_cloud_id(jira_token)
     if not cloud_id:
         return None, "Cloud ID not found"
-    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/project/search"
-    headers = {"Authorization": f"Bearer {jira_token.access_token}"}
-    resp = requests.get(url, headers=headers)
+    url = f"{JIRA_SITE_API_URL}/ex/jira/{cloud_id}/rest/api/3/project/search"
+    resp = jira_get(jira_token, url)
+    _check_site_response(jira_token, resp)
     data = resp.json()
     filtered_projects = [
         {
@@ -36,38 +107,75 @@ def get_user_jira_projects(user):
     ]
     return filtered_projects, None
 
-def extract_description(desc):
-                if isinstance(desc, dict) and "content" in desc:
-                    #extract text from Jira structured description
-                    try:
-                        return " ".join(
-                            t["text"]
-                            for p in desc["content"]
-                            for t in p.get("content", [])
-                            if t.get("type") == "text"
-                        )
-                    except Exception:
-                        return str(desc)
-                return desc if desc else ""
+def extract_description(desc, max_chars=JIRA_DESCRIPTION_MAX_CHARS or None):
+    # Jira Cloud returns descriptions as ADF documents, older payloads as plain strings
+    if isinstance(desc, dict):
+        return adf_to_text(desc, max_chars)
+    if isinstance(desc, str):
+        return desc[:max_chars] if max_chars else desc
+    return ""
 
 def get_jira_token_and_cloud_id(user):
 
-    try:
-        jira_token = JiraToken.objects.get(user=user)
-    except JiraToken.DoesNotExist:
+    jira_token = get_jira_token(user)
+    if jira_token is None:
         return None, None, "Token not found"
-    cloud_id = get_cloud_id(jira_token.access_token)
+    cloud_id = resolve_cloud_id(jira_token)
     if not cloud_id:
         return None, None, "Cloud ID not found"
     return jira_token, cloud_id, None
 
-def get_project_issues(jira_token, cloud_id, project_key):
-    url = f"https://api.atlassian.com/ex/jira/{cloud_id}/rest/api/3/search?jql=project={project_key}"
-    headers = {"Authorization": f"Bearer {jira_token.access_token}"}
-    resp = requests.get(url, headers=headers)
+def _fetch_issues_page(jira_token, cloud_id, jql, start_at, max_results):
+    # one search page with its issues already in the filter_issues shape, the raw ones are dropped right away
+    url = f"{JIRA_SITE_API_URL}/ex/jira/{cloud_id}/rest/api/3/search"
+    params = {"jql": jql, "startAt": start_at, "maxResults": max_results, "fields": JIRA_ISSUE_FIELDS}
+    if JIRA_SEARCH_STREAM_JSON:
+        return _stream_issues_page(jira_token, url, params)
+    resp = jira_get(jira_token, url, params=params)
+    _check_site_response(jira_token, resp)
     resp.raise_for_status()
-    data = resp.json()
-    return data.get("issues", [])
+    page = resp.json()
+    page["issues"] = filter_issues(page.get("issues", []))
+    return page
+
+def _stream_issues_page(jira_token, url, params):
+    # same page as the buffered path, but each issue is decoded and filtered while the body arrives, so neither
+    # the raw body nor the raw issues (ADF descriptions, every link field) are ever held for the whole page
+    with jira_get(jira_token, url, params=params, stream=True) as resp:
+        _check_site_response(jira_token, resp)
+        resp.raise_for_status()
+        meta, issues = iter_response_items(resp, "issues")
+        page = {"issues": filter_issues(issues)}
+    page.update(meta)
+    return page
+
+def iter_issue_pages(jira_token, cloud_id, jql, page_size=JIRA_SEARCH_PAGE_SIZE, max_workers=JIRA_SEARCH_MAX_WORKERS):
+    # yields one page (list of issues in the filter_issues shape) at a time, in order.
+    # the first page tells us the total, the remaining pages are fetched concurrently
+    # but only `max_workers` pages are ever in flight, so memory stays bounded
+    first_page = _fetch_issues_page(jira_token, cloud_id, jql, 0, page_size)
+    issues = first_page.get("issues", [])
+    if not issues:
+        return
+    yield issues
+    total = first_page.get("total", len(issues))
+    step = first_page.get("maxResults") or len(issues) # the server may lower the requested page size
+    offsets = iter(range(step, total, step))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = deque(
+            executor.submit(_fetch_issues_page, jira_token, cloud_id, jql, start_at, step)
+            for _, start_at in zip(range(max_workers), offsets)
+        )
+        while pending:
+            page = pending.popleft().result()
+            next_start = next(offsets, None)
+            if next_start is not None:
+                pending.append(executor.submit(_fetch_issues_page, jira_token, cloud_id, jql, next_start, step))
+            yield page.get("issues", [])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 def filter_issues(issues): #filter and format just the necessary fields
          return [
@@ -83,11 +191,14 @@ def filter_issues(issues): #filter and format just the necessary fields
             ),
             "issuetype": issue["fields"].get("issuetype", {}).get("name"),
             "priority": issue["fields"].get("priority", {}).get("name"),
+            "updated": issue["fields"].get("updated"),
+            "links": compact_links(issue["fields"].get("issuelinks")),
+            "subtasks": [subtask["key"] for subtask in issue["fields"].get("subtasks") or () if subtask.get("key")],
         }
         for issue in issues
     ]
 
-def build_ai_prompt(filtered_issues, order_label):
+def ai_prompt_header(order_label):
     if order_label:
         prompt = (
             f"You are a highly experienced software engineering advisor with senior Scrum Master knowledge. "
@@ -154,49 +265,422 @@ def build_ai_prompt(filtered_issues, order_label):
 
             "Tasks:\n"
         )
+    return prompt
 
-
-        # Add each issue to the prompt
+def build_ai_prompt(filtered_issues, order_label, token_budget=AI_PROMPT_TOKEN_BUDGET):
+    # returns (prompt, report), see apps.core.prompts.PromptBuilder for the report fields
+    builder = PromptBuilder(ai_prompt_header(order_label) + dependency_hints(filtered_issues), token_budget=token_budget)
     for issue in filtered_issues:
-            prompt += (
-                f"- ID: {issue['id']}\n"
-                f"- Title: {issue['summary']}\n"
-                f"Description: {extract_description(issue['description'])}\n"
-                f"Status: {issue['status']}\n"
-                f"Type: {issue['issuetype']}\n"
-                f"Priority: {issue['priority']}\n"
-                f"Assignee: {issue['assignee']}\n\n"
-            )
+        builder.add_item(issue_prompt_fields(issue))
+    return builder.build()
+
+def ai_prompt(filtered_issues, order_label): # the prompt sent to the LLM, its budget report goes to the log
+    prompt, report = build_ai_prompt(filtered_issues, order_label)
+    log_report("jira", report)
     return prompt
 
-def call_ai(prompt):
-    openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
-    api_url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {openrouter_api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://localhost:8000",
-        "X-title": "Jira DeepSeek Integration",
-    }
-    payload = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
-    try:
-        ia_resp = requests.post(api_url, headers=headers, json=payload, timeout=30)
-        if ia_resp.ok:
-            ia_json = ia_resp.json()
-            ia_response = ia_json["choices"][0]["message"]["content"]
-            if ia_response:
-                ia_response = re.sub(r"^```json\s*|\s*```$", "", ia_response.strip(), flags=re.MULTILINE)
-                try:
-                    ia_response = json.loads(ia_response)
-                except Exception:
-                    pass
+def dependency_hints(filtered_issues):
+    # structured hints from the issue-link graph (see apps.jira.dependencies), empty when no issue links another one
+    summary = dependency_report(filtered_issues)
+    if not summary["edges"]:
+        return ""
+    hints = (
+        "Dependency hints (computed from the Jira issue links, respect them when ordering):\n"
+        f"- Dependency-safe order: {', '.join(summary['order'])}\n"
+        f"- Critical path ({summary['critical_path_length']} tasks): {' -> '.join(summary['critical_path'])}\n"
+    )
+    if summary["cyclic"]:
+        hints += f"- Circular dependencies broken at: {', '.join(summary['cyclic'])}\n"
+    return hints + "\n"
+
+def _related_keys(issue, relation):
+    return ", ".join(link["key"] for link in issue.get("links") or () if link.get("relation") == relation)
+
+def issue_prompt_fields(issue): # descriptions are already plain text here, filter_issues extracted them
+    return [
+        ("- ID", issue['id']),
+        ("- Title", issue['summary']),
+        ("Description", issue['description']),
+        ("Status", issue['status']),
+        ("Type", issue['issuetype']),
+        ("Priority", issue['priority']),
+        ("Assignee", issue['assignee']),
+        ("Key", issue.get('key') if issue.get('links') or issue.get('subtasks') else None), # dependency hints use keys
+        ("Blocks", _related_keys(issue, "blocks")),
+        ("Blocked by", _related_keys(issue, "blocked_by")),
+        ("Subtasks", ", ".join(issue.get('subtasks') or ())),
+        ("Near-duplicates", ", ".join(issue.get('duplicates') or ())), # see dedupe_issues, they get this task's answer
+    ]
+
+def format_issue_for_prompt(issue):
+    builder = PromptBuilder("", token_budget=0)
+    return builder.add_item(issue_prompt_fields(issue)).build()[0]
+
+# expected answer shapes, see apps.core.llm_json.validate. Tasks without ID and Title (the half task left by a
+# truncated answer) are dropped
+AI_TASK_SCHEMA = {"type": dict, "required": {"ID": {}, "Title": {}}}
+AI_RESPONSE_SCHEMA = (
+    {"type": dict, "required": {"mensagem": {}, "tasks": {"type": list, "items": AI_TASK_SCHEMA}}},
+    {"type": list, "items": AI_TASK_SCHEMA}, # the tasks alone, in the order of the issues
+)
+AI_REDUCE_SCHEMA = {"type": dict, "required": {"mensagem": {}, "order": {"type": list}}}
+
+def parse_ai_content(ia_response, schema=None, parser=None):
+    # decodes the JSON answer, repairing quotes, trailing commas, surrounding prose and truncation (see
+    # apps.core.llm_json). The raw text is returned when no JSON is found or it doesn't match `schema`.
+    # `parser` is a TolerantJSONParser that was already fed the streamed answer.
+    # A truncated answer is flagged "partial" (a bare task list becomes {"mensagem": None, "tasks": [...]}),
+    # which keeps it out of the AI cache, see ai_cache.cacheable
+    if not ia_response:
+        return ia_response
+    if parser is not None:
+        value, truncated = parser.close(), parser.truncated
+    else:
+        value, truncated = llm_json.decode(ia_response)
+    if value is None:
+        return ia_response
+    if schema is not None:
+        value, error = llm_json.validate(value, schema)
+        if error:
             return ia_response
-        else:
-            return f"Error: {ia_resp.status_code} - {ia_resp.text}"
+    if truncated:
+        value = {**value, "partial": True} if isinstance(value, dict) else {"mensagem": None, "tasks": value, "partial": True}
+    return value
+
+def call_ai(prompt, schema=None):
+    try:
+        return parse_ai_content(llm.complete(prompt), schema)
+    except llm.LLMError as e:
+        return str(e)
+    except Exception as e:
+        return f"error calling IA: {str(e)}"
+
+def call_ai_stream(prompt):
+    # yields the completion text as it is generated.
+    # errors are yielded as a single string, the same way call_ai returns them
+    try:
+        yield from llm.stream(prompt)
+    except llm.LLMError as e:
+        yield str(e)
     except Exception as e:
-        return f"error calling IA: {str(e)}"
\ No newline at end of file
+        yield f"error calling IA: {str(e)}"
+
+def split_issue_batches(filtered_issues, order_label, token_budget=AI_BATCH_TOKEN_BUDGET):
+    # greedy packing of issues into prompts that stay under the token budget (header included)
+    if token_budget <= 0:
+        return [filtered_issues]
+    available = max(token_budget - estimate_tokens(ai_prompt_header(order_label)), 1)
+    linked = any(issue.get("links") or issue.get("subtasks") for issue in filtered_issues)
+    batches, current, used = [], [], 0
+    for issue in filtered_issues:
+        cost = estimate_tokens(format_issue_for_prompt(issue))
+        if linked: # the key is repeated in the dependency hints
+            cost += 2 * estimate_tokens(f"{issue['key']}, ")
+        if current and used + cost > available:
+            batches.append(current)
+            current, used = [], 0
+        current.append(issue)
+        used += cost
+    if current or not batches:
+        batches.append(current)
+    return batches
+
+def _task_id(task):
+    if not isinstance(task, dict):
+        return None
+    value = task.get("ID", task.get("id"))
+    return str(value) if value is not None else None
+
+def _is_analysis(ia_response):
+    return isinstance(ia_response, dict) and "tasks" in ia_response and "mensagem" in ia_response
+
+def _as_analysis(ia_response): # a bare task list (see AI_RESPONSE_SCHEMA) is an analysis without a message
+    return {"mensagem": "", "tasks": ia_response} if isinstance(ia_response, list) else ia_response
+
+def build_reduce_prompt(batch_results, order_label):
+    criterion = f"the criterion '{order_label}'" if order_label else "what is most strategic for the team"
+    parts = [
+        "You are a highly experienced software engineering advisor with senior Scrum Master knowledge.\n\n"
+        f"A large JIRA backlog was analysed in {len(batch_results)} batches, each one ordered by {criterion}. "
+        "Merge the batches into ONE global ordering and ONE strategic message.\n"
+        "The message must keep the structure of the batch messages (executive summary, why this order, practical impact, "
+        "strategic recommendations, risks, next steps checklist) and must cover the whole backlog.\n\n"
+        "Return everything in a JSON format:\n"
+        "{ 'mensagem': <merged_summary>, 'order': [ ...task IDs, all of them, in the global order... ] }\n\n"
+    ]
+    for index, result in enumerate(batch_results, start=1):
+        parts.append(f"Batch {index} summary:\n{result['mensagem']}\nBatch {index} order:\n")
+        for task in result["tasks"]:
+            title = task.get("Title", task.get("title", "")) if isinstance(task, dict) else ""
+            parts.append(f"- {_task_id(task)}: {title}\n")
+        parts.append("\n")
+    return "".join(parts)
+
+def merge_batch_results(batch_results, reduced):
+    # keeps the batch order as a fallback for any task the reduce step left out
+    tasks_by_id = {}
+    unordered = []
+    for result in batch_results:
+        for task in result["tasks"]:
+            task_id = _task_id(task)
+            if task_id is None or task_id in tasks_by_id:
+                unordered.append(task)
+            else:
+                tasks_by_id[task_id] = task
+    if _is_reduced(reduced):
+        ordered = [tasks_by_id.pop(str(task_id)) for task_id in reduced["order"] if str(task_id) in tasks_by_id]
+        mensagem = reduced["mensagem"]
+    else:
+        ordered = []
+        mensagem = "\n\n".join(str(result["mensagem"]) for result in batch_results if result["mensagem"])
+    return {"mensagem": mensagem, "tasks": ordered + list(tasks_by_id.values()) + unordered}
+
+def _is_reduced(reduced):
+    return isinstance(reduced, dict) and "mensagem" in reduced and isinstance(reduced.get("order"), list)
+
+def analyze_batch(batch, order_label):
+    result = _as_analysis(call_ai(ai_prompt(batch, order_label), AI_RESPONSE_SCHEMA))
+    for _ in range(AI_BATCH_RETRIES):
+        if _is_analysis(result) or not llm.available(): # no retry while the circuit breaker is open
+            break
+        result = _as_analysis(call_ai(ai_prompt(batch, order_label), AI_RESPONSE_SCHEMA))
+    return result
+
+def analyze_issues_batched(filtered_issues, order_label):
+    # map: one prompt per token-budgeted batch, analysed in parallel
+    # reduce: a small prompt with only the batch summaries and ids merges them back into a single answer
+    batches = split_issue_batches(filtered_issues, order_label)
+    if len(batches) == 1:
+        return call_ai(ai_prompt(batches[0], order_label), AI_RESPONSE_SCHEMA)
+    with ThreadPoolExecutor(max_workers=min(AI_BATCH_MAX_WORKERS, len(batches))) as executor:
+        batch_results = list(executor.map(lambda batch: analyze_batch(batch, order_label), batches))
+    analyses = [result for result in batch_results if _is_analysis(result)]
+    if not analyses:
+        return batch_results[0] # every batch failed, surface the first error as call_ai would
+    reduced = call_ai(build_reduce_prompt(analyses, order_label), AI_REDUCE_SCHEMA)
+    merged = merge_batch_results(analyses, reduced)
+    failed = []
+    for batch, result in zip(batches, batch_results):
+        if not _is_analysis(result):
+            failed += batch
+        elif result.get("partial"): # truncated answer: the issues it didn't get to
+            answered = {_task_id(task) for task in result["tasks"]}
+            failed += [issue for issue in batch if str(issue["id"]) not in answered]
+    if failed or any(result.get("partial") for result in analyses):
+        # still no answer after the retries: these issues go last, in local order, and the flag keeps the
+        # answer out of the AI cache (see ai_cache.cacheable)
+        merged["tasks"] += fallback_tasks(failed, order_label)
+        merged["partial"] = True
+    return merged
+
+def dedupe_issues(filtered_issues):
+    # (representatives, duplicates): one issue per cluster of near-duplicate issues (same status, not linked to
+    # anything), with the keys of the others in "duplicates"; duplicates maps a representative id to those issues
+    labels = similarity.near_duplicate_labels(
+        [f"{issue['summary'] or ''}\n{(issue['description'] or '')[:similarity.MAX_TEXT_CHARS]}" for issue in filtered_issues],
+        groups=[
+            ("linked", index) if issue.get("links") or issue.get("subtasks") else ("status", issue["status"])
+            for index, issue in enumerate(filtered_issues)
+        ],
+    )
+    members = similarity.clusters(labels)
+    if not members:
+        return filtered_issues, {}
+    representatives = []
+    for index, issue in enumerate(filtered_issues):
+        if labels[index] != index:
+            continue
+        if index in members:
+            issue = {**issue, "duplicates": [filtered_issues[member]["key"] for member in members[index]]}
+        representatives.append(issue)
+    duplicates = {
+        str(filtered_issues[index]["id"]): [filtered_issues[member] for member in cluster]
+        for index, cluster in members.items()
+    }
+    return representatives, duplicates
+
+def _duplicate_task(task, issue):
+    return {**task, "ID": issue["id"], "Title": issue["summary"], "Duplicate of": task.get("ID", task.get("id"))}
+
+def expand_duplicates(ia_response, filtered_issues, duplicates):
+    # every duplicate gets a copy of its representative's task: right after it in an analysis, at the duplicate's
+    # own position in a bare task list (answered in the order of the representatives, paired by process_ai_response)
+    if not duplicates:
+        return ia_response
+    if isinstance(ia_response, list):
+        representative_of = {str(issue["id"]): rep_id for rep_id, issues in duplicates.items() for issue in issues}
+        representatives = [str(issue["id"]) for issue in filtered_issues if str(issue["id"]) not in representative_of]
+        if len(ia_response) != len(representatives):
+            return ia_response
+        answers = dict(zip(representatives, ia_response))
+        return [
+            _duplicate_task(answers[representative_of[str(issue["id"])]], issue)
+            if str(issue["id"]) in representative_of else answers[str(issue["id"])]
+            for issue in filtered_issues
+        ]
+    if not _is_analysis(ia_response):
+        return ia_response
+    tasks, remaining = [], dict(duplicates)
+    for task in ia_response["tasks"]:
+        tasks.append(task)
+        for issue in remaining.pop(_task_id(task), ()):
+            tasks.append(_duplicate_task(task, issue))
+    return {**ia_response, "tasks": tasks}
+
+def analyze_issues_deduped(filtered_issues, order_label):
+    # near-duplicate issues are sent once, the answer is expanded back to all of them
+    representatives, duplicates = dedupe_issues(filtered_issues)
+    return expand_duplicates(analyze_issues_batched(representatives, order_label), filtered_issues, duplicates)
+
+def process_ai_response(ia_response, filtered_issues): # pairs the AI answer with the issues it was asked about
+    if isinstance(ia_response, list) and len(ia_response) == len(filtered_issues):
+        enriched_ia_summary = []
+        for issue, ai_item in zip(filtered_issues, ia_response):
+            enriched_ia_summary.append({
+                "id": issue['id'],
+                "summary": issue['summary'],
+                **ai_item
+            })
+    else:
+        enriched_ia_summary = ia_response
+
+    if isinstance(ia_response, dict) and "tasks" in ia_response and "mensagem" in ia_response:
+        enriched_ia_summary = ia_response["tasks"]
+        ordering_summary = ia_response["mensagem"]
+    elif isinstance(ia_response, list) and len(ia_response) == len(filtered_issues):
+        ordering_summary = None
+    else:
+        ordering_summary = None
+
+    return enriched_ia_summary, ordering_summary
+
+def _issues_cache_key(filtered_issues, order_label):
+    normalized = sorted(filtered_issues, key=lambda issue: issue["id"])
+    return ai_cache.make_key("jira", normalized, order_label, llm.model_label(), AI_PROMPT_VERSION)
+
+def cached_analysis(filtered_issues, order_label):
+    # what analyze_issues answers without calling the LLM: the cached analysis, the local fallback while the
+    # circuit breaker is open, or None when the LLM has to run
+    cached = ai_cache.get(_issues_cache_key(filtered_issues, order_label))
+    if cached is not None:
+        return cached
+    return fallback_analysis(filtered_issues, order_label) if not llm.available() else None
+
+def analyze_issues(filtered_issues, order_label, fallback=True):
+    # cached prompt + LLM call for a set of filtered issues. While the LLM circuit breaker is open (or the call
+    # that just failed opened it) a local ordering flagged "degraded" is returned instead, unless fallback=False
+    cache_key = _issues_cache_key(filtered_issues, order_label)
+    if fallback and not llm.available():
+        cached = ai_cache.get(cache_key)
+        return cached if cached is not None else fallback_analysis(filtered_issues, order_label)
+    ia_response = ai_cache.get_or_compute(
+        cache_key,
+        lambda: analyze_issues_deduped(filtered_issues, order_label),
+        kind="jira",
+    )
+    if fallback and not isinstance(ia_response, (dict, list)) and not llm.available():
+        return fallback_analysis(filtered_issues, order_label)
+    return ia_response
+
+def stream_issue_analysis(filtered_issues, order_label):
+    # yields ("token", text) while the model generates and one final ("done", parsed_response).
+    # cached answers and multi-batch projects (map-reduce can't be streamed) go straight to "done"
+    cache_key = _issues_cache_key(filtered_issues, order_label)
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        yield "done", cached
+        return
+    if not llm.available():
+        yield "done", fallback_analysis(filtered_issues, order_label)
+        return
+    representatives, duplicates = dedupe_issues(filtered_issues)
+    batches = split_issue_batches(representatives, order_label)
+    if len(batches) > 1:
+        yield "done", analyze_issues(filtered_issues, order_label)
+        return
+    chunks = []
+    parser = llm_json.TolerantJSONParser() # decodes while the answer streams in
+    for content in call_ai_stream(ai_prompt(representatives, order_label)):
+        chunks.append(content)
+        parser.feed(content)
+        yield "token", content
+    ia_response = expand_duplicates(parse_ai_content("".join(chunks), AI_RESPONSE_SCHEMA, parser), filtered_issues, duplicates)
+    if ai_cache.cacheable(ia_response):
+        ai_cache.store(cache_key, ia_response, kind="jira")
+    elif not llm.available():
+        ia_response = fallback_analysis(filtered_issues, order_label)
+    yield "done", ia_response
+
+# Async variants used by the ASGI views, same results as their sync counterparts above
+
+async def aresolve_cloud_id(jira_token): # same lookups as resolve_cloud_id
+    cloud_ids = _cached_cloud_ids(jira_token.user_id)
+    if cloud_ids is None:
+        cloud_ids = jira_token.cloud_ids
+        if not cloud_ids:
+            resp = await ajira_get(jira_token, ACCESSIBLE_RESOURCES_URL)
+            cloud_ids = await sync_to_async(_save_cloud_ids)(jira_token, resp)
+        _remember_cloud_ids(jira_token.user_id, cloud_ids)
+    return cloud_ids[0] if cloud_ids else None
+
+async def aget_jira_token_and_cloud_id(user):
+    jira_token = await sync_to_async(get_jira_token)(user)
+    if jira_token is None:
+        return None, None, "Token not found"
+    cloud_id = await aresolve_cloud_id(jira_token)
+    if not cloud_id:
+        return None, None, "Cloud ID not found"
+    return jira_token, cloud_id, None
+
+async def aget_user_jira_projects(user):
+    jira_token, cloud_id, error = await aget_jira_token_and_cloud_id(user)
+    if error:
+        return None, error
+    url = f"{JIRA_SITE_API_URL}/ex/jira/{cloud_id}/rest/api/3/project/search"
+    resp = await ajira_get(jira_token, url)
+    if resp.status_code in (401, 404):
+        await asyncio.to_thread(invalidate_cloud_id, jira_token)
+    data = resp.json()
+    filtered_projects = [
+        {
+            "id": p["id"],
+            "key": p["key"],
+            "name": p["name"],
+            "projectType": p.get("projectTypeKey"),
+            "IsPrivate": p.get("isPrivate"),
+        }
+        for p in data.get("values", [])
+    ]
+    return filtered_projects, None
+
+async def _afetch_issues_page(jira_token, cloud_id, jql, start_at, max_results):
+    url = f"{JIRA_SITE_API_URL}/ex/jira/{cloud_id}/rest/api/3/search"
+    params = {"jql": jql, "startAt": start_at, "maxResults": max_results, "fields": JIRA_ISSUE_FIELDS}
+    resp = await ajira_get(jira_token, url, params=params)
+    if resp.status_code in (401, 404):
+        await asyncio.to_thread(invalidate_cloud_id, jira_token)
+    resp.raise_for_status()
+    return resp.json()
+
+async def aget_filtered_project_issues(jira_token, cloud_id, project_key, page_size=JIRA_SEARCH_PAGE_SIZE, max_workers=JIRA_SEARCH_MAX_WORKERS):
+    # first page for the total, then every other page concurrently (at most max_workers in flight),
+    # each page is filtered as soon as it arrives so raw payloads don't pile up
+    jql = f'project="{project_key}" ORDER BY key ASC'
+    first_page = await _afetch_issues_page(jira_token, cloud_id, jql, 0, page_size)
+    issues = first_page.get("issues", [])
+    if not issues:
+        return []
+    total = first_page.get("total", len(issues))
+    step = first_page.get("maxResults") or len(issues)
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def fetch_filtered(start_at):
+        async with semaphore:
+            page = await _afetch_issues_page(jira_token, cloud_id, jql, start_at, step)
+        return filter_issues(page.get("issues", []))
+
+    pages = await asyncio.gather(*(fetch_filtered(start_at) for start_at in range(step, total, step)))
+    filtered = filter_issues(issues)
+    for page in pages:
+        filtered.extend(page)
+    return filtered
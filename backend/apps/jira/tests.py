@@ -0,0 +1,484 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from apps.core import circuit_breaker, coalesce, llm
+from apps.core.models import AIJob
+from apps.core.tests import StubLLM
+from . import adf, mirror, services
+
+
+class StubResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+
+class StubSearch:
+    # Jira /search over `total` synthetic issues; counts the requests and caps maxResults like Jira does
+    def __init__(self, total, max_results=100):
+        self.total = total
+        self.max_results = max_results
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, jira_token, url, params=None, **kwargs):
+        assert urlsplit(url).path.endswith("/rest/api/3/search")
+        with self.lock:
+            self.requests += 1
+        start_at = params["startAt"]
+        page_size = min(params["maxResults"], self.max_results)
+        issues = [
+            {"id": str(index), "key": f"STUB-{index + 1}", "fields": {"summary": f"Issue {index}"}}
+            for index in range(start_at, min(start_at + page_size, self.total))
+        ]
+        return StubResponse({"startAt": start_at, "maxResults": page_size, "total": self.total, "issues": issues})
+
+
+class IterIssuePagesTests(SimpleTestCase):
+    def test_pages_ten_thousand_issues(self):
+        search = StubSearch(10000)
+        with mock.patch.object(services, "jira_get", search):
+            pages = list(services.iter_issue_pages(object(), "cloud", "project=STUB", page_size=100, max_workers=4))
+        keys = [issue["key"] for page in pages for issue in page]
+        self.assertEqual(len(keys), 10000)
+        self.assertEqual(keys, [f"STUB-{index + 1}" for index in range(10000)]) # in order, no page twice
+        self.assertEqual(search.requests, 100)
+
+    def test_follows_a_lowered_page_size(self):
+        search = StubSearch(1050, max_results=50) # the server answers with fewer issues than asked for
+        with mock.patch.object(services, "jira_get", search):
+            pages = list(services.iter_issue_pages(object(), "cloud", "project=STUB", page_size=100, max_workers=4))
+        self.assertEqual(sum(len(page) for page in pages), 1050)
+        self.assertEqual(search.requests, 21)
+
+    def test_empty_result_is_one_request(self):
+        search = StubSearch(0)
+        with mock.patch.object(services, "jira_get", search):
+            pages = list(services.iter_issue_pages(object(), "cloud", "project=STUB"))
+        self.assertEqual(pages, [])
+        self.assertEqual(search.requests, 1)
+
+    def test_streamed_pages_hold_filtered_issues(self):
+        issues = [raw_issue(number) for number in range(1, 4)]
+        issues[0]["fields"]["description"] = {"type": "doc", "version": 1, "content": [{"type": "paragraph", "content": [{"type": "text", "text": "ADF body"}]}]}
+        body = json.dumps({"expand": "schema,names", "issues": issues, "startAt": 0, "maxResults": 100, "total": 3}).encode()
+
+        class StreamedResponse(StubResponse):
+            def iter_content(self, chunk_size):
+                return (body[start:start + 7] for start in range(0, len(body), 7))
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                pass
+
+        for stream in (False, True):
+            with self.subTest(stream=stream), mock.patch.object(services, "JIRA_SEARCH_STREAM_JSON", stream), \
+                    mock.patch.object(services, "jira_get", return_value=StreamedResponse(json.loads(body))):
+                page = services._fetch_issues_page(object(), "cloud", "project=STUB", 0, 100)
+            self.assertEqual(page["issues"], services.filter_issues(issues))
+            self.assertEqual(page["issues"][0]["description"], "ADF body")
+            self.assertEqual(page["total"], 3) # read after the issues
+
+
+def raw_issue(number):
+    return {"id": str(number), "key": f"STUB-{number}", "fields": {
+        "summary": f"Issue {number}", "status": {"name": "To Do"}, "updated": "2024-05-01T10:00:00.000+0000",
+    }}
+
+
+class AdfToTextTests(SimpleTestCase):
+    def nested_list(self, depth):
+        node = {"type": "paragraph", "content": [{"type": "text", "text": "leaf"}]}
+        for level in range(depth):
+            item = {"type": "listItem", "content": [{"type": "paragraph", "content": [{"type": "text", "text": f"item {level}"}]}, node]}
+            node = {"type": "bulletList", "content": [item]}
+        return {"type": "doc", "version": 1, "content": [node]}
+
+    def test_deep_lists_past_the_recursion_limit(self):
+        text = adf.adf_to_text(self.nested_list(5000))
+        self.assertTrue(text.startswith("- item 4999\n  - item 4998"))
+        self.assertTrue(text.endswith("leaf"))
+        # indentation stops growing, so the text stays linear in the depth
+        self.assertLess(len(text), 5000 * (len("item 4999") + 2 * adf.MAX_INDENT + 4))
+
+    def test_max_chars_stops_the_walk(self):
+        self.assertEqual(adf.adf_to_text(self.nested_list(5000), max_chars=11), "- item 4999")
+
+
+class MirrorVisibilityTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.manager = SimpleNamespace(user_id=User.objects.create_user("manager").pk)
+        self.developer = SimpleNamespace(user_id=User.objects.create_user("developer").pk)
+
+    def sync(self, jira_token, numbers, full=True):
+        pages = [services.filter_issues([raw_issue(number) for number in numbers])]
+        with mock.patch.object(mirror, "iter_issue_pages", return_value=iter(pages)):
+            mirror.sync_project_issues(jira_token, "cloud", "STUB", full=full)
+
+    def keys(self, jira_token):
+        return [issue["key"] for issue in mirror.get_mirrored_issues(jira_token, "cloud", "STUB")]
+
+    def test_users_only_read_the_issues_jira_returned_to_them(self):
+        self.sync(self.manager, [1, 2, 3]) # STUB-3 has a security level the developer is not part of
+        self.sync(self.developer, [1, 2])
+        self.assertEqual(self.keys(self.manager), ["STUB-1", "STUB-2", "STUB-3"])
+        self.assertEqual(self.keys(self.developer), ["STUB-1", "STUB-2"])
+
+    def test_full_sync_drops_issues_the_user_no_longer_sees(self):
+        self.sync(self.manager, [1, 2, 3])
+        self.sync(self.developer, [1, 2, 3])
+        self.sync(self.developer, [1, 2]) # STUB-3 got hidden from the developer
+        self.assertEqual(self.keys(self.developer), ["STUB-1", "STUB-2"])
+        self.assertEqual(self.keys(self.manager), ["STUB-1", "STUB-2", "STUB-3"])
+        self.sync(self.manager, [1, 2]) # deleted in Jira: nobody sees it anymore, the row goes away
+        self.assertFalse(mirror.JiraIssue.objects.filter(issue_id="3").exists())
+
+    def test_locked_table_is_retried_without_a_second_fetch(self):
+        # what a concurrent request gets from SQLite's shared cache while another one writes the table
+        failures = [OperationalError("database table is locked: jira_jiraprojectsync")] * 2
+        get_or_create = mirror.JiraProjectSync.objects.get_or_create
+
+        def locked_get_or_create(**kwargs):
+            if failures:
+                raise failures.pop()
+            return get_or_create(**kwargs)
+
+        search = StubSync([1, 2], delay=0)
+        with mock.patch.object(mirror.JiraProjectSync.objects, "get_or_create", locked_get_or_create), \
+                mock.patch.object(mirror, "iter_issue_pages", search):
+            self.assertEqual(self.keys(self.manager), ["STUB-1", "STUB-2"])
+        self.assertEqual(search.calls, 1)
+
+
+class BatchedAnalysisTests(TestCase):
+    def setUp(self):
+        self.issues = services.filter_issues([raw_issue(number) for number in range(1, 5)])
+        self.calls = []
+        patches = [
+            mock.patch.object(services, "split_issue_batches", lambda issues, order_label: [[issue] for issue in issues]),
+            mock.patch.object(services, "call_ai", self.fake_call_ai),
+            mock.patch.object(services.llm, "available", return_value=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def fake_call_ai(self, prompt, schema=None):
+        # the batch holding issue 3 always fails, the reduce step keeps the batch order
+        self.calls.append(prompt)
+        if schema is services.AI_REDUCE_SCHEMA:
+            return "error calling IA: timeout"
+        if "- ID: 3\n" in prompt:
+            return "error calling IA: timeout"
+        issue_id = prompt.split("- ID: ")[1].split("\n")[0]
+        return {"mensagem": "ok", "tasks": [{"ID": issue_id, "Title": f"Issue {issue_id}", "Recommended strategy": "..."}]}
+
+    def test_failed_batch_is_retried_then_listed_locally(self):
+        result = services.analyze_issues_batched(self.issues, None)
+        self.assertTrue(result["partial"])
+        self.assertEqual([task["ID"] for task in result["tasks"]], ["1", "2", "4", "3"])
+        self.assertNotIn("Recommended strategy", result["tasks"][-1])
+        self.assertEqual(sum("- ID: 3\n" in prompt for prompt in self.calls), 1 + services.AI_BATCH_RETRIES)
+
+    def test_bare_task_list_is_a_batch_answer(self):
+        def call_ai(prompt, schema=None):
+            if schema is services.AI_REDUCE_SCHEMA:
+                return {"mensagem": "merged", "order": ["4", "3", "2", "1"]}
+            issue_id = prompt.split("- ID: ")[1].split("\n")[0]
+            return [{"ID": issue_id, "Title": f"Issue {issue_id}", "Recommended strategy": "..."}]
+
+        with mock.patch.object(services, "call_ai", call_ai):
+            result = services.analyze_issues_batched(self.issues, None)
+        self.assertNotIn("partial", result)
+        self.assertEqual(result["mensagem"], "merged")
+        self.assertEqual([task["ID"] for task in result["tasks"]], ["4", "3", "2", "1"])
+        self.assertTrue(all("Recommended strategy" in task for task in result["tasks"]))
+
+    def test_partial_answer_is_not_cached(self):
+        with mock.patch.object(services.ai_cache, "store") as store:
+            result = services.analyze_issues(self.issues, None)
+        self.assertEqual(len(result["tasks"]), 4)
+        store.assert_not_called()
+
+
+class TruncatedAnswerTests(TestCase):
+    answer = "{'mensagem': 'Ordered by priority.', 'tasks': [{'ID': '1', 'Title': 'Issue 1'}, {'ID': '2', 'Title': 'Issue 2'}, {'ID': '3', 'Ti"
+
+    def setUp(self):
+        self.issues = services.filter_issues([raw_issue(number) for number in range(1, 4)])
+        patcher = mock.patch.object(services.llm, "available", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_truncated_answer_is_partial_without_the_half_task(self):
+        result = services.parse_ai_content(self.answer, services.AI_RESPONSE_SCHEMA)
+        self.assertTrue(result["partial"])
+        self.assertEqual([task["ID"] for task in result["tasks"]], ["1", "2"])
+        complete = services.parse_ai_content(self.answer.rsplit(", {", 1)[0] + "]}", services.AI_RESPONSE_SCHEMA)
+        self.assertNotIn("partial", complete)
+
+    def test_truncated_task_list_becomes_a_partial_analysis(self):
+        result = services.parse_ai_content("[{'ID': '1', 'Title': 'Issue 1'}, {'ID': '2'", services.AI_RESPONSE_SCHEMA)
+        self.assertEqual(result, {"mensagem": None, "tasks": [{"ID": "1", "Title": "Issue 1"}], "partial": True})
+
+    def test_truncated_answer_is_not_cached(self):
+        with mock.patch.object(services.llm, "complete", return_value=self.answer), \
+                mock.patch.object(services.ai_cache, "store") as store:
+            result = services.analyze_issues(self.issues, None)
+        self.assertTrue(result["partial"])
+        store.assert_not_called()
+
+    def test_truncated_stream_is_not_cached(self):
+        chunks = [self.answer[start:start + 10] for start in range(0, len(self.answer), 10)]
+        with mock.patch.object(services.llm, "stream", return_value=iter(chunks)), \
+                mock.patch.object(services.ai_cache, "store") as store:
+            events = list(services.stream_issue_analysis(self.issues, None))
+        self.assertEqual("".join(content for kind, content in events if kind == "token"), self.answer)
+        self.assertTrue(events[-1][1]["partial"])
+        store.assert_not_called()
+
+    def test_batch_cut_short_lists_the_missing_issues_locally(self):
+        answers = {
+            "1": "{'mensagem': 'ok', 'tasks': [{'ID': '1', 'Title': 'Issue 1'}]}",
+            "2": "{'mensagem': 'ok', 'tasks': [{'ID': '2', 'Title': 'Issue 2'}, {'ID': '3', 'Ti",
+        }
+        def complete(prompt):
+            if "'order'" in prompt:
+                return "{'mensagem': 'merged', 'order': ['2', '1']}"
+            return answers[prompt.split("- ID: ")[1].split("\n")[0]]
+        batches = lambda issues, order_label: [issues[:1], issues[1:]]
+        with mock.patch.object(services, "split_issue_batches", batches), mock.patch.object(services.llm, "complete", complete):
+            result = services.analyze_issues_batched(self.issues, None)
+        self.assertTrue(result["partial"])
+        self.assertEqual([task["ID"] for task in result["tasks"]], ["2", "1", "3"])
+
+
+class CoalescedAnalysisTests(TransactionTestCase): # the callers share the AI cache rows across threads
+    def setUp(self):
+        self.issues = services.filter_issues([raw_issue(number) for number in range(1, 4)])
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubLLM)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.calls = 0
+        self.server.delay, self.server.status, self.server.close = 0.5, 200, False # the callers pile up meanwhile
+        self.server.answer = json.dumps({
+            "mensagem": "Ordered by priority.",
+            "tasks": [{"ID": issue["id"], "Title": issue["summary"]} for issue in reversed(self.issues)],
+        })
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        provider = llm.Provider("stub", f"http://127.0.0.1:{self.server.server_port}/v1/chat/completions", "model-stub")
+        for target, value in (("providers", [provider]), ("LLM_HEDGE", False), ("breaker", circuit_breaker.CircuitBreaker("llm-test"))):
+            patcher = mock.patch.object(llm, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        services.ai_cache.invalidate()
+        self.addCleanup(services.ai_cache.invalidate)
+
+    def test_fifty_concurrent_analyses_share_one_llm_call(self):
+        results = [None] * 50
+        barrier = threading.Barrier(len(results))
+
+        def analyze(index):
+            try:
+                barrier.wait()
+                results[index] = services.analyze_issues(self.issues, None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=analyze, args=(index,)) for index in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(results, [json.loads(self.server.answer)] * 50)
+        self.assertEqual(coalesce.single_flight.in_flight(), 0)
+
+
+class DedupedAnalysisTests(SimpleTestCase):
+    login_bug = ("Login page returns a 500 error when the password contains special characters. Steps: open the login "
+                 "page, type a password with an ampersand, submit the form. Expected: the user is logged in.")
+
+    def setUp(self):
+        raw = [raw_issue(number) for number in range(1, 4)]
+        raw[0]["fields"]["description"] = self.login_bug
+        raw[1]["fields"]["description"] = "Export the monthly invoice report as CSV from the billing dashboard, one row per invoice."
+        raw[2]["fields"]["description"] = self.login_bug + " (reported again)"
+        raw[2]["fields"]["summary"] = raw[0]["fields"]["summary"]
+        self.issues = services.filter_issues(raw)
+        patcher = mock.patch.object(services.llm, "available", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def analyze(self, answer):
+        prompts = []
+        def complete(prompt):
+            prompts.append(prompt)
+            return answer
+        with mock.patch.object(services.llm, "complete", complete):
+            result = services.analyze_issues_deduped(self.issues, None)
+        self.assertNotIn("- ID: 3\n", prompts[0]) # sent once, through issue 1
+        return result
+
+    def test_analysis_gets_a_task_per_duplicate(self):
+        result = self.analyze("{'mensagem': 'ok', 'tasks': [{'ID': '2', 'Title': 'Issue 2'}, {'ID': '1', 'Title': 'Issue 1'}]}")
+        self.assertEqual([(task["ID"], task.get("Duplicate of")) for task in result["tasks"]], [("2", None), ("1", None), ("3", "1")])
+
+    def test_bare_task_list_is_paired_with_every_issue(self):
+        result = self.analyze("[{'ID': '1', 'Title': 'Issue 1', 'Risk factors': 'a'}, {'ID': '2', 'Title': 'Issue 2', 'Risk factors': 'b'}]")
+        tasks, summary = services.process_ai_response(result, self.issues)
+        self.assertIsNone(summary)
+        self.assertEqual([(task["id"], task["Risk factors"], task.get("Duplicate of")) for task in tasks], [("1", "a", None), ("2", "b", None), ("3", "a", "1")])
+
+
+class IssuesAIViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("manager")
+        self.client.force_login(self.user)
+        self.issues = services.filter_issues([raw_issue(1), raw_issue(2)])
+        patches = [
+            mock.patch("apps.jira.views.get_jira_token_and_cloud_id", return_value=(SimpleNamespace(user_id=self.user.pk), "cloud", None)),
+            mock.patch("apps.jira.views.get_mirrored_issues", return_value=self.issues),
+            mock.patch.object(services.llm, "available", return_value=True),
+            mock.patch.object(services.llm, "complete", side_effect=AssertionError("the LLM ran in the web request")),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(services.ai_cache.invalidate) # the in-process LRU outlives the test transaction
+
+    def test_cache_miss_queues_a_job(self):
+        resp = self.client.get("/jira/projects/STUB/issues/ai?order_by=prioridade")
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp["Location"], resp.json()["status_url"])
+        job = AIJob.objects.get()
+        self.assertEqual(job.params, {"project_key": "STUB", "order_label": "prioridade", "fresh": False})
+
+    def test_cached_analysis_is_served_inline(self):
+        answer = {"mensagem": "cached", "tasks": [{"ID": "2", "Title": "Issue 2"}, {"ID": "1", "Title": "Issue 1"}]}
+        services.ai_cache.store(services._issues_cache_key(self.issues, None), answer, kind="jira")
+        resp = self.client.get("/jira/projects/STUB/issues/ai")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["ordering_summary"], "cached")
+
+
+class AsyncViewAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("manager")
+        patch = mock.patch("apps.jira.views.aget_user_jira_projects", side_effect=self.fake_projects)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def fake_projects(self, user):
+        return [{"id": "1", "key": "STUB", "name": user.username}], None
+
+    def test_token_clients_are_authenticated(self):
+        token = Token.objects.create(user=self.user)
+        resp = self.client.get("/jira/async/projects", HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()[0]["name"], "manager")
+
+    def test_session_clients_are_authenticated(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/jira/async/projects").status_code, 200)
+
+    def test_missing_or_invalid_credentials_get_401(self):
+        resp = self.client.get("/jira/async/projects")
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(resp["WWW-Authenticate"], "Token")
+        resp = self.client.get("/jira/async/projects", HTTP_AUTHORIZATION="Token not-a-token")
+        self.assertEqual(resp.status_code, 401)
+
+
+class StubSync:
+    # stands in for the Jira search during a sync: slow enough for the concurrent requests to pile up
+    def __init__(self, numbers, delay=0.2):
+        self.pages = [services.filter_issues([raw_issue(number) for number in numbers])]
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, jira_token, cloud_id, jql):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return iter(self.pages)
+
+
+class CoalescedSyncTests(TransactionTestCase): # the request threads need to see each other's commits
+    def setUp(self):
+        User = get_user_model()
+        self.manager = SimpleNamespace(user_id=User.objects.create_user("manager").pk)
+        self.developer = SimpleNamespace(user_id=User.objects.create_user("developer").pk)
+
+    def concurrent_reads(self, jira_tokens):
+        results = [None] * len(jira_tokens)
+        barrier = threading.Barrier(len(jira_tokens))
+
+        def read(index):
+            try:
+                barrier.wait()
+                results[index] = [issue["key"] for issue in mirror.get_mirrored_issues(jira_tokens[index], "cloud", "STUB")]
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=read, args=(index,)) for index in range(len(jira_tokens))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_fifty_concurrent_requests_share_one_sync(self):
+        search = StubSync([1, 2, 3])
+        with mock.patch.object(mirror, "iter_issue_pages", search):
+            results = self.concurrent_reads([self.manager] * 50)
+        self.assertEqual(search.calls, 1)
+        self.assertEqual(results, [["STUB-1", "STUB-2", "STUB-3"]] * 50)
+
+    def test_every_user_gets_a_sync_of_their_own_visibility(self):
+        search = StubSync([1, 2])
+        with mock.patch.object(mirror, "iter_issue_pages", search):
+            results = self.concurrent_reads([self.manager] * 10 + [self.developer] * 10)
+        self.assertEqual(search.calls, 2)
+        self.assertEqual(results, [["STUB-1", "STUB-2"]] * 20)
+        self.assertEqual(coalesce.single_flight.in_flight(), 0)
+
+    def test_sync_finished_after_the_request_is_reused(self):
+        # another process' sync that started before our request but finished after it (we waited on its lock)
+        now = timezone.now()
+        mirror.JiraProjectSync.objects.create(
+            user_id=self.manager.user_id, cloud_id="cloud", project_key="STUB",
+            last_synced_at=now - timedelta(seconds=30), last_finished_at=now + timedelta(seconds=1),
+        )
+        search = StubSync([1], delay=0)
+        with mock.patch.object(mirror, "iter_issue_pages", search):
+            mirror._coalesced_sync(self.manager, "cloud", "STUB")
+        self.assertEqual(search.calls, 0)
+        mirror.JiraProjectSync.objects.update(last_finished_at=now - timedelta(seconds=1))
+        with mock.patch.object(mirror, "iter_issue_pages", search):
+            mirror._coalesced_sync(self.manager, "cloud", "STUB")
+        self.assertEqual(search.calls, 1)
@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from asgiref.sync import sync_to_async
+
+from apps.core import async_http_client, http_client
+from .models import JiraToken
+
+# Keeps live Jira OAuth tokens in process and refreshes them before they expire.
+# Refreshes are single-flight: per user inside a process (lock) and across processes (row lock),
+# which matters because Atlassian rotates the refresh token on every use.
+
+JIRA_TOKEN_URL = "https://auth.atlassian.com/oauth/token"
+JIRA_TOKEN_REFRESH_MARGIN = int(os.getenv("JIRA_TOKEN_REFRESH_MARGIN", 300)) # seconds before expiry we refresh
+
+_tokens = {} # user_id -> JiraToken
+_tokens_lock = threading.Lock()
+_refresh_locks = defaultdict(threading.Lock) # user_id -> lock, guarded by _tokens_lock
+
+
+def token_expires_at(jira_token):
+    if jira_token.expires_at:
+        return jira_token.expires_at
+    # tokens stored before expires_at existed
+    return jira_token.created_at + timedelta(seconds=jira_token.expires_in or 0)
+
+
+def _needs_refresh(jira_token):
+    return timezone.now() >= token_expires_at(jira_token) - timedelta(seconds=JIRA_TOKEN_REFRESH_MARGIN)
+
+
+def remember(jira_token): # called after the OAuth callback stores a brand new token
+    with _tokens_lock:
+        _tokens[jira_token.user_id] = jira_token
+
+
+def forget(user_id):
+    with _tokens_lock:
+        _tokens.pop(user_id, None)
+
+
+def get_jira_token(user): # live (refreshed if needed) JiraToken for the user, or None
+    with _tokens_lock:
+        jira_token = _tokens.get(user.pk)
+    if jira_token is None:
+        jira_token = JiraToken.objects.filter(user=user).first()
+        if jira_token is None:
+            return None
+        remember(jira_token)
+    if _needs_refresh(jira_token) and jira_token.refresh_token:
+        jira_token = refresh(jira_token)
+    return jira_token
+
+
+def refresh(jira_token, stale_access_token=None):
+    # stale_access_token: the token that just got a 401, refresh only if nobody replaced it yet
+    with _tokens_lock:
+        lock = _refresh_locks[jira_token.user_id]
+    with lock:
+        with _tokens_lock:
+            current = _tokens.get(jira_token.user_id, jira_token)
+        if _already_refreshed(current, stale_access_token):
+            return current
+        with transaction.atomic():
+            locked = JiraToken.objects.select_for_update().get(pk=jira_token.pk)
+            if _already_refreshed(locked, stale_access_token) or not locked.refresh_token:
+                remember(locked) # another process refreshed while we waited for the row lock
+                return locked
+            resp = http_client.post(JIRA_TOKEN_URL, json={
+                "grant_type": "refresh_token",
+                "client_id": os.getenv("JIRA_CLIENT_ID"),
+                "client_secret": os.getenv("JIRA_CLIENT_SECRET"),
+                "refresh_token": locked.refresh_token,
+            })
+            if resp.status_code != 200:
+                return locked # keep the old token, the upstream call will surface the 401
+            token_data = resp.json()
+            locked.access_token = token_data["access_token"]
+            locked.refresh_token = token_data.get("refresh_token", locked.refresh_token)
+            locked.expires_in = token_data.get("expires_in", 0)
+            locked.expires_at = timezone.now() + timedelta(seconds=locked.expires_in)
+            locked.save(update_fields=["access_token", "refresh_token", "expires_in", "expires_at"])
+        remember(locked)
+    from .services import invalidate_cloud_id
+    invalidate_cloud_id(locked) # the refreshed token may see a different set of sites
+    return locked
+
+
+def _already_refreshed(jira_token, stale_access_token):
+    if stale_access_token is not None:
+        return jira_token.access_token != stale_access_token
+    return not _needs_refresh(jira_token)
+
+
+def jira_request(jira_token, method, url, **kwargs):
+    # authenticated call with the manager's token, refreshed and retried once on a 401
+    headers = kwargs.pop("headers", {})
+    access_token = jira_token.access_token
+    resp = http_client.request(method, url, headers={**headers, "Authorization": f"Bearer {access_token}"}, **kwargs)
+    if resp.status_code == 401 and jira_token.refresh_token:
+        jira_token = refresh(jira_token, stale_access_token=access_token)
+        if jira_token.access_token != access_token:
+            resp.close() # releases the connection when the caller asked for stream=True
+            resp = http_client.request(method, url, headers={**headers, "Authorization": f"Bearer {jira_token.access_token}"}, **kwargs)
+    return resp
+
+
+def jira_get(jira_token, url, **kwargs):
+    return jira_request(jira_token, "GET", url, **kwargs)
+
+
+async def ajira_get(jira_token, url, **kwargs): # async twin of jira_get for the ASGI views
+    headers = kwargs.pop("headers", {})
+    access_token = jira_token.access_token
+    resp = await async_http_client.get(url, headers={**headers, "Authorization": f"Bearer {access_token}"}, **kwargs)
+    if resp.status_code == 401 and jira_token.refresh_token:
+        jira_token = await sync_to_async(refresh)(jira_token, stale_access_token=access_token)
+        if jira_token.access_token != access_token:
+            resp = await async_http_client.get(url, headers={**headers, "Authorization": f"Bearer {jira_token.access_token}"}, **kwargs)
+    return resp
@@ -1,5 +1,7 @@
 from django.urls import path
 from .views import (
+    AsyncJiraProjects,
+    AsyncJiraProjectIssues,
     JiraAuthInit,
     JiraAuthCallback,
     JiraUserInfo,
@@ -7,6 +9,10 @@ from .views import (
     JiraProjectIssues,
     IntegrationStatusView,
     JiraProjectIssuesAI,
+    JiraProjectIssuesAIStream,
+    JiraProjectIssuesAIJob,
+    JiraPortfolioIssues,
+    JiraProjectIssuesOrder,
 )
 
 urlpatterns = [
@@ -16,5 +22,11 @@ urlpatterns = [
     path('jira/userinfo', JiraUserInfo.as_view(), name='jira_user_info'), # retrieves user info from Jira
     path('jira/projects', JiraProjects.as_view(), name='jira_projects'), # retrieves all Jira projects for the user
     path('jira/projects/<str:project_key>/issues/', JiraProjectIssues.as_view(), name='jira_project_issues'), # retrieves issues for a specific project with AI summary and ordering
-    path('jira/projects/<str:project_key>/issues/ai', JiraProjectIssuesAI.as_view(), name='jira_project_issues_ai'),
+    path('jira/projects/<str:project_key>/issues/ai', JiraProjectIssuesAI.as_view(), name='jira_project_issues_ai'), # cached analysis, or 202 + a queued job to poll
+    path('jira/projects/<str:project_key>/issues/order', JiraProjectIssuesOrder.as_view(), name='jira_project_issues_order'), # local ordering for ?order_by=, computed without the AI
+    path('jira/projects/<str:project_key>/issues/ai/jobs', JiraProjectIssuesAIJob.as_view(), name='jira_project_issues_ai_job'), # queues the AI analysis, poll /jobs/<id> for the result
+    path('jira/projects/<str:project_key>/issues/ai/stream', JiraProjectIssuesAIStream.as_view(), name='jira_project_issues_ai_stream'), # same as /ai, streamed as Server-Sent Events
+    path('jira/issues', JiraPortfolioIssues.as_view(), name='jira_portfolio_issues'), # issues of several (default: all) projects in one call, fetched in parallel
+    path('jira/async/projects', AsyncJiraProjects.as_view(), name='jira_projects_async'), # async (ASGI) version of jira/projects
+    path('jira/async/projects/<str:project_key>/issues/', AsyncJiraProjectIssues.as_view(), name='jira_project_issues_async'), # async (ASGI) live issue fetch
 ]
\ No newline at end of file
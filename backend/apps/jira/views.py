@@ -1,11 +1,15 @@
 import os
+from datetime import timedelta
 
 import requests
 import re
 import json
 from dotenv import load_dotenv
 
+from django.http import JsonResponse
 from django.shortcuts import redirect
+from django.utils import timezone
+from django.views import View
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 
@@ -13,8 +17,15 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from apps.core import async_auth, http_client, jobs
+from apps.core.sse import sse_response
 from .models import JiraToken
+from . import tokens
+from .tokens import JIRA_TOKEN_URL
 from .services import *
+from .mirror import get_mirrored_issues
+from .portfolio import get_portfolio_issues
+from .ordering import dependency_report, score_issues
 
 load_dotenv()
 
@@ -23,12 +34,11 @@ JIRA_CLIENT_SECRET = os.getenv("JIRA_CLIENT_SECRET")
 
 JIRA_REDIRECT_URI = "http://127.0.0.1:8000/jira/callback"
 JIRA_AUTH_URL = "https://auth.atlassian.com/authorize"
-JIRA_TOKEN_URL = "https://auth.atlassian.com/oauth/token"
 
 JIRA_API_URL = "https://api.atlassian.com/me"
 JIRA_PROJECTS_API = "https://api.atlassian.com/ex/jira/{cloudid}/rest/api/3/project/search"
 
-JIRA_SCOPES = "read:jira-work read:jira-user read:me"
+JIRA_SCOPES = "read:jira-work read:jira-user read:me offline_access" # offline_access -> refresh_token
 
 class JiraAuthInit(APIView):
     def get(self, request):
@@ -57,31 +67,36 @@ class JiraAuthCallback(APIView):
             "code": code,
             "redirect_uri": JIRA_REDIRECT_URI,
         }
-        resp = requests.post(JIRA_TOKEN_URL, json=data)
+        resp = http_client.post(JIRA_TOKEN_URL, json=data)
         if resp.status_code != 200:
             return Response({"error": "Error obtaining token"}, status=400)
         token_data = resp.json()
 
 
-        JiraToken.objects.update_or_create(
+        jira_token, _ = JiraToken.objects.update_or_create(
             user=request.user,
             defaults={
                 "access_token": token_data["access_token"],
                 "refresh_token": token_data.get("refresh_token"),
                 "expires_in": token_data.get("expires_in", 0),
+                "expires_at": timezone.now() + timedelta(seconds=token_data.get("expires_in", 0)),
             }
         )
+        tokens.remember(jira_token)
+        invalidate_cloud_id(jira_token) # a new token may see a different set of sites
+        try:
+            store_cloud_ids(jira_token)
+        except requests.RequestException:
+            pass # resolved lazily on the first Jira request instead
         return redirect("http://127.0.0.1:8000/jira/projects")
 
 class JiraUserInfo(APIView):
     @method_decorator(login_required)
     def get(self, request):
-        try:
-            jira_token = JiraToken.objects.get(user=request.user)
-        except JiraToken.DoesNotExist:
+        jira_token = tokens.get_jira_token(request.user)
+        if jira_token is None:
             return Response({"error": "Token not found"}, status=404)
-        headers = {"Authorization": f"Bearer {jira_token.access_token}"}
-        resp = requests.get(JIRA_API_URL, headers=headers)
+        resp = tokens.jira_get(jira_token, JIRA_API_URL)
         return Response(resp.json())
     
 class IntegrationStatusView(APIView): #     GET /integrations/status
@@ -120,15 +135,17 @@ class JiraProjectIssues(APIView):
         if error:
             return Response({"error": error}, status=404)
 
-        filtered_issues = self._get_filtered_issues(jira_token, cloud_id, project_key)
+        filtered_issues = self._get_filtered_issues(jira_token, cloud_id, project_key, self._wants_fresh(request))
         return Response({"issues": filtered_issues})
 
     def _get_token_and_cloud_id(self, user):
         return get_jira_token_and_cloud_id(user)
 
-    def _get_filtered_issues(self, jira_token, cloud_id, project_key):
-        issues = get_project_issues(jira_token, cloud_id, project_key)
-        return filter_issues(issues)
+    def _get_filtered_issues(self, jira_token, cloud_id, project_key, fresh=False):
+        return get_mirrored_issues(jira_token, cloud_id, project_key, force_sync=fresh)
+
+    def _wants_fresh(self, request): # ?fresh=1 forces a live incremental sync before reading the mirror
+        return request.GET.get("fresh", "").strip().lower() in ("1", "true", "yes")
     
 class JiraProjectIssuesAI(APIView):
     @method_decorator(login_required)
@@ -137,24 +154,28 @@ class JiraProjectIssuesAI(APIView):
         if error:
             return Response({"error": error}, status=404)
 
-        filtered_issues = self._get_filtered_issues(jira_token, cloud_id, project_key)
+        filtered_issues = self._get_filtered_issues(jira_token, cloud_id, project_key, self._wants_fresh(request))
         order_label = self._get_order_label(request)
-        prompt = build_ai_prompt(filtered_issues, order_label)
-        ia_response = call_ai(prompt)
+        ia_response = cached_analysis(filtered_issues, order_label)
+        if ia_response is None: # the LLM call runs in the AI worker, never in a web worker
+            return self._submit_job(request, project_key, order_label, fresh=False) # the mirror was just read
 
         enriched_ia_summary, ordering_summary = self._process_ai_response(ia_response, filtered_issues)
 
         return Response({
             "ai_summary": enriched_ia_summary,
-            "ordering_summary": ordering_summary
+            "ordering_summary": ordering_summary,
+            **self._degraded(ia_response),
         })
 
     def _get_token_and_cloud_id(self, user):
         return get_jira_token_and_cloud_id(user)
 
-    def _get_filtered_issues(self, jira_token, cloud_id, project_key):
-        issues = get_project_issues(jira_token, cloud_id, project_key)
-        return filter_issues(issues)
+    def _get_filtered_issues(self, jira_token, cloud_id, project_key, fresh=False):
+        return get_mirrored_issues(jira_token, cloud_id, project_key, force_sync=fresh)
+
+    def _wants_fresh(self, request): # ?fresh=1 forces a live incremental sync before reading the mirror
+        return request.GET.get("fresh", "").strip().lower() in ("1", "true", "yes")
 
     def _get_order_label(self, request):
         order_by = request.GET.get("order_by", "").strip().lower()
@@ -168,23 +189,122 @@ class JiraProjectIssuesAI(APIView):
         return order_options.get(order_by)
 
     def _process_ai_response(self, ia_response, filtered_issues):
-        if isinstance(ia_response, list) and len(ia_response) == len(filtered_issues):
-            enriched_ia_summary = []
-            for issue, ai_item in zip(filtered_issues, ia_response):
-                enriched_ia_summary.append({
-                    "id": issue['id'],
-                    "summary": issue['summary'],
-                    **ai_item
-                })
-        else:
-            enriched_ia_summary = ia_response
-
-        if isinstance(ia_response, dict) and "tasks" in ia_response and "mensagem" in ia_response:
-            enriched_ia_summary = ia_response["tasks"]
-            ordering_summary = ia_response["mensagem"]
-        elif isinstance(ia_response, list) and len(ia_response) == len(filtered_issues):
-            ordering_summary = None
-        else:
-            ordering_summary = None
-
-        return enriched_ia_summary, ordering_summary
\ No newline at end of file
+        return process_ai_response(ia_response, filtered_issues)
+
+    def _degraded(self, ia_response): # {"degraded": True} when the local fallback answered instead of the AI
+        return {"degraded": True} if isinstance(ia_response, dict) and ia_response.get("degraded") else {}
+
+    def _submit_job(self, request, project_key, order_label, fresh): # 202 + the URL to poll for the result
+        job, created = jobs.submit(request.user, "jira_issues_ai", {
+            "project_key": project_key,
+            "order_label": order_label,
+            "fresh": fresh,
+        })
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+        }, status=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+class JiraProjectIssuesOrder(JiraProjectIssuesAI): # instant local ordering for ?order_by=, no AI call
+    @method_decorator(login_required)
+    def get(self, request, project_key):
+        jira_token, cloud_id, error = self._get_token_and_cloud_id(request.user)
+        if error:
+            return Response({"error": error}, status=404)
+
+        filtered_issues = self._get_filtered_issues(jira_token, cloud_id, project_key, self._wants_fresh(request))
+        order_label = self._get_order_label(request)
+        return Response({
+            "order_by": order_label,
+            "issues": [
+                {**issue, "score": round(score, 4)}
+                for issue, score in score_issues(filtered_issues, order_label)
+            ],
+            "dependencies": dependency_report(filtered_issues),
+        })
+
+
+class JiraProjectIssuesAIStream(JiraProjectIssuesAI): # same analysis as JiraProjectIssuesAI, streamed as Server-Sent Events
+    @method_decorator(login_required)
+    def get(self, request, project_key):
+        jira_token, cloud_id, error = self._get_token_and_cloud_id(request.user)
+        if error:
+            return Response({"error": error}, status=404)
+
+        filtered_issues = self._get_filtered_issues(jira_token, cloud_id, project_key, self._wants_fresh(request))
+        order_label = self._get_order_label(request)
+        return sse_response(self._events(filtered_issues, order_label))
+
+    def _events(self, filtered_issues, order_label):
+        for event, data in stream_issue_analysis(filtered_issues, order_label):
+            if event == "token":
+                yield "token", {"content": data}
+            else:
+                enriched_ia_summary, ordering_summary = self._process_ai_response(data, filtered_issues)
+                yield "done", {
+                    "ai_summary": enriched_ia_summary,
+                    "ordering_summary": ordering_summary,
+                    **self._degraded(data),
+                }
+
+
+
+class JiraProjectIssuesAIJob(JiraProjectIssuesAI): #     POST -> 202 + job id, the analysis runs in the AI worker
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['post', 'options'] # GET is served by /ai
+
+    def post(self, request, project_key):
+        return self._submit_job(request, project_key, self._get_order_label(request), self._wants_fresh(request))
+
+
+
+class JiraPortfolioIssues(APIView): #     GET /jira/issues?projects=KEY1,KEY2 (all projects when omitted)
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        jira_token, cloud_id, error = get_jira_token_and_cloud_id(request.user)
+        if error:
+            return Response({"error": error}, status=404)
+        project_keys = [key.strip() for key in request.GET.get("projects", "").split(",") if key.strip()]
+        fresh = request.GET.get("fresh", "").strip().lower() in ("1", "true", "yes")
+        portfolio, error = get_portfolio_issues(request.user, jira_token, cloud_id, project_keys, fresh=fresh)
+        if error:
+            return Response({"error": error}, status=404)
+        return Response(portfolio)
+
+
+
+# Async (ASGI) views: same payloads and authentication (see apps.core.async_auth) as JiraProjects /
+# JiraProjectIssues, upstream calls run on the event loop and issue pages are fetched concurrently.
+# Served by `uvicorn api.asgi:application`.
+
+class AsyncJiraProjects(View):
+
+    async def get(self, request):
+        user, error_response = await async_auth.authenticate(request)
+        if error_response:
+            return error_response
+        projects, error = await aget_user_jira_projects(user)
+        if error:
+            return JsonResponse({"error": error}, status=404)
+        for project in projects:
+            project_key = project.get("key")
+            if project_key:
+                project["issues_url"] = f"/jira/async/projects/{project_key}/issues/"
+                project["issues_ai_url"] = f"/jira/projects/{project_key}/issues/ai"
+        return JsonResponse(projects, safe=False)
+
+
+class AsyncJiraProjectIssues(View): # always live, the mirror is a sync (ORM heavy) path
+
+    async def get(self, request, project_key):
+        user, error_response = await async_auth.authenticate(request)
+        if error_response:
+            return error_response
+        jira_token, cloud_id, error = await aget_jira_token_and_cloud_id(user)
+        if error:
+            return JsonResponse({"error": error}, status=404)
+        filtered_issues = await aget_filtered_project_issues(jira_token, cloud_id, project_key)
+        return JsonResponse({"issues": filtered_issues})
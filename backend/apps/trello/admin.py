@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import TrelloBoardSnapshot, TrelloWebhook
 
 # Register your models here.
+
+
+@admin.register(TrelloBoardSnapshot)
+class TrelloBoardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('board_id', 'user', 'fetched_at', 'updated_at')
+
+
+@admin.register(TrelloWebhook)
+class TrelloWebhookAdmin(admin.ModelAdmin):
+    list_display = ('board_id', 'webhook_id', 'user', 'created_at')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TrelloConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.trello'
+
+    def ready(self):
+        from . import jobs  # noqa: F401 registers the AI job handlers
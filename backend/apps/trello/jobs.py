@@ -0,0 +1,13 @@
+from apps.core import jobs
+
+from .services import analyze_board
+
+
+@jobs.register("trello_board_ai")
+def run_trello_board_ai(job):
+    # the board is fetched when the job is submitted (Trello tokens only live in the user's session)
+    params = job.params
+    ia_response = analyze_board(params["trello_data"], params.get("order_label"), fallback=False) # retried later instead
+    if not isinstance(ia_response, (dict, list)):
+        raise RuntimeError(str(ia_response))
+    return {"ia_response": ia_response}
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.trello.snapshots import handle_webhook_payload
+
+
+class Command(BaseCommand):
+    help = "Replays recorded Trello webhook payloads (a JSON object, a JSON list or JSON lines) against the board snapshot cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="files with recorded webhook request bodies")
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            for payload in self._load(path):
+                result = handle_webhook_payload(payload)
+                self.stdout.write(json.dumps(result))
+
+    def _load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                content = f.read()
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return [json.loads(line) for line in content.splitlines() if line.strip()]
+        return data if isinstance(data, list) else [data]
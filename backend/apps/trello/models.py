@@ -0,0 +1,26 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+User = get_user_model()
+
+# Cached board snapshots (raw {name, lists, cards} as returned by services.fetch_board).
+# Boards with a registered webhook are patched/invalidated by the webhook receiver,
+# the others simply expire after TRELLO_SNAPSHOT_TTL.
+
+class TrelloBoardSnapshot(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    board_id = models.CharField(max_length=64, db_index=True)
+    board = models.JSONField()
+    fetched_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "board_id"], name="unique_trello_snapshot_per_user"),
+        ]
+
+
+class TrelloWebhook(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    board_id = models.CharField(max_length=64, db_index=True)
+    webhook_id = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
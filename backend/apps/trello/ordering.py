@@ -0,0 +1,59 @@
+import numpy as np
+
+from apps.core import scoring
+from apps.jira.ordering import STATUS_DONE, STATUS_IN_PROGRESS
+
+# Local ordering of the cards of a board (trello_data, grouped by list) for every order_by option, same engine
+# as apps.jira.ordering. Cards only carry name, description and their position, so the features are
+# the list stage (in progress / done, from the list name), the position inside the list and the description size.
+
+FEATURES = ["in_progress", "position", "description_length"]
+
+# order label (see services.get_order_label) -> feature weights, higher score comes first
+ORDER_WEIGHTS = {
+    None: {"in_progress": 0.5, "position": 0.4},
+    "urgencia da tarefa": {"in_progress": 0.6, "position": 0.5},
+    "impacto no negócio": {"description_length": 0.4, "position": 0.4, "in_progress": 0.2},
+    "facilidade de implementação": {"description_length": -0.8, "position": 0.2}, # easiest first
+    "complexidade técnica": {"description_length": 0.8, "position": 0.1},
+    "dependências técnicas": {"position": 0.6, "in_progress": 0.3},
+}
+
+
+def _list_stage(list_name):
+    name = (list_name or "").lower()
+    return (
+        any(word in name for word in STATUS_DONE),
+        any(word in name for word in ("doing", "fazendo", *STATUS_IN_PROGRESS)),
+    )
+
+
+def score_cards(trello_data, order_label=None):
+    # [(card, list_name, score)] from first to last across the whole board
+    cards, list_names, done, in_progress, positions = [], [], [], [], []
+    for lista in trello_data:
+        list_done, list_in_progress = _list_stage(lista.get("name"))
+        list_cards = lista.get("cards", [])
+        for position, card in enumerate(list_cards):
+            cards.append(card)
+            list_names.append(lista.get("name"))
+            done.append(list_done)
+            in_progress.append(list_in_progress)
+            positions.append(1 - position / len(list_cards)) # the team's own order inside the list
+    if not cards:
+        return []
+    matrix = np.empty((len(cards), len(FEATURES)), dtype=np.float64)
+    matrix[:, 0] = in_progress
+    matrix[:, 1] = positions
+    matrix[:, 2] = scoring.normalize(np.log1p([len(card.get("desc") or "") for card in cards]))
+    weights = scoring.weight_vector(FEATURES, ORDER_WEIGHTS.get(order_label, ORDER_WEIGHTS[None]))
+    order, scores = scoring.rank(matrix, weights, last=np.array(done, dtype=bool))
+    return [(cards[index], list_names[index], float(scores[index])) for index in order]
+
+
+def order_within_lists(trello_data, order_label=None):
+    # {list name: [cards]} keeping the lists, with the cards of each list in local score order
+    ordered = {lista["name"]: [] for lista in trello_data}
+    for card, list_name, _ in score_cards(trello_data, order_label):
+        ordered[list_name].append(card)
+    return ordered
@@ -0,0 +1,290 @@
+from urllib.parse import urlencode
+
+from apps.core import ai_cache, async_http_client, http_client, llm, llm_json, similarity
+from apps.core.prompts import AI_PROMPT_TOKEN_BUDGET, PromptBuilder, compact_text, log_report
+from apps.jira.services import call_ai, call_ai_stream, parse_ai_content
+from .ordering import order_within_lists
+
+FALLBACK_SUMMARY_CHARS = 140
+TRELLO_PROMPT_VERSION = 3 # bump whenever build_trello_prompt changes, it is part of the AI cache key
+# expected answer shape, see apps.core.llm_json.validate. Tasks without a name (the half task left by a
+# truncated answer) are dropped
+TRELLO_RESPONSE_SCHEMA = {
+    "type": dict,
+    "required": {"mensagem": {}, "tasks_por_lista": {"type": dict, "values": {"type": list, "items": {"type": dict, "required": {"nome": {}}}}}},
+}
+
+def group_cards_by_list(board_name, lists, cards): # [{id, name, cards: [...]}] in the board's list order
+    list_id_to_cards = {lst['id']: [] for lst in lists}
+    for card in cards:
+        list_id = card.get('idList')
+        if list_id in list_id_to_cards:
+            list_id_to_cards[list_id].append({
+                "name": card.get("name"),
+                "desc": card.get("desc"),
+                "board_name": board_name,
+            })
+    return [
+        {
+            "id": lst.get("id"),
+            "name": lst.get("name"),
+            "cards": list_id_to_cards[lst['id']]
+        }
+        for lst in lists
+    ]
+
+TRELLO_BOARD_URL = 'https://api.trello.com/1/boards/{board_id}'
+# one request for board + open lists + visible cards, with only the fields we actually use
+TRELLO_SNAPSHOT_PARAMS = {
+    "fields": "name",
+    "lists": "open",
+    "list_fields": "name",
+    "cards": "visible",
+    "card_fields": "name,desc,idList",
+}
+
+def _board_from_response(resp): # returns (board, (error_payload, status))
+    if resp.status_code != 200:
+        return None, ({"error": "Failed to fetch board info", "details": resp.text}, resp.status_code)
+    return resp.json(), None
+
+def board_to_trello_data(board):
+    return group_cards_by_list(board.get("name", ""), board.get("lists", []), board.get("cards", []))
+
+def fetch_board(auth, board_id): # raw {name, lists, cards} snapshot, auth is a requests_oauthlib.OAuth1
+    resp = http_client.get(TRELLO_BOARD_URL.format(board_id=board_id), params=TRELLO_SNAPSHOT_PARAMS, auth=auth)
+    return _board_from_response(resp)
+
+async def afetch_board(oauth_client, board_id): # oauth_client is an oauthlib.oauth1.Client
+    url = f"{TRELLO_BOARD_URL.format(board_id=board_id)}?{urlencode(TRELLO_SNAPSHOT_PARAMS)}"
+    signed_url, headers, _ = oauth_client.sign(url, http_method="GET")
+    resp = await async_http_client.get(signed_url, headers=headers, rate_key=oauth_client.resource_owner_key)
+    return _board_from_response(resp)
+
+def get_order_label(user_input):
+    valid_labels = {
+        "urgencia": "urgencia da tarefa",
+        "impacto": "impacto no negócio",
+        "facilidade": "facilidade de implementação",
+        "complexidade": "complexidade técnica",
+        "dependencias": "dependências técnicas",
+    }
+    return valid_labels.get(user_input.lower()) if user_input else None
+
+def trello_prompt_header(order_label):
+    # Monta o prompt para a IA
+    if order_label:
+        prompt = (
+        "Você é um assistente sênior de engenharia de software, com experiência prática em desenvolvimento frontend e backend, "
+        "além de domínio das melhores práticas de metodologias ágeis como o Scrum.\n\n"
+        f"Reorganize as tarefas abaixo de acordo com o critério: '{order_label}'.\n"
+        "Explique a lógica da priorização e siga as instruções abaixo:\n\n"
+        "1. Reorganize as tarefas dentro de suas respectivas listas (ex: Backlog, To Do, In Progress), considerando o critério acima e também:\n"
+        "- Valor de negócio\n"
+        "- Dependências entre tarefas\n"
+        "- Princípios do Scrum e melhores práticas ágeis\n\n"
+        "2. Sugerir movimentações de tarefas entre listas, quando apropriado, e sempre com uma justificativa clara. "
+        "Exemplo: mover do Backlog para To Do se a task já estiver madura e desbloqueada. Não crie novas listas.\n\n"
+        "3. Para tarefas técnicas, ofereça dicas práticas e contextuais com base no conteúdo da tarefa:\n"
+        "- Bibliotecas ou ferramentas úteis (ex: Django REST, Express, FastAPI, React, Vue, Axios)\n"
+        "- Linguagens e frameworks mais adequados (ex: Python, JavaScript, TypeScript, etc.)\n"
+        "- Boas práticas e sugestões de implementação rápidas (ex: como estruturar endpoints, validar formulários, usar hooks, aplicar SOLID)\n"
+        "- Use o conteúdo da descrição ou o nome da tarefa para inferir a stack envolvida. NÃO limite suas dicas a apenas uma tecnologia (como Django). "
+        "Adapte conforme o contexto técnico identificado.\n\n"
+        "4. Justifique suas decisões de reorganização com explicações objetivas. Use uma linguagem clara e direta para Product Owners e Scrum Masters, e técnica para desenvolvedores.\n\n"
+        "Formato de resposta:\n"
+        "{\n"
+        "  'mensagem': <resumo geral das decisões e lógica usada>,\n"
+        "  'tasks_por_lista': {\n"
+        "    'nome_da_lista': [\n"
+        "      {\n"
+        "        'nome': <título do card>,\n"
+        "        'resumo': <resumo curto da descrição>,\n"
+        "        'riscos': <possíveis riscos>,\n"
+        "        'estrategia': <como lidar com a tarefa>,\n"
+        "        'estimativa_horas': <tempo estimado>,\n"
+        "        'impacto': <valor estratégico ou técnico da tarefa>,\n"
+        "        'dicas_tecnicas': <orientações práticas, se aplicável>\n"
+        "      }\n"
+        "    ]\n"
+        "  }\n"
+        "}\n\n"
+        "Formate o JSON com indentação e quebras de linha para facilitar a leitura humana.\n"
+        "Não escreva nenhuma explicação fora do JSON. A resposta deve ser apenas o JSON formatado e indentado.\n\n"
+        "Agora, avalie e reorganize as seguintes tarefas:\n"
+        )
+    else:
+        prompt = (
+            "Você é um assistente sênior de engenharia de software, com experiência prática em desenvolvimento frontend e backend, "
+            "além de domínio das melhores práticas de metodologias ágeis como o Scrum.\n\n"
+            "Reorganize as tarefas abaixo de acordo com o que for mais estratégico para o time, usando sua experiência.\n"
+            "Explique a lógica da priorização e siga as instruções abaixo:\n\n"
+            "1. Reorganize as tarefas dentro de suas respectivas listas (ex: Backlog, To Do, In Progress), considerando:\n"
+            "- Urgência\n"
+            "- Valor de negócio\n"
+            "- Dependências entre tarefas\n"
+            "- Princípios do Scrum e melhores práticas ágeis\n\n"
+            "2. Sugerir movimentações de tarefas entre listas, quando apropriado, e sempre com uma justificativa clara. "
+            "Exemplo: mover do Backlog para To Do se a task já estiver madura e desbloqueada. Não crie novas listas.\n\n"
+            "3. Para tarefas técnicas, ofereça dicas práticas e contextuais com base no conteúdo da tarefa:\n"
+            "- Bibliotecas ou ferramentas úteis (ex: Django REST, Express, FastAPI, React, Vue, Axios)\n"
+            "- Linguagens e frameworks mais adequados (ex: Python, JavaScript, TypeScript, etc.)\n"
+            "- Boas práticas e sugestões de implementação rápidas (ex: como estruturar endpoints, validar formulários, usar hooks, aplicar SOLID)\n"
+            "- Use o conteúdo da descrição ou o nome da tarefa para inferir a stack envolvida. NÃO limite suas dicas a apenas uma tecnologia (como Django). "
+            "Adapte conforme o contexto técnico identificado.\n\n"
+            "4. Justifique suas decisões de reorganização com explicações objetivas. Use uma linguagem clara e direta para Product Owners e Scrum Masters, e técnica para desenvolvedores.\n\n"
+            "Formato de resposta:\n"
+            "{\n"
+            "  'mensagem': <resumo geral das decisões e lógica usada>,\n"
+            "  'tasks_por_lista': {\n"
+            "    'nome_da_lista': [\n"
+            "      {\n"
+            "        'nome': <título do card>,\n"
+            "        'resumo': <resumo curto da descrição>,\n"
+            "        'riscos': <possíveis riscos>,\n"
+            "        'estrategia': <como lidar com a tarefa>,\n"
+            "        'estimativa_horas': <tempo estimado>,\n"
+            "        'impacto': <valor estratégico ou técnico da tarefa>,\n"
+            "        'dicas_tecnicas': <orientações práticas, se aplicável>\n"
+            "      }\n"
+            "    ]\n"
+            "  }\n"
+            "}\n\n"
+            "Formate o JSON com indentação e quebras de linha para facilitar a leitura humana.\n"
+            "Não escreva nenhuma explicação fora do JSON. A resposta deve ser apenas o JSON formatado e indentado.\n\n"
+            "Agora, avalie e reorganize as seguintes tarefas:\n"
+            )
+
+    return prompt
+
+def build_trello_prompt(trello_data, order_label, token_budget=AI_PROMPT_TOKEN_BUDGET):
+    # returns (prompt, report); the board name is written once instead of on every card
+    header = trello_prompt_header(order_label)
+    board_name = next((card.get('board_name') for lista in trello_data for card in lista.get("cards", [])), None)
+    if board_name:
+        header += f"Quadro: {board_name}\n\n"
+    builder = PromptBuilder(header, token_budget=token_budget, description_field="Descrição")
+    for lista in trello_data:
+        for card in lista.get("cards", []):
+            builder.add_item([
+                ("- Nome", card['name']),
+                ("Descrição", card['desc']),
+                ("Lista", lista['name']),
+                ("Cards quase idênticos", ", ".join(card.get('duplicates') or ())), # see dedupe_board
+            ])
+    return builder.build()
+
+def trello_ai_prompt(trello_data, order_label): # the prompt sent to the LLM, its budget report goes to the log
+    prompt, report = build_trello_prompt(trello_data, order_label)
+    log_report("trello", report)
+    return prompt
+
+def dedupe_board(trello_data):
+    # (trello_data with one card per cluster of near-duplicate cards of the same list, {(list name, representative
+    # name): [other cards]}); the representative lists the other names in "duplicates"
+    cards = [(list_index, card) for list_index, lista in enumerate(trello_data) for card in lista.get("cards", [])]
+    labels = similarity.near_duplicate_labels(
+        [f"{card.get('name') or ''}\n{card.get('desc') or ''}" for _, card in cards],
+        groups=[list_index for list_index, _ in cards],
+    )
+    members = similarity.clusters(labels)
+    if not members:
+        return trello_data, {}
+    deduped = [{**lista, "cards": []} for lista in trello_data]
+    duplicates = {}
+    for index, (list_index, card) in enumerate(cards):
+        if labels[index] != index:
+            continue
+        if index in members:
+            card = {**card, "duplicates": [cards[member][1]["name"] for member in members[index]]}
+            duplicates.setdefault((trello_data[list_index]["name"], card["name"]), []).extend(cards[member][1] for member in members[index])
+        deduped[list_index]["cards"].append(card)
+    return deduped, duplicates
+
+def expand_duplicates(ia_response, duplicates):
+    # every duplicate card gets a copy of its representative's task, right after it in the same list. Clusters are
+    # per list, so a task only expands the cluster of its own list, even when another list has a card of that name
+    if not duplicates or not isinstance(ia_response, dict) or not isinstance(ia_response.get("tasks_por_lista"), dict):
+        return ia_response
+    tasks_por_lista, remaining = {}, dict(duplicates)
+    for list_name, tasks in ia_response["tasks_por_lista"].items():
+        if not isinstance(tasks, list):
+            tasks_por_lista[list_name] = tasks
+            continue
+        tasks_por_lista[list_name] = []
+        for task in tasks:
+            tasks_por_lista[list_name].append(task)
+            if isinstance(task, dict):
+                for card in remaining.pop((list_name, task.get("nome")), ()):
+                    tasks_por_lista[list_name].append({**task, "nome": card["name"], "duplicata_de": task.get("nome")})
+    return {**ia_response, "tasks_por_lista": tasks_por_lista}
+
+def analyze_board_deduped(trello_data, order_label):
+    # near-duplicate cards are sent once, the answer is expanded back to all of them
+    deduped, duplicates = dedupe_board(trello_data)
+    return expand_duplicates(call_ai(trello_ai_prompt(deduped, order_label), TRELLO_RESPONSE_SCHEMA), duplicates)
+
+def _board_cache_key(trello_data, order_label):
+    return ai_cache.make_key("trello", trello_data, order_label, llm.model_label(), TRELLO_PROMPT_VERSION)
+
+FALLBACK_MESSAGE = (
+    "A análise por IA está temporariamente indisponível. As tarefas de cada lista foram ordenadas localmente "
+    "({criterion}) a partir da posição no quadro, do estágio da lista e do tamanho da descrição, sem movimentações sugeridas."
+)
+
+def fallback_board_analysis(trello_data, order_label=None):
+    # local answer with the AI response shape, used while the LLM circuit breaker is open
+    return {
+        "mensagem": FALLBACK_MESSAGE.format(criterion=order_label or "critério padrão"),
+        "tasks_por_lista": {
+            list_name: [
+                {"nome": card["name"], "resumo": compact_text(card.get("desc"), FALLBACK_SUMMARY_CHARS)}
+                for card in cards
+            ]
+            for list_name, cards in order_within_lists(trello_data, order_label).items()
+        },
+        "degraded": True,
+    }
+
+def cached_board_analysis(trello_data, order_label): # same as apps.jira.services.cached_analysis
+    cached = ai_cache.get(_board_cache_key(trello_data, order_label))
+    if cached is not None:
+        return cached
+    return fallback_board_analysis(trello_data, order_label) if not llm.available() else None
+
+def analyze_board(trello_data, order_label, fallback=True): # cached prompt + LLM call for a board grouped by list
+    cache_key = _board_cache_key(trello_data, order_label)
+    if fallback and not llm.available():
+        cached = ai_cache.get(cache_key)
+        return cached if cached is not None else fallback_board_analysis(trello_data, order_label)
+    ia_response = ai_cache.get_or_compute(
+        cache_key,
+        lambda: analyze_board_deduped(trello_data, order_label),
+        kind="trello",
+    )
+    if fallback and not isinstance(ia_response, (dict, list)) and not llm.available():
+        return fallback_board_analysis(trello_data, order_label)
+    return ia_response
+
+def stream_board_analysis(trello_data, order_label): # same events as apps.jira.services.stream_issue_analysis
+    cache_key = _board_cache_key(trello_data, order_label)
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        yield "done", cached
+        return
+    if not llm.available():
+        yield "done", fallback_board_analysis(trello_data, order_label)
+        return
+    deduped, duplicates = dedupe_board(trello_data)
+    chunks = []
+    parser = llm_json.TolerantJSONParser()
+    for content in call_ai_stream(trello_ai_prompt(deduped, order_label)):
+        chunks.append(content)
+        parser.feed(content)
+        yield "token", content
+    ia_response = expand_duplicates(parse_ai_content("".join(chunks), TRELLO_RESPONSE_SCHEMA, parser), duplicates)
+    if ai_cache.cacheable(ia_response):
+        ai_cache.store(cache_key, ia_response, kind="trello")
+    elif not llm.available():
+        ia_response = fallback_board_analysis(trello_data, order_label)
+    yield "done", ia_response
@@ -0,0 +1,157 @@
+import base64
+import copy
+import hashlib
+import hmac
+import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core import http_client
+from .models import TrelloBoardSnapshot, TrelloWebhook
+from .services import afetch_board, board_to_trello_data, fetch_board
+
+TRELLO_SNAPSHOT_TTL = int(os.getenv("TRELLO_SNAPSHOT_TTL", 60)) # seconds, boards without a webhook
+TRELLO_SNAPSHOT_WEBHOOK_MAX_AGE = int(os.getenv("TRELLO_SNAPSHOT_WEBHOOK_MAX_AGE", 86400)) # safety net for missed callbacks
+TRELLO_WEBHOOK_CALLBACK_URL = os.getenv("TRELLO_WEBHOOK_CALLBACK_URL", "http://127.0.0.1:8000/trello/webhook/")
+TRELLO_WEBHOOKS_URL = "https://api.trello.com/1/webhooks"
+
+
+def _is_fresh(snapshot, has_webhook):
+    max_age = TRELLO_SNAPSHOT_WEBHOOK_MAX_AGE if has_webhook else TRELLO_SNAPSHOT_TTL
+    return timezone.now() - snapshot.fetched_at < timedelta(seconds=max_age)
+
+
+def _save_snapshot(user, board_id, board):
+    TrelloBoardSnapshot.objects.update_or_create(
+        user=user, board_id=board_id, defaults={"board": board, "fetched_at": timezone.now()},
+    )
+
+
+def get_board_snapshot(user, auth, board_id, force=False): # returns (trello_data, (error_payload, status))
+    if not force:
+        snapshot = TrelloBoardSnapshot.objects.filter(user=user, board_id=board_id).first()
+        if snapshot and _is_fresh(snapshot, TrelloWebhook.objects.filter(board_id=board_id).exists()):
+            return board_to_trello_data(snapshot.board), None
+    board, error = fetch_board(auth, board_id)
+    if error:
+        return None, error
+    _save_snapshot(user, board_id, board)
+    return board_to_trello_data(board), None
+
+
+async def aget_board_snapshot(user, oauth_client, board_id, force=False):
+    if not force:
+        snapshot = await TrelloBoardSnapshot.objects.filter(user=user, board_id=board_id).afirst()
+        if snapshot and _is_fresh(snapshot, await TrelloWebhook.objects.filter(board_id=board_id).aexists()):
+            return board_to_trello_data(snapshot.board), None
+    board, error = await afetch_board(oauth_client, board_id)
+    if error:
+        return None, error
+    await TrelloBoardSnapshot.objects.aupdate_or_create(
+        user=user, board_id=board_id, defaults={"board": board, "fetched_at": timezone.now()},
+    )
+    return board_to_trello_data(board), None
+
+
+def register_board_webhook(user, auth, board_id): # returns (webhook, (error_payload, status))
+    resp = http_client.post(TRELLO_WEBHOOKS_URL, auth=auth, params={
+        "callbackURL": TRELLO_WEBHOOK_CALLBACK_URL,
+        "idModel": board_id,
+        "description": f"CodePlan snapshot cache for board {board_id}",
+    })
+    if resp.status_code != 200:
+        return None, ({"error": "Failed to register webhook", "details": resp.text}, resp.status_code)
+    webhook, _ = TrelloWebhook.objects.update_or_create(
+        webhook_id=resp.json()["id"], defaults={"user": user, "board_id": board_id},
+    )
+    return webhook, None
+
+
+def verify_webhook_signature(body, signature, secret, callback_url=TRELLO_WEBHOOK_CALLBACK_URL):
+    # Trello signs base64(HMAC-SHA1(app secret, raw body + callback URL))
+    if not (signature and secret):
+        return False
+    digest = hmac.new(secret.encode("utf-8"), body + callback_url.encode("utf-8"), hashlib.sha1).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode("ascii"), signature)
+
+
+def _find(items, item_id):
+    return next((item for item in items if item.get("id") == item_id), None)
+
+
+def apply_webhook_action(board, action):
+    # patches a raw board snapshot in place from one Trello action.
+    # returns False when the action can't be applied locally and the snapshot must be dropped
+    action_type = action.get("type")
+    data = action.get("data", {})
+    card_data = data.get("card") or {}
+    list_data = data.get("list") or {}
+    cards = board.setdefault("cards", [])
+    lists = board.setdefault("lists", [])
+
+    if action_type == "createCard":
+        if _find(lists, list_data.get("id")) is None:
+            return False # e.g. a list created while a callback got lost
+        if _find(cards, card_data.get("id")) is None:
+            cards.append({"id": card_data["id"], "name": card_data.get("name"), "desc": card_data.get("desc", ""), "idList": list_data["id"]})
+        return True
+    if action_type == "deleteCard":
+        board["cards"] = [card for card in cards if card.get("id") != card_data.get("id")]
+        return True
+    if action_type == "updateCard":
+        card = _find(cards, card_data.get("id"))
+        if card_data.get("closed"): # archived cards are not "visible"
+            board["cards"] = [c for c in cards if c.get("id") != card_data.get("id")]
+            return True
+        if card is None:
+            return False # e.g. a card restored from the archive, we don't have its fields
+        for field in ("name", "desc", "idList"):
+            if field in card_data:
+                card[field] = card_data[field]
+        if data.get("listAfter"):
+            card["idList"] = data["listAfter"]["id"]
+        return True
+    if action_type == "createList":
+        if _find(lists, list_data.get("id")) is None:
+            lists.append({"id": list_data["id"], "name": list_data.get("name")})
+        return True
+    if action_type == "updateList":
+        lst = _find(lists, list_data.get("id"))
+        if list_data.get("closed"):
+            board["lists"] = [l for l in lists if l.get("id") != list_data.get("id")]
+            return True
+        if lst is None:
+            return False # reopened list, its cards are not in the snapshot
+        if "name" in list_data:
+            lst["name"] = list_data["name"]
+        return True
+    if action_type == "updateBoard":
+        if "name" in (data.get("board") or {}):
+            board["name"] = data["board"]["name"]
+        return True
+    if action_type in ("commentCard", "addMemberToCard", "removeMemberFromCard", "addLabelToCard", "removeLabelFromCard"):
+        return True # fields we don't keep
+    return False
+
+
+def handle_webhook_payload(payload):
+    # entry point for the receiver view and the replay command, returns what happened to the snapshots
+    board_id = (payload.get("model") or {}).get("id")
+    action = payload.get("action") or {}
+    if not board_id:
+        return {"board_id": None, "result": "ignored"}
+    with transaction.atomic():
+        snapshots = list(TrelloBoardSnapshot.objects.select_for_update().filter(board_id=board_id))
+        patched, invalidated = 0, 0
+        for snapshot in snapshots:
+            board = copy.deepcopy(snapshot.board)
+            if apply_webhook_action(board, action):
+                snapshot.board = board
+                snapshot.save(update_fields=["board", "updated_at"])
+                patched += 1
+            else:
+                snapshot.delete()
+                invalidated += 1
+    return {"board_id": board_id, "action": action.get("type"), "patched": patched, "invalidated": invalidated}
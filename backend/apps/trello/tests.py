@@ -0,0 +1,103 @@
+import base64
+import copy
+import hashlib
+import hmac
+import json
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import services, snapshots
+from .models import TrelloBoardSnapshot
+from .services import board_to_trello_data
+
+# webhook request bodies as Trello sends them, in the order they were received for one board
+WEBHOOK_PAYLOADS = Path(__file__).parent / "testdata" / "webhook_payloads.json"
+BOARD_ID = "65f1c2a9e4b0a1d2c3f4e5a6"
+BOARD = { # the snapshot before the recorded actions, as services.fetch_board returns it
+    "id": BOARD_ID,
+    "name": "Sprint board",
+    "lists": [
+        {"id": "65f1c2aae4b0a1d2c3f4e5b1", "name": "To Do"},
+        {"id": "65f1c2aae4b0a1d2c3f4e5b2", "name": "Doing"},
+        {"id": "65f1c2aae4b0a1d2c3f4e5b3", "name": "Done"},
+    ],
+    "cards": [
+        {"id": "65f1c2abe4b0a1d2c3f4e7a1", "name": "Login returns 500 on special characters", "desc": "", "idList": "65f1c2aae4b0a1d2c3f4e5b1"},
+        {"id": "65f1c2abe4b0a1d2c3f4e7a2", "name": "Export invoices as CSV", "desc": "", "idList": "65f1c2aae4b0a1d2c3f4e5b2"},
+        {"id": "65f1c2abe4b0a1d2c3f4e7a3", "name": "Rate-limit webhook retries", "desc": "", "idList": "65f1c2aae4b0a1d2c3f4e5b2"},
+    ],
+}
+
+
+def recorded_payloads():
+    return json.loads(WEBHOOK_PAYLOADS.read_text(encoding="utf-8"))
+
+
+def signature(body, secret):
+    digest = hmac.new(secret.encode("utf-8"), body + snapshots.TRELLO_WEBHOOK_CALLBACK_URL.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+class DedupedBoardTests(SimpleTestCase):
+    login_bug = ("Login page returns a 500 error when the password contains special characters. Steps: open the login "
+                 "page, type a password with an ampersand, submit the form. Expected: the user is logged in.")
+
+    def test_clusters_of_two_lists_with_the_same_name_stay_in_their_list(self):
+        card = lambda name, desc: {"name": name, "desc": desc, "board_name": "Sprint board"}
+        trello_data = [
+            {"id": "1", "name": "To Do", "cards": [card("Fix login", self.login_bug), card("Fix login (copy)", self.login_bug + " Again.")]},
+            {"id": "2", "name": "Doing", "cards": [card("Fix login", self.login_bug), card("Fix login on mobile", self.login_bug + " Mobile.")]},
+        ]
+        deduped, duplicates = services.dedupe_board(trello_data)
+        self.assertEqual([[card["name"] for card in lista["cards"]] for lista in deduped], [["Fix login"], ["Fix login"]])
+        answer = {"mensagem": "ok", "tasks_por_lista": {"To Do": [{"nome": "Fix login"}], "Doing": [{"nome": "Fix login"}]}}
+        expanded = services.expand_duplicates(answer, duplicates)
+        self.assertEqual(
+            {list_name: [task["nome"] for task in tasks] for list_name, tasks in expanded["tasks_por_lista"].items()},
+            {"To Do": ["Fix login", "Fix login (copy)"], "Doing": ["Fix login", "Fix login on mobile"]},
+        )
+
+
+class WebhookReplayTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("manager")
+        TrelloBoardSnapshot.objects.create(user=self.user, board_id=BOARD_ID, board=copy.deepcopy(BOARD), fetched_at=timezone.now())
+
+    def board(self):
+        return board_to_trello_data(TrelloBoardSnapshot.objects.get(user=self.user, board_id=BOARD_ID).board)
+
+    def test_recorded_payloads_patch_the_snapshot(self):
+        out = StringIO()
+        call_command("replay_trello_webhooks", str(WEBHOOK_PAYLOADS), stdout=out)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([result["action"] for result in results], ["createCard", "updateCard", "updateCard", "updateList", "deleteCard"])
+        self.assertTrue(all(result["patched"] == 1 and result["invalidated"] == 0 for result in results))
+        # new card in To Do, the login bug moved to Doing, the export archived, Done renamed, the last card deleted
+        self.assertEqual(
+            [(lst["name"], [card["name"] for card in lst["cards"]]) for lst in self.board()],
+            [("To Do", ["Add dark mode"]), ("Doing", ["Login returns 500 on special characters"]), ("Shipped", [])],
+        )
+
+    def test_card_created_in_an_unknown_list_drops_the_snapshot(self):
+        payload = recorded_payloads()[0]
+        payload["action"]["data"]["list"] = {"id": "65f1c2aae4b0a1d2c3f4e5b9", "name": "Blocked"}
+        result = snapshots.handle_webhook_payload(payload)
+        self.assertEqual((result["patched"], result["invalidated"]), (0, 1))
+        self.assertFalse(TrelloBoardSnapshot.objects.exists())
+
+    def test_receiver_checks_the_signature(self):
+        body = json.dumps(recorded_payloads()[0]).encode("utf-8")
+        with mock.patch("apps.trello.views.API_SECRET", "app-secret"):
+            resp = self.client.post("/trello/webhook/", body, content_type="application/json", HTTP_X_TRELLO_WEBHOOK=signature(body, "another-secret"))
+            self.assertEqual(resp.status_code, 401)
+            self.assertEqual([card["name"] for card in self.board()[0]["cards"]], ["Login returns 500 on special characters"])
+            resp = self.client.post("/trello/webhook/", body, content_type="application/json", HTTP_X_TRELLO_WEBHOOK=signature(body, "app-secret"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"board_id": BOARD_ID, "action": "createCard", "patched": 1, "invalidated": 0})
+        self.assertEqual([card["name"] for card in self.board()[0]["cards"]], ["Login returns 500 on special characters", "Add dark mode"])
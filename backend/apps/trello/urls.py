@@ -1,10 +1,16 @@
 from django.urls import path
-from .views import TrelloCallbackView, trello_login, TrelloAllBoardsView, TrelloBoardDetailsView, TrelloBoardAIAssistantView
+from .views import AsyncTrelloBoardDetailsView, TrelloCallbackView, trello_login, TrelloAllBoardsView, TrelloBoardDetailsView, TrelloBoardAIAssistantView, TrelloBoardAIStreamView, TrelloBoardAIJobView, TrelloBoardOrderView, TrelloBoardWebhookView, TrelloWebhookReceiverView
 
 urlpatterns = [
     path('login/', trello_login, name='trello_login'),
     path('callback/', TrelloCallbackView.as_view(), name='trello_callback'),
     path('board/', TrelloAllBoardsView.as_view(), name='trello_all_boards'),
     path('board/<str:board_id>/details', TrelloBoardDetailsView.as_view(), name='trello_board_details'),
-    path('board/<str:board_id>/ai', TrelloBoardAIAssistantView.as_view(), name='trello_board_ai_response'),
+    path('async/board/<str:board_id>/details', AsyncTrelloBoardDetailsView.as_view(), name='trello_board_details_async'), # async (ASGI) version of board details
+    path('board/<str:board_id>/order', TrelloBoardOrderView.as_view(), name='trello_board_order'), # local ordering for ?order_by=, computed without the AI
+    path('board/<str:board_id>/ai', TrelloBoardAIAssistantView.as_view(), name='trello_board_ai_response'), # cached analysis, or 202 + a queued job to poll
+    path('board/<str:board_id>/ai/jobs', TrelloBoardAIJobView.as_view(), name='trello_board_ai_job'), # queues the AI analysis, poll /jobs/<id> for the result
+    path('board/<str:board_id>/ai/stream', TrelloBoardAIStreamView.as_view(), name='trello_board_ai_stream'), # same as /ai, streamed as Server-Sent Events
+    path('board/<str:board_id>/webhook', TrelloBoardWebhookView.as_view(), name='trello_board_webhook'), # registers a webhook that keeps the board snapshot cache in sync
+    path('webhook/', TrelloWebhookReceiverView.as_view(), name='trello_webhook'), # Trello model-change callbacks
 ]
\ No newline at end of file
@@ -1,12 +1,21 @@
 import os
+import json
 
-from apps.jira.services import call_ai
+from apps.core import async_auth, http_client
+from apps.core import jobs
+from apps.core.sse import sse_response
+from .ordering import score_cards
+from .services import cached_board_analysis, get_order_label, stream_board_analysis
+from .snapshots import aget_board_snapshot, get_board_snapshot, handle_webhook_payload, register_board_webhook, verify_webhook_signature
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 
+from django.http import JsonResponse
 from django.shortcuts import redirect
-from requests_oauthlib import OAuth1Session
+from django.views import View
+from oauthlib.oauth1 import Client as OAuth1Client
+from requests_oauthlib import OAuth1, OAuth1Session
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -18,6 +27,9 @@ AUTHORIZE_URL = 'https://trello.com/1/OAuthAuthorizeToken'
 ACCESS_TOKEN_URL = 'https://trello.com/1/OAuthGetAccessToken'
 CALLBACK_URI = 'http://127.0.0.1:8000/trello/callback'
 
+def wants_fresh(request): # ?fresh=1 skips the cached board snapshot
+    return request.GET.get("fresh", "").strip().lower() in ("1", "true", "yes")
+
 def trello_login(request):
     oauth = OAuth1Session(
         API_KEY,
@@ -64,13 +76,13 @@ class TrelloAllBoardsView(APIView):
         access_token_secret = request.session.get('access_token_secret')
         if not (access_token and access_token_secret):
             return Response({"error": "tokens not found, try again"}, status=401)
-        authed = OAuth1Session(
+        auth = OAuth1(
             API_KEY,
             client_secret=API_SECRET,
             resource_owner_key=access_token,
             resource_owner_secret=access_token_secret,
         )
-        boards_response = authed.get('https://api.trello.com/1/members/me/boards')
+        boards_response = http_client.get('https://api.trello.com/1/members/me/boards', params={"fields": "name,url"}, auth=auth)
         boards = boards_response.json()
         result = [
             {
@@ -93,196 +105,162 @@ class TrelloBoardDetailsView(APIView):
         access_token_secret = request.session.get('access_token_secret')
         if not (access_token and access_token_secret):
             return Response({"error": "tokens not found, try again"}, status=401)
-        authed = OAuth1Session(
+        auth = OAuth1(
             API_KEY,
             client_secret=API_SECRET,
             resource_owner_key=access_token,
             resource_owner_secret=access_token_secret,
         )
-        board_response = authed.get(f'https://api.trello.com/1/boards/{board_id}')
-        if board_response.status_code != 200:
-            return Response({"error": "Failed to fetch board info", "details": board_response.text}, status=board_response.status_code)
-        board_data = board_response.json()
-        board_name = board_data.get("name", "")
-        # Get lists
-        lists_response = authed.get(f'https://api.trello.com/1/boards/{board_id}/lists')
-        if lists_response.status_code != 200:
-            return Response({"error": "Failed to fetch lists", "details": lists_response.text}, status=lists_response.status_code)
-        lists = lists_response.json()
-        # Get cards
-        cards_response = authed.get(f'https://api.trello.com/1/boards/{board_id}/cards')
-        if cards_response.status_code != 200:
-            return Response({"error": "Failed to fetch cards", "details": cards_response.text}, status=cards_response.status_code)
-        cards = cards_response.json()
-        # Organize cards by list
-        list_id_to_cards = {lst['id']: [] for lst in lists}
-        for card in cards:
-            list_id = card.get('idList')
-            if list_id in list_id_to_cards:
-                list_id_to_cards[list_id].append({
-                    "name": card.get("name"),
-                    "desc": card.get("desc"),
-                    "board_name": board_name,
-                })
-        result = []
-        for lst in lists:
-            result.append({
-                "id": lst.get("id"),
-                "name": lst.get("name"),
-                "cards": list_id_to_cards[lst['id']]
-            })
-        return Response(result)
+        trello_data, error = get_board_snapshot(request.user, auth, board_id, force=wants_fresh(request))
+        if error:
+            return Response(error[0], status=error[1])
+        return Response(trello_data)
     
 class TrelloBoardAIAssistantView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, board_id):
+        trello_data, error_response = self._get_trello_data(request, board_id)
+        if error_response:
+            return error_response
+        order_label = get_order_label(request.GET.get("order_by", ""))
+        ia_response = cached_board_analysis(trello_data, order_label)
+        if ia_response is None: # the LLM call runs in the AI worker, never in a web worker
+            return self._submit_job(request, board_id, trello_data, order_label)
+        return Response({"ia_response":ia_response})
+
+    def _get_trello_data(self, request, board_id): # returns (trello_data, error_response)
         access_token = request.session.get('access_token')
         access_token_secret = request.session.get('access_token_secret')
         if not (access_token and access_token_secret):
-            return Response({"error": "tokens not found"}, status=401)
-        authed = OAuth1Session(
+            return None, Response({"error": "tokens not found"}, status=401)
+        auth = OAuth1(
             API_KEY,
             client_secret=API_SECRET,
             resource_owner_key=access_token,
             resource_owner_secret=access_token_secret,
         )
 
-        board_response = authed.get(f'https://api.trello.com/1/boards/{board_id}')
-        if board_response.status_code != 200:
-            return Response({"error": "Failed to fetch board info", "details": board_response.text}, status=board_response.status_code)
-        board_data = board_response.json()
-        board_name = board_data.get("name", "")
-        lists_response = authed.get(f'https://api.trello.com/1/boards/{board_id}/lists')
-        if lists_response.status_code != 200:
-            return Response({"error": "Failed to fetch lists", "details": lists_response.text}, status=lists_response.status_code)
-        lists = lists_response.json()
-        cards_response = authed.get(f'https://api.trello.com/1/boards/{board_id}/cards')
-        if cards_response.status_code != 200:
-            return Response({"error": "Failed to fetch cards", "details": cards_response.text}, status=cards_response.status_code)
-        cards = cards_response.json()
-        # Organiza cards por lista
-        list_id_to_cards = {lst['id']: [] for lst in lists}
-        for card in cards:
-            list_id = card.get('idList')
-            if list_id in list_id_to_cards:
-                list_id_to_cards[list_id].append({
-                    "name": card.get("name"),
-                    "desc": card.get("desc"),
-                    "board_name": board_name,
-                })
-        trello_data = []
-        for lst in lists:
-            trello_data.append({
-                "id": lst.get("id"),
-                "name": lst.get("name"),
-                "cards": list_id_to_cards[lst['id']]
-            })
-
-        def get_order_label(user_input):
-            valid_labels = {
-                "urgencia": "urgencia da tarefa",
-                "impacto": "impacto no negócio",
-                "facilidade": "facilidade de implementação",
-                "complexidade": "complexidade técnica",
-                "dependencias": "dependências técnicas",
-            }
-            return valid_labels.get(user_input.lower()) if user_input else None
-        
-        order_by = request.GET.get("order_by", "")
-        order_label = get_order_label(order_by)
-        
-        # Monta o prompt para a 
-        if order_label:
-            prompt = (
-            "Você é um assistente sênior de engenharia de software, com experiência prática em desenvolvimento frontend e backend, "
-            "além de domínio das melhores práticas de metodologias ágeis como o Scrum.\n\n"
-            f"Reorganize as tarefas abaixo de acordo com o critério: '{order_label}'.\n"
-            "Explique a lógica da priorização e siga as instruções abaixo:\n\n"
-            "1. Reorganize as tarefas dentro de suas respectivas listas (ex: Backlog, To Do, In Progress), considerando o critério acima e também:\n"
-            "- Valor de negócio\n"
-            "- Dependências entre tarefas\n"
-            "- Princípios do Scrum e melhores práticas ágeis\n\n"
-            "2. Sugerir movimentações de tarefas entre listas, quando apropriado, e sempre com uma justificativa clara. "
-            "Exemplo: mover do Backlog para To Do se a task já estiver madura e desbloqueada. Não crie novas listas.\n\n"
-            "3. Para tarefas técnicas, ofereça dicas práticas e contextuais com base no conteúdo da tarefa:\n"
-            "- Bibliotecas ou ferramentas úteis (ex: Django REST, Express, FastAPI, React, Vue, Axios)\n"
-            "- Linguagens e frameworks mais adequados (ex: Python, JavaScript, TypeScript, etc.)\n"
-            "- Boas práticas e sugestões de implementação rápidas (ex: como estruturar endpoints, validar formulários, usar hooks, aplicar SOLID)\n"
-            "- Use o conteúdo da descrição ou o nome da tarefa para inferir a stack envolvida. NÃO limite suas dicas a apenas uma tecnologia (como Django). "
-            "Adapte conforme o contexto técnico identificado.\n\n"
-            "4. Justifique suas decisões de reorganização com explicações objetivas. Use uma linguagem clara e direta para Product Owners e Scrum Masters, e técnica para desenvolvedores.\n\n"
-            "Formato de resposta:\n"
-            "{\n"
-            "  'mensagem': <resumo geral das decisões e lógica usada>,\n"
-            "  'tasks_por_lista': {\n"
-            "    'nome_da_lista': [\n"
-            "      {\n"
-            "        'nome': <título do card>,\n"
-            "        'resumo': <resumo curto da descrição>,\n"
-            "        'riscos': <possíveis riscos>,\n"
-            "        'estrategia': <como lidar com a tarefa>,\n"
-            "        'estimativa_horas': <tempo estimado>,\n"
-            "        'impacto': <valor estratégico ou técnico da tarefa>,\n"
-            "        'dicas_tecnicas': <orientações práticas, se aplicável>\n"
-            "      }\n"
-            "    ]\n"
-            "  }\n"
-            "}\n\n"
-            "Formate o JSON com indentação e quebras de linha para facilitar a leitura humana.\n"
-            "Não escreva nenhuma explicação fora do JSON. A resposta deve ser apenas o JSON formatado e indentado.\n\n"
-            "Agora, avalie e reorganize as seguintes tarefas:\n"
-            )
-        else:
-            prompt = (
-                "Você é um assistente sênior de engenharia de software, com experiência prática em desenvolvimento frontend e backend, "
-                "além de domínio das melhores práticas de metodologias ágeis como o Scrum.\n\n"
-                "Reorganize as tarefas abaixo de acordo com o que for mais estratégico para o time, usando sua experiência.\n"
-                "Explique a lógica da priorização e siga as instruções abaixo:\n\n"
-                "1. Reorganize as tarefas dentro de suas respectivas listas (ex: Backlog, To Do, In Progress), considerando:\n"
-                "- Urgência\n"
-                "- Valor de negócio\n"
-                "- Dependências entre tarefas\n"
-                "- Princípios do Scrum e melhores práticas ágeis\n\n"
-                "2. Sugerir movimentações de tarefas entre listas, quando apropriado, e sempre com uma justificativa clara. "
-                "Exemplo: mover do Backlog para To Do se a task já estiver madura e desbloqueada. Não crie novas listas.\n\n"
-                "3. Para tarefas técnicas, ofereça dicas práticas e contextuais com base no conteúdo da tarefa:\n"
-                "- Bibliotecas ou ferramentas úteis (ex: Django REST, Express, FastAPI, React, Vue, Axios)\n"
-                "- Linguagens e frameworks mais adequados (ex: Python, JavaScript, TypeScript, etc.)\n"
-                "- Boas práticas e sugestões de implementação rápidas (ex: como estruturar endpoints, validar formulários, usar hooks, aplicar SOLID)\n"
-                "- Use o conteúdo da descrição ou o nome da tarefa para inferir a stack envolvida. NÃO limite suas dicas a apenas uma tecnologia (como Django). "
-                "Adapte conforme o contexto técnico identificado.\n\n"
-                "4. Justifique suas decisões de reorganização com explicações objetivas. Use uma linguagem clara e direta para Product Owners e Scrum Masters, e técnica para desenvolvedores.\n\n"
-                "Formato de resposta:\n"
-                "{\n"
-                "  'mensagem': <resumo geral das decisões e lógica usada>,\n"
-                "  'tasks_por_lista': {\n"
-                "    'nome_da_lista': [\n"
-                "      {\n"
-                "        'nome': <título do card>,\n"
-                "        'resumo': <resumo curto da descrição>,\n"
-                "        'riscos': <possíveis riscos>,\n"
-                "        'estrategia': <como lidar com a tarefa>,\n"
-                "        'estimativa_horas': <tempo estimado>,\n"
-                "        'impacto': <valor estratégico ou técnico da tarefa>,\n"
-                "        'dicas_tecnicas': <orientações práticas, se aplicável>\n"
-                "      }\n"
-                "    ]\n"
-                "  }\n"
-                "}\n\n"
-                "Formate o JSON com indentação e quebras de linha para facilitar a leitura humana.\n"
-                "Não escreva nenhuma explicação fora do JSON. A resposta deve ser apenas o JSON formatado e indentado.\n\n"
-                "Agora, avalie e reorganize as seguintes tarefas:\n"
-                )
-
-
-        for lista in trello_data:
-            for card in lista.get("cards", []):
-                prompt += (
-                    f"- Nome: {card['name']}\n"
-                    f"Descrição: {card['desc']}\n"
-                    f"Lista: {lista['name']}\n"
-                    f"Quadro: {card['board_name']}\n\n"
-                )
-        ia_response = call_ai(prompt)
-        return Response({"ia_response":ia_response})
\ No newline at end of file
+        trello_data, error = get_board_snapshot(request.user, auth, board_id, force=wants_fresh(request))
+        if error:
+            return None, Response(error[0], status=error[1])
+        return trello_data, None
+
+    def _submit_job(self, request, board_id, trello_data, order_label): # 202 + the URL to poll for the result
+        job, created = jobs.submit(request.user, "trello_board_ai", {
+            "board_id": board_id,
+            "trello_data": trello_data,
+            "order_label": order_label,
+        })
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+        }, status=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+class TrelloBoardAIStreamView(TrelloBoardAIAssistantView): # same analysis, streamed as Server-Sent Events
+
+    def get(self, request, board_id):
+        trello_data, error_response = self._get_trello_data(request, board_id)
+        if error_response:
+            return error_response
+        order_label = get_order_label(request.GET.get("order_by", ""))
+        return sse_response(self._events(trello_data, order_label))
+
+    def _events(self, trello_data, order_label):
+        for event, data in stream_board_analysis(trello_data, order_label):
+            if event == "token":
+                yield "token", {"content": data}
+            else:
+                yield "done", {"ia_response": data}
+
+
+class TrelloBoardOrderView(TrelloBoardAIAssistantView): # instant local ordering for ?order_by=, no AI call
+    http_method_names = ['get', 'options']
+
+    def get(self, request, board_id):
+        trello_data, error_response = self._get_trello_data(request, board_id)
+        if error_response:
+            return error_response
+        order_label = get_order_label(request.GET.get("order_by", ""))
+        return Response({
+            "order_by": order_label,
+            "cards": [
+                {**card, "list": list_name, "score": round(score, 4)}
+                for card, list_name, score in score_cards(trello_data, order_label)
+            ],
+        })
+
+
+class TrelloBoardAIJobView(TrelloBoardAIAssistantView): #     POST -> 202 + job id, the analysis runs in the AI worker
+    http_method_names = ['post', 'options'] # GET is served by /ai
+
+    def post(self, request, board_id):
+        trello_data, error_response = self._get_trello_data(request, board_id)
+        if error_response:
+            return error_response
+        return self._submit_job(request, board_id, trello_data, get_order_label(request.GET.get("order_by", "")))
+
+
+
+class AsyncTrelloBoardDetailsView(View): # ASGI variant of TrelloBoardDetailsView
+
+    async def get(self, request, board_id):
+        user, error_response = await async_auth.authenticate(request)
+        if error_response:
+            return error_response
+        access_token = await request.session.aget('access_token')
+        access_token_secret = await request.session.aget('access_token_secret')
+        if not (access_token and access_token_secret):
+            return JsonResponse({"error": "tokens not found, try again"}, status=401)
+        oauth_client = OAuth1Client(
+            API_KEY,
+            client_secret=API_SECRET,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret,
+        )
+        fresh = request.GET.get("fresh", "").strip().lower() in ("1", "true", "yes")
+        trello_data, error = await aget_board_snapshot(user, oauth_client, board_id, force=fresh)
+        if error:
+            return JsonResponse(error[0], status=error[1])
+        return JsonResponse(trello_data, safe=False)
+
+
+
+class TrelloBoardWebhookView(APIView): #     POST -> registers a Trello webhook so the board snapshot is kept in sync
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, board_id):
+        access_token = request.session.get('access_token')
+        access_token_secret = request.session.get('access_token_secret')
+        if not (access_token and access_token_secret):
+            return Response({"error": "tokens not found, try again"}, status=401)
+        auth = OAuth1(
+            API_KEY,
+            client_secret=API_SECRET,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret,
+        )
+        webhook, error = register_board_webhook(request.user, auth, board_id)
+        if error:
+            return Response(error[0], status=error[1])
+        return Response({"webhook_id": webhook.webhook_id, "board_id": board_id}, status=201)
+
+
+class TrelloWebhookReceiverView(APIView): # called by Trello, not by users
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def head(self, request): # Trello checks the callback URL with a HEAD before creating the webhook
+        return Response(status=200)
+
+    def post(self, request):
+        body = request.body
+        if not verify_webhook_signature(body, request.headers.get("X-Trello-Webhook"), API_SECRET):
+            return Response({"error": "invalid signature"}, status=401)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return Response({"error": "invalid payload"}, status=400)
+        return Response(handle_webhook_payload(payload))